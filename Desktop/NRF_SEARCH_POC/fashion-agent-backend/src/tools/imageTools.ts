@@ -139,10 +139,15 @@ async function generateMultiAngleView(input: {
 
   return {
     success: true,
-    angles: data.data.images.map((img: string, idx: number) => ({
-      name: ['Front', 'Left', 'Back', 'Right'][idx],
-      image_base64: img
-    })),
+    // Only angles that generated are returned; names come back alongside
+    angles: data.data.images.map((img: string, idx: number) => {
+      const angle = data.data.angles?.[idx] ?? ['front', 'left', 'back', 'right'][idx];
+      return {
+        name: angle.charAt(0).toUpperCase() + angle.slice(1),
+        image_base64: img
+      };
+    }),
+    failed_angles: data.data.failed_angles ?? [],
     model: 'Gemini 2.5 Flash (multimodal)'
   };
 }
@@ -54,7 +54,10 @@ export interface OutfitVariationsResponse {
 export interface MultiAngleResponse {
   success: boolean;
   data: {
+    status?: 'success' | 'partial' | 'error';
     images: string[];
+    angles?: string[];
+    failed_angles?: string[];
   };
 }
 
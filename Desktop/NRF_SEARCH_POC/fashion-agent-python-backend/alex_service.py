@@ -2,22 +2,35 @@
 Alex Fashion Stylist - FastAPI Service
 Main API server for personalized fashion styling recommendations
 """
-import json
+import asyncio
+import math
 import os
-from typing import Optional
+from typing import List, Optional
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from models import AlexStyleRequest, AlexStyleResponse
-from db import init_db, get_recent_trends, get_trend_count
-from llm_client import call_claude_json, ClaudeClientError
-from prompts import build_stylist_prompt, get_stylist_system_prompt
+from db import init_db, get_recent_trends, get_trend_count, get_pool_metrics, get_trend_cache_metrics, build_fts_query, close_pool
+from llm_client import call_claude_json_async, stream_claude_json_async, ClaudeClientError, ClaudeUnavailableError, close_claude_clients, get_claude_client_metrics
+from llm_cache import response_cache
+from media_cache import media_cache
+from prompts import STYLIST_PROMPT_BUDGET, fit_stylist_prompt, get_stylist_system_prompt, prompt_stats
+from trend_ranking import TREND_CANDIDATE_LIMIT, rank_trends
+from style_stream import IncrementalJSONParser, format_sse
 from image_generator import generate_image_with_nanoBanana, generate_multi_angle_images, generate_multi_angle_from_image, generate_multiple_variations, ImageGeneratorError
 from video_generator import generate_video_with_veo3, VideoGeneratorError
+from executors import run_blocking, shutdown_executors, get_executor_metrics, loop_lag_monitor
+from resilience import get_resilience_metrics
+from model_health import model_health
+from rate_limits import estimate_tokens, get_rate_limit_metrics
+from providers import get_provider_info
+from singleflight import canonical_key, get_flight, get_singleflight_metrics
+from structured_output import STYLE_TOOL, StructuredOutputError, parse_stats, parse_structured
+from telemetry import caller_context, llm_telemetry
 from pydantic import BaseModel
 
 # Load environment variables from .env file
@@ -43,10 +56,19 @@ async def lifespan(app: FastAPI):
         print("\nWARNING: No trends in database!")
         print("Run 'python update_trends.py --demo' to populate with sample trends.\n")
 
+    loop_lag_monitor.start()
+
     yield
 
     # Shutdown
     print("Shutting down Alex Fashion Stylist API...")
+    await loop_lag_monitor.stop()
+    await close_claude_clients()
+    shutdown_executors()
+    response_cache.close()
+    media_cache.close()
+    llm_telemetry.close()
+    close_pool()
 
 
 # ============================================================================
@@ -60,6 +82,22 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+class CallerContextMiddleware:
+    """Attribute upstream calls made while serving a request to its route in telemetry."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with caller_context(f"{scope['method']} {scope['path']}"):
+            await self.app(scope, receive, send)
+
+
+app.add_middleware(CallerContextMiddleware)
+
 # CORS Configuration - Allow frontend at localhost
 app.add_middleware(
     CORSMiddleware,
@@ -79,6 +117,100 @@ app.add_middleware(
 )
 
 
+# ============================================================================
+# Request Helpers
+# ============================================================================
+
+# Non-standard status (nginx convention) for requests abandoned by the client
+STATUS_CLIENT_CLOSED_REQUEST = 499
+
+# Send "X-Alex-Cache: bypass" to skip the Claude response cache (style
+# endpoints) or the media cache (image and video endpoints) for a request
+CACHE_CONTROL_HEADER = "X-Alex-Cache"
+
+
+def wants_cache_bypass(http_request: Request) -> bool:
+    """Check whether the caller asked to skip the response or media cache."""
+    return http_request.headers.get(CACHE_CONTROL_HEADER, "").strip().lower() == "bypass"
+
+
+def coalesce_key(endpoint: str, request: BaseModel, *extra) -> str:
+    """
+    Key identical concurrent requests to an endpoint by their validated body.
+
+    Args:
+        endpoint: Endpoint name, so different endpoints never share a call
+        request: Validated request model
+        *extra: Anything else that changes the result (e.g. cache bypass)
+
+    Returns:
+        Canonical hash of the request
+    """
+    return canonical_key(endpoint, request.model_dump(mode="json"), *extra)
+
+
+def styling_engine_error(e: ClaudeClientError) -> HTTPException:
+    """
+    Map a Claude error to an HTTP error.
+
+    Rate limiting, overload and open circuit breakers become 503 with a
+    Retry-After hint; anything else stays a 500.
+    """
+    if isinstance(e, ClaudeUnavailableError):
+        headers = {"Retry-After": str(math.ceil(e.retry_after))} if e.retry_after is not None else None
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Styling engine temporarily unavailable: {str(e)}",
+            headers=headers
+        )
+    return HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"Styling engine error: {str(e)}"
+    )
+
+
+async def run_until_disconnect(http_request: Request, awaitable):
+    """
+    Await upstream work, cancelling it if the HTTP client disconnects first.
+
+    Args:
+        http_request: The incoming request (its body must already be read)
+        awaitable: Coroutine doing the upstream work
+
+    Returns:
+        The coroutine's result
+
+    Raises:
+        HTTPException: 499 if the client went away before the work finished
+    """
+    work = asyncio.ensure_future(awaitable)
+
+    async def wait_for_disconnect():
+        while True:
+            message = await http_request.receive()
+            if message["type"] == "http.disconnect":
+                return
+
+    watcher = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        work.cancel()
+        raise
+    finally:
+        watcher.cancel()
+
+    if work.done():
+        return work.result()
+
+    work.cancel()
+    print("Client disconnected, cancelled upstream call")
+    raise HTTPException(
+        status_code=STATUS_CLIENT_CLOSED_REQUEST,
+        detail="Client closed request"
+    )
+
+
 # ============================================================================
 # API Endpoints
 # ============================================================================
@@ -92,12 +224,14 @@ async def root():
         "status": "running",
         "endpoints": {
             "styling": "POST /alex/style",
+            "styling_stream": "POST /alex/style/stream (Server-Sent Events)",
             "image_generation": "POST /alex/generate-image",
             "outfit_variations": "POST /alex/generate-outfit-variations",
             "multi_angle_images": "POST /alex/generate-multi-angle",
             "video_generation": "POST /alex/generate-video",
             "health": "GET /health",
-            "stats": "GET /stats"
+            "stats": "GET /stats",
+            "llm_stats": "GET /stats/llm"
         }
     }
 
@@ -105,7 +239,7 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    trend_count = get_trend_count()
+    trend_count = await run_blocking("db", get_trend_count)
     return {
         "status": "healthy",
         "database": "connected",
@@ -115,14 +249,46 @@ async def health_check():
 
 @app.get("/stats")
 async def get_stats():
-    """Get database statistics"""
-    trend_count = get_trend_count()
+    """Get database and runtime statistics"""
+    trend_count = await run_blocking("db", get_trend_count)
+    llm_cache_metrics = await run_blocking("db", response_cache.metrics)
+    media_cache_metrics = await run_blocking("db", media_cache.metrics)
     return {
         "total_trends": trend_count,
-        "database_ready": trend_count > 0
+        "database_ready": trend_count > 0,
+        "database_pool": get_pool_metrics(),
+        "trend_cache": get_trend_cache_metrics(),
+        "executors": get_executor_metrics(),
+        "claude_client": get_claude_client_metrics(),
+        "resilience": get_resilience_metrics(),
+        "rate_limits": get_rate_limit_metrics(),
+        "llm_cache": llm_cache_metrics,
+        "media_cache": media_cache_metrics,
+        "coalescing": get_singleflight_metrics(),
+        "structured_output": parse_stats.metrics(),
+        "prompts": prompt_stats.metrics(),
+        "telemetry": llm_telemetry.metrics(),
+        "providers": get_provider_info(),
+        "model_health": model_health.metrics(),
+        "event_loop": loop_lag_monitor.metrics()
     }
 
 
+@app.get("/stats/llm")
+async def get_llm_stats(hours: float = 24.0):
+    """
+    Get per-model and per-caller upstream call statistics.
+
+    Args:
+        hours: Look-back window in hours (default 24)
+
+    Returns:
+        Calls, errors, fallbacks, tokens, estimated cost and p50/p95/p99
+        latency for each model and each calling route
+    """
+    return await run_blocking("db", llm_telemetry.summary, hours)
+
+
 @app.get("/api/trends")
 async def get_trends_api(
     region: str = "Global",
@@ -140,7 +306,9 @@ async def get_trends_api(
     try:
         # Query trends with filters
         contexts = [occasion_type] if occasion_type else None
-        trends = get_recent_trends(
+        trends = await run_blocking(
+            "db",
+            get_recent_trends,
             limit=limit,
             region=region if region != "Global" else None,
             contexts=contexts
@@ -181,6 +349,78 @@ async def get_trends_api(
         )
 
 
+@app.get("/api/trends/search")
+async def search_trends_api(
+    q: str,
+    region: str = "Global",
+    occasion_type: str = None,
+    limit: int = 10
+):
+    """
+    Full-text search over fashion trends, ranked by relevance.
+
+    Matches trend names, fit notes, key items, style tags and colours.
+    Every word is prefix-matched, so "linen wide leg" or "jhumka" also
+    find "linens" and "jhumkas".
+
+    Query params:
+        q: Free-text search query
+        region: Geographic region (default: "Global")
+        occasion_type: Filter by occasion (optional)
+        limit: Max number of trends (default: 10)
+    """
+    if not build_fts_query(q):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search query must contain at least one word"
+        )
+
+    try:
+        contexts = [occasion_type] if occasion_type else None
+        trends = await run_blocking(
+            "db",
+            get_recent_trends,
+            limit=limit,
+            region=region if region != "Global" else None,
+            contexts=contexts,
+            search=q
+        )
+
+        formatted_trends = [
+            {
+                "name": t["name"],
+                "season": t.get("season", ""),
+                "style_tags": t.get("style_tags", []),
+                "colour_palette": t.get("colour_palette", []),
+                "key_items": t.get("key_items", []),
+                "contexts": t.get("contexts", []),
+                "formality": t.get("formality", ""),
+                "region": t.get("region", "Global"),
+                "fit_notes": t.get("fit_notes", ""),
+                "score": t.get("search_score", 0.0)
+            }
+            for t in trends
+        ]
+
+        return {
+            "success": True,
+            "query": q,
+            "trends": formatted_trends,
+            "count": len(formatted_trends),
+            "filters": {
+                "region": region,
+                "occasion_type": occasion_type,
+                "limit": limit
+            }
+        }
+    except Exception as e:
+        print(f"Error searching trends: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to search trends: {str(e)}"
+        )
+
+
 class ImageGenerationRequest(BaseModel):
     """Request model for image generation"""
     prompt: str
@@ -194,18 +434,23 @@ class MultiAngleRequest(BaseModel):
     image_base64: str
     aspect_ratio: str = "9:16"
     style: str = "photorealistic"
+    # Generate only these angles (front/left/back/right), e.g. to regenerate
+    # one listed in a previous response's failed_angles
+    angles: Optional[List[str]] = None
 
 
 @app.post("/alex/generate-image")
-async def generate_outfit_image_endpoint(request: ImageGenerationRequest):
+async def generate_outfit_image_endpoint(request: ImageGenerationRequest, http_request: Request):
     """
     Generate outfit image using Nano Banana.
 
     Takes an image prompt and generates a visual representation
-    of the described outfit.
+    of the described outfit. Identical requests are served from the media
+    cache unless the X-Alex-Cache: bypass header is sent.
 
     Args:
         request: ImageGenerationRequest with prompt and parameters
+        http_request: Raw request, used to read the X-Alex-Cache bypass header
 
     Returns:
         Dictionary with image generation result
@@ -216,10 +461,18 @@ async def generate_outfit_image_endpoint(request: ImageGenerationRequest):
     try:
         print(f"Generating image with prompt: {request.prompt[:100]}...")
 
-        result = generate_image_with_nanoBanana(
-            prompt=request.prompt,
-            aspect_ratio=request.aspect_ratio,
-            style=request.style
+        use_cache = not wants_cache_bypass(http_request)
+        # Duplicate requests (e.g. a double-click) share one generation
+        result = await get_flight("generate_image").do(
+            coalesce_key("generate_image", request, use_cache),
+            lambda: run_blocking(
+                "media",
+                generate_image_with_nanoBanana,
+                prompt=request.prompt,
+                aspect_ratio=request.aspect_ratio,
+                style=request.style,
+                use_cache=use_cache
+            )
         )
 
         return {
@@ -255,25 +508,33 @@ async def generate_multi_angle_images_endpoint(request: MultiAngleRequest):
     Generate 4-angle fashion showcase using reference image for consistency.
 
     Takes a reference image and generates 4 views (Front, Left, Back, Right)
-    of the SAME outfit from different angles.
+    of the SAME outfit from different angles. If some views still fail after
+    retries the others are returned with status "partial"; request just the
+    failed ones again by passing their names in angles.
 
     Args:
         request: MultiAngleRequest with prompt, reference image, and parameters
 
     Returns:
-        Dictionary with 4 images and angle names
+        Dictionary with the generated images, their angle names and per-angle status
 
     Raises:
-        HTTPException: If image generation fails
+        HTTPException: If an angle name is unknown or image generation fails
     """
     try:
-        print(f"Generating 4-angle showcase from reference image...")
-
-        result = generate_multi_angle_from_image(
-            reference_image_base64=request.image_base64,
-            prompt=request.prompt,
-            aspect_ratio=request.aspect_ratio,
-            style=request.style
+        print(f"Generating multi-angle showcase from reference image...")
+
+        result = await get_flight("generate_multi_angle").do(
+            coalesce_key("generate_multi_angle", request),
+            lambda: run_blocking(
+                "media",
+                generate_multi_angle_from_image,
+                reference_image_base64=request.image_base64,
+                prompt=request.prompt,
+                aspect_ratio=request.aspect_ratio,
+                style=request.style,
+                only_angles=request.angles
+            )
         )
 
         return {
@@ -281,6 +542,11 @@ async def generate_multi_angle_images_endpoint(request: MultiAngleRequest):
             "data": result
         }
 
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except ImageGeneratorError as e:
         print(f"Multi-angle generation error: {e}")
         raise HTTPException(
@@ -315,11 +581,16 @@ async def generate_outfit_variations_endpoint(request: ImageGenerationRequest):
     try:
         print(f"Generating 3 outfit variations with prompt: {request.prompt[:100]}...")
 
-        result = generate_multiple_variations(
-            prompt=request.prompt,
-            count=3,
-            aspect_ratio=request.aspect_ratio,
-            style=request.style
+        result = await get_flight("generate_outfit_variations").do(
+            coalesce_key("generate_outfit_variations", request),
+            lambda: run_blocking(
+                "media",
+                generate_multiple_variations,
+                prompt=request.prompt,
+                count=3,
+                aspect_ratio=request.aspect_ratio,
+                style=request.style
+            )
         )
 
         return {
@@ -342,15 +613,17 @@ async def generate_outfit_variations_endpoint(request: ImageGenerationRequest):
 
 
 @app.post("/alex/generate-video")
-async def generate_outfit_video_endpoint(request: VideoGenerationRequest):
+async def generate_outfit_video_endpoint(request: VideoGenerationRequest, http_request: Request):
     """
     Generate outfit video using Veo 3.1 (Image-to-Video).
 
     Takes a base64 encoded image and animation prompt to create
-    a 360-degree video showcase of the outfit.
+    a 360-degree video showcase of the outfit. Identical requests are served
+    from the media cache unless the X-Alex-Cache: bypass header is sent.
 
     Args:
         request: VideoGenerationRequest with image_base64, prompt, and parameters
+        http_request: Raw request, used to read the X-Alex-Cache bypass header
 
     Returns:
         Dictionary with video generation result
@@ -362,11 +635,18 @@ async def generate_outfit_video_endpoint(request: VideoGenerationRequest):
         print(f"Generating video with Veo 3.1...")
         print(f"Animation prompt: {request.prompt[:100]}...")
 
-        result = generate_video_with_veo3(
-            image_base64=request.image_base64,
-            prompt=request.prompt,
-            duration=request.duration,
-            aspect_ratio=request.aspect_ratio
+        use_cache = not wants_cache_bypass(http_request)
+        result = await get_flight("generate_video").do(
+            coalesce_key("generate_video", request, use_cache),
+            lambda: run_blocking(
+                "media",
+                generate_video_with_veo3,
+                image_base64=request.image_base64,
+                prompt=request.prompt,
+                duration=request.duration,
+                aspect_ratio=request.aspect_ratio,
+                use_cache=use_cache
+            )
         )
 
         return {
@@ -388,8 +668,85 @@ async def generate_outfit_video_endpoint(request: VideoGenerationRequest):
         )
 
 
+async def build_style_prompts(request: AlexStyleRequest):
+    """
+    Look up relevant trends and build the stylist prompts for a request.
+
+    Recent trends for the region are ranked against the user's profile and
+    occasion, and the best TREND_TOP_K that fit the prompt budget go in.
+
+    Args:
+        request: AlexStyleRequest with user_profile and context
+
+    Returns:
+        Tuple of (system_prompt, user_prompt, number of trends used)
+    """
+    # Extract request data
+    user_profile = request.user_profile.model_dump()
+    context = request.context.model_dump()
+
+    # Get candidate trends from database; occasion, formality, climate and
+    # the user's constraints are weighed by rank_trends rather than filtered
+    region = context.get("region", "Global")
+    candidates = await run_blocking("db", get_recent_trends, limit=TREND_CANDIDATE_LIMIT, region=region)
+
+    # Check if we have trends
+    if not candidates:
+        print(f"Warning: No trends found for region={region}, using global trends")
+        candidates = await run_blocking("db", get_recent_trends, limit=TREND_CANDIDATE_LIMIT, region="global")
+
+    trends = rank_trends(candidates, user_profile, context)
+
+    # Build stylist prompt, listing as many ranked trends as the budget allows
+    system_prompt = get_stylist_system_prompt()
+    user_prompt, trends_used = fit_stylist_prompt(user_profile, context, trends)
+    print(
+        f"Using {trends_used} of {len(candidates)} candidate trends for styling recommendation "
+        f"(prompt ~{estimate_tokens(user_prompt)} tokens, budget {STYLIST_PROMPT_BUDGET})"
+    )
+    return system_prompt, user_prompt, trends_used
+
+
+def _validate_style(response_data) -> AlexStyleResponse:
+    if not isinstance(response_data, dict) or "style_guide" not in response_data or "media_prompts" not in response_data:
+        raise ValueError("Incomplete response: style_guide and media_prompts are required")
+    return AlexStyleResponse(**response_data)
+
+
+def parse_style_response(response_text: str, prompt_tokens: int = 0) -> AlexStyleResponse:
+    """
+    Parse and validate Claude's styling response.
+
+    Stray markdown fences, trailing commas and similar slips are repaired
+    rather than failing the request.
+
+    Args:
+        response_text: Raw JSON text from Claude
+        prompt_tokens: Estimated prompt size, reported as wasted if parsing fails
+
+    Returns:
+        Validated AlexStyleResponse
+
+    Raises:
+        HTTPException: If the response is not valid JSON or fails validation
+    """
+    try:
+        return parse_structured(response_text, "style", _validate_style, prompt_tokens)
+    except StructuredOutputError as e:
+        print(f"Error: Failed to parse styling response ({e.reason}): {e}")
+        print(f"Response preview: {response_text[:500]}...")
+        if e.reason == "unparseable":
+            detail = "Invalid JSON response from styling engine"
+        else:
+            detail = f"Response validation error: {str(e)}"
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=detail
+        )
+
+
 @app.post("/alex/style", response_model=AlexStyleResponse)
-async def generate_style(request: AlexStyleRequest):
+async def generate_style(request: AlexStyleRequest, http_request: Request):
     """
     Generate personalized fashion styling recommendations.
 
@@ -398,6 +755,8 @@ async def generate_style(request: AlexStyleRequest):
 
     Args:
         request: AlexStyleRequest with user_profile and context
+        http_request: Raw request, used to cancel the Claude call on disconnect
+            and to read the X-Alex-Cache bypass header
 
     Returns:
         AlexStyleResponse with style_guide and media_prompts
@@ -405,79 +764,33 @@ async def generate_style(request: AlexStyleRequest):
     Raises:
         HTTPException: If styling generation fails
     """
-    try:
-        # Extract request data
-        user_profile = request.user_profile.model_dump()
-        context = request.context.model_dump()
-
-        # Get relevant trends from database
-        region = context.get("region", "Global")
-        occasion_type = context.get("occasion_type")
-
-        # Query trends with filters
-        trends = get_recent_trends(
-            limit=40,
-            region=region,
-            contexts=[occasion_type] if occasion_type else None
-        )
-
-        # Check if we have trends
-        if not trends:
-            print(f"Warning: No trends found for region={region}, using global trends")
-            trends = get_recent_trends(limit=40, region="global")
-
-        print(f"Using {len(trends)} trends for styling recommendation")
+    use_cache = not wants_cache_bypass(http_request)
 
-        # Build stylist prompt
-        system_prompt = get_stylist_system_prompt()
-        user_prompt = build_stylist_prompt(user_profile, context, trends)
+    async def produce_style() -> AlexStyleResponse:
+        system_prompt, user_prompt, _ = await build_style_prompts(request)
 
         # Call Claude for styling recommendations
         print("Calling Claude for styling recommendation...")
-        response_text = call_claude_json(
+        response_text = await call_claude_json_async(
             system_prompt=system_prompt,
             user_prompt=user_prompt,
-            max_tokens=4000
+            max_tokens=4000,
+            use_cache=use_cache,
+            tool=STYLE_TOOL
         )
+        return parse_style_response(response_text, estimate_tokens(system_prompt + user_prompt))
 
-        # Parse JSON response
-        try:
-            response_data = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            print(f"Error: Failed to parse JSON from Claude: {e}")
-            print(f"Response preview: {response_text[:500]}...")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Invalid JSON response from styling engine"
-            )
-
-        # Validate response structure
-        if "style_guide" not in response_data or "media_prompts" not in response_data:
-            print(f"Error: Response missing required fields")
-            print(f"Response keys: {response_data.keys()}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Incomplete response from styling engine"
-            )
-
-        # Validate with Pydantic model
-        try:
-            validated_response = AlexStyleResponse(**response_data)
-            return validated_response
-        except Exception as e:
-            print(f"Error: Response validation failed: {e}")
-            print(f"Response data: {json.dumps(response_data, indent=2)[:500]}...")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Response validation error: {str(e)}"
-            )
+    try:
+        # Identical concurrent requests share one trend lookup and Claude
+        # call; the shared work is only cancelled once every caller is gone
+        return await run_until_disconnect(
+            http_request,
+            get_flight("alex_style").do(coalesce_key("alex_style", request, use_cache), produce_style)
+        )
 
     except ClaudeClientError as e:
         print(f"Claude API error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Styling engine error: {str(e)}"
-        )
+        raise styling_engine_error(e)
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
@@ -489,6 +802,91 @@ async def generate_style(request: AlexStyleRequest):
         )
 
 
+@app.post("/alex/style/stream")
+async def generate_style_stream(request: AlexStyleRequest, http_request: Request):
+    """
+    Stream personalized styling recommendations as Server-Sent Events.
+
+    Same input as /alex/style. Sections are sent as soon as Claude has
+    written them, so the frontend can render the title and first pieces
+    before the full response is ready:
+
+        start           {"trends_used": int, "prompt_tokens": int (estimated)}
+        title           style guide title
+        key_piece       one key piece object (repeated)
+        key_pieces      full key piece list
+        colour_palette  colour palette object
+        media_prompts   media prompts object
+        complete        full validated AlexStyleResponse
+        error           {"status_code": int, "detail": str, ...} (terminal)
+
+    Args:
+        request: AlexStyleRequest with user_profile and context
+        http_request: Raw request, used to read the X-Alex-Cache bypass header
+
+    Returns:
+        StreamingResponse of text/event-stream
+
+    Raises:
+        HTTPException: If trend lookup fails before streaming starts
+    """
+    try:
+        system_prompt, user_prompt, trends_used = await build_style_prompts(request)
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(e)}"
+        )
+    use_cache = not wants_cache_bypass(http_request)
+
+    async def events():
+        yield format_sse("start", {"trends_used": trends_used, "prompt_tokens": estimate_tokens(user_prompt)})
+        parser = IncrementalJSONParser()
+        try:
+            # Starlette cancels this generator if the client disconnects,
+            # which closes the upstream Claude stream
+            print("Streaming Claude styling recommendation...")
+            async for chunk in stream_claude_json_async(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                max_tokens=4000,
+                use_cache=use_cache,
+                tool=STYLE_TOOL
+            ):
+                for event, _, value in parser.feed(chunk):
+                    yield format_sse(event, value)
+
+            validated_response = parse_style_response(
+                parser.text, estimate_tokens(system_prompt + user_prompt)
+            )
+            yield format_sse("complete", validated_response.model_dump())
+
+        except ClaudeClientError as e:
+            print(f"Claude API error: {e}")
+            error = styling_engine_error(e)
+            yield format_sse("error", {
+                "status_code": error.status_code,
+                "detail": error.detail,
+                "retry_after": getattr(e, "retry_after", None)
+            })
+        except HTTPException as e:
+            yield format_sse("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            print(f"Unexpected error: {e}")
+            yield format_sse("error", {
+                "status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                "detail": f"Internal server error: {str(e)}"
+            })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Stop proxies (nginx) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # ============================================================================
 # Error Handlers
 # ============================================================================
@@ -0,0 +1,281 @@
+"""
+Message Batches backends for Alex Fashion Stylist
+Submits many Claude requests as one asynchronous batch job (billed at the batch
+discount) and reads results back as they stream in
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from anthropic import APIError
+
+from db import STUB_DB_PATH
+from llm_cache import make_cache_key, response_cache
+from llm_client import ClaudeClientError, get_claude_client, response_text, to_claude_error
+from resilience import CircuitOpenError, call_with_retry
+
+
+# Offline stand-in: where it keeps submitted batches, and how long a batch
+# takes to "process" (requests complete evenly over this period)
+LOCAL_BATCH_PATH = os.getenv("ALEX_LOCAL_BATCH_PATH", "local_batches.db")
+LOCAL_BATCH_SECONDS = float(os.getenv("ALEX_LOCAL_BATCH_SECONDS", "5"))
+
+# Batch processing_status once every request has a result
+BATCH_ENDED = "ended"
+
+# A batch request is {"custom_id": str, "params": messages.create kwargs};
+# a status is {"id", "processing_status", "request_counts"}; a result is
+# {"custom_id", "type" (succeeded/errored/canceled/expired), "text", "error"}
+
+
+# ============================================================================
+# Anthropic Message Batches API
+# ============================================================================
+
+class AnthropicBatchBackend:
+    """Message Batches API through the shared Claude client."""
+
+    name = "anthropic"
+
+    # Results are real Claude responses, so they may be added to the response cache
+    cache_results = True
+
+    # Trends database the results are stored in (None: the configured DB_PATH)
+    trends_db_path: Optional[str] = None
+
+    # Batch management calls share one breaker and limiter, separate from
+    # the per-model keys used for interactive calls
+    resilience_key = "claude:batches"
+
+    def _call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        try:
+            return call_with_retry(self.resilience_key, fn, *args, **kwargs)
+        except (APIError, CircuitOpenError) as e:
+            raise to_claude_error(e)
+
+    def create(self, requests: List[Dict[str, Any]]) -> str:
+        """
+        Submit a batch.
+
+        Args:
+            requests: Batch requests with custom_id and params
+
+        Returns:
+            Batch ID
+        """
+        batch = self._call(get_claude_client().messages.batches.create, requests=requests)
+        return batch.id
+
+    def retrieve(self, batch_id: str) -> Dict[str, Any]:
+        """
+        Get a batch's processing status and request counts.
+
+        Args:
+            batch_id: Batch ID from create
+
+        Returns:
+            Status dictionary
+        """
+        batch = self._call(get_claude_client().messages.batches.retrieve, batch_id)
+        return {
+            "id": batch.id,
+            "processing_status": batch.processing_status,
+            "request_counts": batch.request_counts.model_dump(),
+        }
+
+    def results(self, batch_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the results of an ended batch, one request at a time.
+
+        Args:
+            batch_id: Batch ID from create
+
+        Yields:
+            Result dictionaries, in no particular order
+        """
+        for entry in self._call(get_claude_client().messages.batches.results, batch_id):
+            result = entry.result
+            text = None
+            error = None
+            if result.type == "succeeded":
+                content = result.message.content
+                text = response_text(content) if content else ""
+            elif result.type == "errored":
+                error = result.error.error.message
+            yield {"custom_id": entry.custom_id, "type": result.type, "text": text, "error": error}
+
+
+# ============================================================================
+# Local Stand-in
+# ============================================================================
+
+def _system_text(system: Any) -> str:
+    if isinstance(system, list):
+        return "".join(block.get("text", "") for block in system)
+    return system or ""
+
+
+def placeholder_response(params: Dict[str, Any]) -> str:
+    """
+    Answer a batch request offline.
+
+    Replays the cached Claude response for the same request if there is one;
+    otherwise returns one deterministic low-confidence trend derived from
+    the prompt, so repeated runs upsert rather than duplicate it in the stub
+    trends database (STUB_DB_PATH) the local backend stores into.
+
+    Args:
+        params: messages.create kwargs of the batch request
+
+    Returns:
+        Response text (a JSON array of trends)
+    """
+    system_prompt = _system_text(params.get("system"))
+    user_prompt = params["messages"][-1]["content"]
+    cached = response_cache.get(
+        make_cache_key(
+            params["model"], system_prompt, user_prompt, params["max_tokens"],
+            params["tools"][0]["name"] if params.get("tools") else None
+        )
+    )
+    if cached is not None:
+        return cached
+
+    digest = hashlib.sha256(user_prompt.encode("utf-8")).hexdigest()[:8]
+    return json.dumps([{
+        "name": f"Batch placeholder trend {digest}",
+        "style_tags": ["placeholder"],
+        "confidence": "low",
+    }])
+
+
+class LocalBatchBackend:
+    """
+    Offline stand-in for the Message Batches API.
+
+    Batches are kept in a SQLite file so a stopped ingestion run can resume
+    against them. Requests complete evenly over processing_seconds and
+    results are served once the whole batch has ended, as with the real API.
+    """
+
+    name = "local"
+
+    # Placeholder responses must never be served as real Claude output, so
+    # they aren't cached and are stored in the stub trends database
+    cache_results = False
+    trends_db_path = STUB_DB_PATH
+
+    def __init__(
+        self,
+        db_path: str = LOCAL_BATCH_PATH,
+        processing_seconds: float = LOCAL_BATCH_SECONDS,
+        responder: Callable[[Dict[str, Any]], str] = placeholder_response
+    ):
+        self.processing_seconds = processing_seconds
+        self.responder = responder
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS local_batches (
+                    batch_id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS local_batch_requests (
+                    batch_id TEXT NOT NULL REFERENCES local_batches(batch_id),
+                    custom_id TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    PRIMARY KEY (batch_id, custom_id)
+                )
+            """)
+
+    def create(self, requests: List[Dict[str, Any]]) -> str:
+        batch_id = f"msgbatch_local_{uuid.uuid4().hex[:24]}"
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO local_batches (batch_id, created_at) VALUES (?, ?)",
+                (batch_id, time.time())
+            )
+            self._conn.executemany(
+                "INSERT INTO local_batch_requests (batch_id, custom_id, params) VALUES (?, ?, ?)",
+                [(batch_id, request["custom_id"], json.dumps(request["params"])) for request in requests]
+            )
+        return batch_id
+
+    def _load(self, batch_id: str) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT created_at, (SELECT COUNT(*) FROM local_batch_requests r "
+                "WHERE r.batch_id = b.batch_id) AS total FROM local_batches b WHERE batch_id = ?",
+                (batch_id,)
+            ).fetchone()
+
+    def retrieve(self, batch_id: str) -> Dict[str, Any]:
+        row = self._load(batch_id)
+        if row is None:
+            raise ClaudeClientError(f"Unknown local batch {batch_id}")
+
+        elapsed = time.time() - row["created_at"]
+        total = row["total"]
+        if self.processing_seconds <= 0 or elapsed >= self.processing_seconds:
+            done = total
+        else:
+            done = int(total * elapsed / self.processing_seconds)
+        return {
+            "id": batch_id,
+            "processing_status": BATCH_ENDED if done == total else "in_progress",
+            "request_counts": {
+                "processing": total - done,
+                "succeeded": done,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0,
+            },
+        }
+
+    def results(self, batch_id: str) -> Iterator[Dict[str, Any]]:
+        if self.retrieve(batch_id)["processing_status"] != BATCH_ENDED:
+            raise ClaudeClientError(f"Batch {batch_id} has not ended")
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT custom_id, params FROM local_batch_requests WHERE batch_id = ? ORDER BY rowid",
+                (batch_id,)
+            ).fetchall()
+        for row in rows:
+            yield {
+                "custom_id": row["custom_id"],
+                "type": "succeeded",
+                "text": self.responder(json.loads(row["params"])),
+                "error": None,
+            }
+
+
+BATCH_BACKENDS = {
+    AnthropicBatchBackend.name: AnthropicBatchBackend,
+    LocalBatchBackend.name: LocalBatchBackend,
+}
+
+
+def get_batch_backend(name: str) -> Any:
+    """
+    Create a batch backend by name.
+
+    Args:
+        name: "anthropic" or "local"
+
+    Raises:
+        ValueError: If the name is unknown
+    """
+    try:
+        return BATCH_BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown batch backend '{name}' (expected one of {sorted(BATCH_BACKENDS)})")
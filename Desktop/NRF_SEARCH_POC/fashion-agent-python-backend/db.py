@@ -1,173 +1,948 @@
 """
 Database layer for Alex Fashion Stylist
-Handles SQLite connection, table creation, and trend data operations
+Handles SQLite connection pooling, table creation, and trend data operations
 """
+import os
+import re
 import sqlite3
 import json
-from typing import List, Optional, Dict, Any
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Dict, Any, Tuple
 from datetime import datetime
 
+from metrics import LatencyStats
+from provider_config import claude_is_stubbed
 
-DB_PATH = "alex_trends.db"
+
+# Trends extracted by the Claude stub (or the offline batch stand-in) get
+# their own file so they are never served as real trends
+STUB_DB_PATH = "alex_trends_stub.db"
+DB_PATH = os.getenv("ALEX_DB_PATH", STUB_DB_PATH if claude_is_stubbed() else "alex_trends.db")
+
+# Maximum number of threads allowed to hold a read connection at once
+DB_READ_POOL_SIZE = int(os.getenv("ALEX_DB_READ_POOL_SIZE", "8"))
+
+# Per-connection tuning applied to every pooled connection.
+# WAL lets readers proceed while the ingestion writer holds its transaction;
+# synchronous=NORMAL is durable in WAL mode and avoids an fsync per commit.
+SQLITE_PRAGMAS = [
+    ("synchronous", "NORMAL"),
+    ("cache_size", "-16000"),           # 16 MB page cache (negative = KiB)
+    ("mmap_size", str(256 * 1024 * 1024)),
+    ("temp_store", "MEMORY"),
+    ("busy_timeout", "5000"),
+    ("foreign_keys", "ON"),
+]
+
+# Schema version stored in PRAGMA user_version; bump when adding a migration
+SCHEMA_VERSION = 5
+
+# Normalized side tables for list-valued trend fields: table -> trends column.
+# Each row is one (trend_id, value) pair so filters become index lookups
+# instead of LIKE scans over the JSON text columns.
+ATTRIBUTE_TABLES = {
+    "trend_contexts": "contexts",
+    "trend_style_tags": "style_tags",
+    "trend_colours": "colour_palette",
+    "trend_garments": "garment_types",
+    "trend_climates": "climate_suitability",
+}
+
+# Full-text search: trend columns indexed by trends_fts, and their BM25 weights
+# (a match in the trend name counts for more than one in its fit notes)
+FTS_COLUMNS = [
+    ("name", 10.0),
+    ("fit_notes", 2.0),
+    ("key_items", 5.0),
+    ("style_tags", 3.0),
+    ("colour_palette", 2.0),
+]
+
+# Trend snapshot cache: max cached (region, contexts, limit) results, and how
+# often (seconds) to look for writes made by other processes
+TREND_CACHE_SIZE = int(os.getenv("ALEX_TREND_CACHE_SIZE", "256"))
+TREND_CACHE_CHECK_INTERVAL = float(os.getenv("ALEX_TREND_CACHE_CHECK_INTERVAL", "1.0"))
+
+# Column order for trend writes, with the default used for missing fields
+TREND_COLUMNS = [
+    ("name", ""),
+    ("season", "All season"),
+    ("garment_types", []),
+    ("gender_focus", "all"),
+    ("style_tags", []),
+    ("colour_palette", []),
+    ("fit_notes", ""),
+    ("contexts", []),
+    ("formality", "casual"),
+    ("climate_suitability", []),
+    ("region", "global"),
+    ("key_items", []),
+    ("avoid_for_body_types", []),
+    ("source_title", ""),
+    ("source_url", ""),
+    ("published_at", None),
+    ("confidence", "medium"),
+]
+
+# Natural key used to dedupe trends across ingestion runs
+TREND_KEY_COLUMNS = ("name", "source_url", "season")
+
+# Columns that differ on every re-extraction of the same article (the
+# ingestion prompt stamps published_at with the analysis time), so they
+# don't count as a change when deciding between update and skip
+TREND_VOLATILE_COLUMNS = ("published_at",)
 
 
 def get_db_connection() -> sqlite3.Connection:
     """
-    Get a connection to the SQLite database.
+    Get a new, tuned connection to the SQLite database.
     Returns a connection with row_factory set to sqlite3.Row for dict-like access.
+
+    Request paths should use the shared pool (see get_pool) instead of
+    opening their own connection.
     """
-    conn = sqlite3.connect(DB_PATH)
+    return _open_connection(DB_PATH)
+
+
+def _open_connection(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma, value in SQLITE_PRAGMAS:
+        conn.execute(f"PRAGMA {pragma}={value}")
     return conn
 
 
+# ============================================================================
+# Connection Pool
+# ============================================================================
+
+class ConnectionPool:
+    """
+    Long-lived SQLite connections: one per reader thread plus a single writer.
+
+    Read connections are cached per thread and bounded by a semaphore so
+    at most max_readers threads query at once. All writes go through one
+    connection guarded by a lock, which matches SQLite's single-writer model
+    and keeps the ingestion writer from contending with itself.
+    """
+
+    def __init__(self, db_path: str, max_readers: int = DB_READ_POOL_SIZE):
+        self.db_path = db_path
+        self.max_readers = max_readers
+        self._reader_slots = threading.BoundedSemaphore(max_readers)
+        self._local = threading.local()
+        self._state_lock = threading.Lock()
+        self._reader_conns: Dict[threading.Thread, sqlite3.Connection] = {}
+        self._writer_conn: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.Lock()
+        self._closed = False
+
+        self._readers_active = 0
+        self._readers_waiting = 0
+        self._reader_checkouts = 0
+        self._writer_checkouts = 0
+        self._reader_wait = LatencyStats()
+        self._reader_checkout = LatencyStats()
+        self._writer_wait = LatencyStats()
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """
+        Check out this thread's read connection.
+
+        Re-entrant: nested reader() calls on the same thread reuse the
+        connection without taking a second pool slot.
+        """
+        conn = getattr(self._local, "conn", None)
+        if getattr(self._local, "depth", 0) > 0:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        start = time.perf_counter()
+        with self._state_lock:
+            self._readers_waiting += 1
+        self._reader_slots.acquire()
+        acquired = time.perf_counter()
+        with self._state_lock:
+            self._readers_waiting -= 1
+            self._readers_active += 1
+            self._reader_checkouts += 1
+
+        try:
+            if conn is None:
+                conn = _open_connection(self.db_path)
+                self._local.conn = conn
+                with self._state_lock:
+                    self._prune_dead_readers()
+                    self._reader_conns[threading.current_thread()] = conn
+            self._reader_wait.record((acquired - start) * 1000)
+            self._reader_checkout.record((time.perf_counter() - start) * 1000)
+
+            self._local.depth = 1
+            try:
+                yield conn
+            finally:
+                self._local.depth = 0
+        finally:
+            with self._state_lock:
+                self._readers_active -= 1
+            self._reader_slots.release()
+
+    def _prune_dead_readers(self) -> None:
+        # Worker threads can exit (e.g. a resized thread pool); drop their connections
+        for thread in [t for t in self._reader_conns if not t.is_alive()]:
+            self._reader_conns.pop(thread).close()
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """
+        Check out the single writer connection.
+
+        Commits when the block exits cleanly and rolls back on error.
+        """
+        start = time.perf_counter()
+        with self._writer_lock:
+            self._writer_wait.record((time.perf_counter() - start) * 1000)
+            self._writer_checkouts += 1
+            if self._writer_conn is None:
+                self._writer_conn = _open_connection(self.db_path)
+                # journal_mode is persistent in the database file, so the
+                # writer switching to WAL is enough for every reader
+                self._writer_conn.execute("PRAGMA journal_mode=WAL")
+
+            conn = self._writer_conn
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def close(self) -> None:
+        """Close every pooled connection."""
+        with self._writer_lock, self._state_lock:
+            for conn in self._reader_conns.values():
+                conn.close()
+            self._reader_conns.clear()
+            if self._writer_conn is not None:
+                self._writer_conn.close()
+                self._writer_conn = None
+            self._closed = True
+        self._local = threading.local()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get pool size, wait time and checkout latency metrics.
+
+        Returns:
+            Dictionary of pool gauges and latency summaries
+        """
+        with self._state_lock:
+            self._prune_dead_readers()
+            gauges = {
+                "db_path": self.db_path,
+                "max_readers": self.max_readers,
+                "reader_connections": len(self._reader_conns),
+                "readers_active": self._readers_active,
+                "readers_waiting": self._readers_waiting,
+                "reader_checkouts": self._reader_checkouts,
+                "writer_open": self._writer_conn is not None,
+                "writer_checkouts": self._writer_checkouts,
+            }
+        gauges["reader_wait"] = self._reader_wait.snapshot()
+        gauges["reader_checkout_latency"] = self._reader_checkout.snapshot()
+        gauges["writer_wait"] = self._writer_wait.snapshot()
+        return gauges
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Get the process-wide connection pool for DB_PATH, creating it on first use.
+
+    A new pool is created if DB_PATH has been changed since the last call.
+    """
+    global _pool
+    pool = _pool
+    if pool is None or pool.db_path != DB_PATH:
+        with _pool_lock:
+            if _pool is None or _pool.db_path != DB_PATH:
+                if _pool is not None:
+                    _pool.close()
+                _pool = ConnectionPool(DB_PATH)
+                _trend_cache.clear()
+            pool = _pool
+    return pool
+
+
+def close_pool() -> None:
+    """Close the process-wide connection pool (used on shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def get_pool_metrics() -> Dict[str, Any]:
+    """
+    Get metrics for the process-wide connection pool.
+
+    Returns:
+        Dictionary of pool gauges and latency summaries
+    """
+    return get_pool().metrics()
+
+
 def init_db() -> None:
     """
-    Initialize the database by creating the trends table if it doesn't exist.
-    """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS trends (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            season TEXT NOT NULL,
-            garment_types TEXT NOT NULL,
-            gender_focus TEXT NOT NULL,
-            style_tags TEXT NOT NULL,
-            colour_palette TEXT NOT NULL,
-            fit_notes TEXT,
-            contexts TEXT NOT NULL,
-            formality TEXT NOT NULL,
-            climate_suitability TEXT NOT NULL,
-            region TEXT NOT NULL,
-            key_items TEXT NOT NULL,
-            avoid_for_body_types TEXT NOT NULL,
-            source_title TEXT NOT NULL,
-            source_url TEXT NOT NULL,
-            published_at TEXT NOT NULL,
-            confidence TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    Initialize the database by creating the trends table if it doesn't exist,
+    then apply any pending schema migrations.
+    """
+    with get_pool().writer() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS trends (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                season TEXT NOT NULL,
+                garment_types TEXT NOT NULL,
+                gender_focus TEXT NOT NULL,
+                style_tags TEXT NOT NULL,
+                colour_palette TEXT NOT NULL,
+                fit_notes TEXT,
+                contexts TEXT NOT NULL,
+                formality TEXT NOT NULL,
+                climate_suitability TEXT NOT NULL,
+                region TEXT NOT NULL,
+                key_items TEXT NOT NULL,
+                avoid_for_body_types TEXT NOT NULL,
+                source_title TEXT NOT NULL,
+                source_url TEXT NOT NULL,
+                published_at TEXT NOT NULL,
+                confidence TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        _migrate(conn)
+
+    print(f"Database initialized at {DB_PATH}")
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """
+    Bring an existing database up to SCHEMA_VERSION.
+
+    Migrations run inside the writer transaction, so a failure leaves the
+    file at its previous version.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    if version < 1:
+        _create_attribute_tables(conn)
+        backfilled = _backfill_attribute_tables(conn)
+        print(f"Migrated trends schema to v1 (indexed {backfilled} existing trends)")
+
+    if version < 2:
+        # Earlier ingestion runs inserted duplicates; keep the newest copy of
+        # each natural key (attribute rows cascade) before enforcing uniqueness
+        removed = conn.execute("""
+            DELETE FROM trends WHERE id NOT IN (
+                SELECT MAX(id) FROM trends GROUP BY name, source_url, season
+            )
+        """).rowcount
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_trends_natural_key "
+            "ON trends (name, source_url, season)"
+        )
+        print(f"Migrated trends schema to v2 (removed {removed} duplicate trends)")
+
+    if version < 3:
+        # Generation counter bumped on every trend write; caches in any
+        # process compare against it to know when their snapshot is stale
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS trend_meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        """)
+        conn.execute("INSERT OR IGNORE INTO trend_meta (key, value) VALUES ('generation', 0)")
+        print("Migrated trends schema to v3 (added trend generation counter)")
+
+    if version < 4:
+        _create_fts_index(conn)
+        print("Migrated trends schema to v4 (added full-text search index)")
+
+    if version < 5:
+        _create_ingest_batch_tables(conn)
+        print("Migrated trends schema to v5 (added batch ingestion state)")
+
+    if version < SCHEMA_VERSION:
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+
+def _create_attribute_tables(conn: sqlite3.Connection) -> None:
+    """Create the normalized attribute tables and the trend indexes."""
+    for table in ATTRIBUTE_TABLES:
+        # (trend_id, value) primary key serves EXISTS probes from the trends side;
+        # the value index serves lookups that start from an attribute
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                trend_id INTEGER NOT NULL REFERENCES trends(id) ON DELETE CASCADE,
+                value TEXT NOT NULL,
+                PRIMARY KEY (trend_id, value)
+            ) WITHOUT ROWID
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_value ON {table} (value, trend_id)")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trends_region_created ON trends (region, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trends_created ON trends (created_at)")
+
+
+def _create_fts_index(conn: sqlite3.Connection) -> None:
+    """
+    Create the trends_fts index over FTS_COLUMNS and the triggers that keep it in sync.
+
+    trends_fts is an external-content table: it stores only the index and
+    reads column text back from trends. The triggers mirror every insert,
+    update (including upsert conflicts) and delete on trends, so writes
+    through upsert_trends update the index in the same transaction. The
+    JSON list columns are indexed as-is; the tokenizer treats brackets and
+    quotes as separators.
+    """
+    columns = [column for column, _ in FTS_COLUMNS]
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS trends_fts USING fts5(
+            {column_list},
+            content='trends',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
         )
     """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trends_fts_insert AFTER INSERT ON trends BEGIN
+            INSERT INTO trends_fts (rowid, {column_list}) VALUES (new.id, {new_values});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trends_fts_delete AFTER DELETE ON trends BEGIN
+            INSERT INTO trends_fts (trends_fts, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trends_fts_update AFTER UPDATE ON trends BEGIN
+            INSERT INTO trends_fts (trends_fts, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO trends_fts (rowid, {column_list}) VALUES (new.id, {new_values});
+        END
+    """)
+    conn.execute("INSERT INTO trends_fts (trends_fts) VALUES ('rebuild')")
 
-    conn.commit()
-    conn.close()
-    print(f"Database initialized at {DB_PATH}")
+
+def _backfill_attribute_tables(conn: sqlite3.Connection) -> int:
+    """
+    Populate the attribute tables from the JSON columns of existing trends.
+
+    Returns:
+        Number of trends indexed
+    """
+    columns = ", ".join(ATTRIBUTE_TABLES.values())
+    rows = conn.execute(f"SELECT id, {columns} FROM trends").fetchall()
+
+    decoded = []
+    for row in rows:
+        trend = {}
+        for column in ATTRIBUTE_TABLES.values():
+            try:
+                trend[column] = json.loads(row[column] or "[]")
+            except json.JSONDecodeError:
+                trend[column] = []
+        decoded.append((row["id"], trend))
+    _write_trend_attributes(conn, decoded)
+
+    return len(rows)
+
+
+def _write_trend_attributes(
+    conn: sqlite3.Connection,
+    trends: List[Tuple[int, Dict[str, Any]]]
+) -> None:
+    """
+    Write the list-valued fields of trends into the attribute tables.
+
+    Args:
+        conn: Writer connection
+        trends: (trend_id, trend dictionary) pairs
+    """
+    for table, column in ATTRIBUTE_TABLES.items():
+        rows = []
+        for trend_id, trend in trends:
+            values = trend.get(column) or []
+            if isinstance(values, str):
+                values = [values]
+            rows.extend((trend_id, str(value)) for value in values)
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {table} (trend_id, value) VALUES (?, ?)",
+            rows
+        )
+
+
+def _serialize_trend(trend: Dict[str, Any], now: str) -> Tuple[Any, ...]:
+    """
+    Convert a trend dictionary into a row tuple in TREND_COLUMNS order.
+
+    Raises:
+        ValueError: If the trend is not a dictionary or has no name
+        TypeError: If a list field cannot be JSON encoded
+    """
+    if not isinstance(trend, dict):
+        raise ValueError(f"expected a trend object, got {type(trend).__name__}")
+    if not trend.get("name"):
+        raise ValueError("trend has no name")
+
+    row = []
+    for column, default in TREND_COLUMNS:
+        value = trend.get(column, default)
+        if isinstance(default, list):
+            value = json.dumps(value if value is not None else [])
+        elif value is None:
+            value = now if column == "published_at" else default
+        row.append(value)
+    return tuple(row)
+
+
+def upsert_trends(trends: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Write trends in a single transaction, deduplicating on (name, source_url, season).
+
+    New keys are inserted, existing keys whose content changed are updated
+    in place, and exact re-extractions are skipped. Rows that can't be
+    serialized or written are collected rather than aborting the batch.
+
+    Args:
+        trends: List of trend dictionaries matching the trend schema
+
+    Returns:
+        Dictionary with inserted, updated and skipped counts plus a
+        failed list of {"name", "error"} entries
+    """
+    result = {"inserted": 0, "updated": 0, "skipped": 0, "failed": []}
+    if not trends:
+        return result
+
+    # Serialize once; a later row with the same key supersedes an earlier one
+    now = datetime.now().isoformat()
+    columns = [column for column, _ in TREND_COLUMNS]
+    key_positions = [columns.index(column) for column in TREND_KEY_COLUMNS]
+    compare_positions = [
+        i for i, column in enumerate(columns)
+        if column not in TREND_VOLATILE_COLUMNS
+    ]
+
+    batch: Dict[Tuple[Any, ...], Tuple[Tuple[Any, ...], Dict[str, Any]]] = {}
+    for trend in trends:
+        try:
+            row = _serialize_trend(trend, now)
+        except (ValueError, TypeError) as e:
+            name = trend.get("name", "unknown") if isinstance(trend, dict) else "unknown"
+            result["failed"].append({"name": name, "error": str(e)})
+            continue
+        key = tuple(row[i] for i in key_positions)
+        if key in batch:
+            result["skipped"] += 1
+        batch[key] = (row, trend)
+
+    if not batch:
+        return result
+
+    column_list = ", ".join(columns)
+    placeholders = ", ".join("?" for _ in columns)
+    updates = ", ".join(
+        f"{column} = excluded.{column}" for column in columns
+        if column not in TREND_KEY_COLUMNS
+    )
+    upsert_sql = f"""
+        INSERT INTO trends ({column_list}) VALUES ({placeholders})
+        ON CONFLICT (name, source_url, season) DO UPDATE SET {updates}
+    """
+
+    with get_pool().writer() as conn:
+        if not conn.in_transaction:
+            # Take the write lock up front so the existing-row snapshot below
+            # can't be invalidated by another process before we write
+            conn.execute("BEGIN IMMEDIATE")
+
+        conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS batch_trend_keys "
+            "(name TEXT, source_url TEXT, season TEXT)"
+        )
+        conn.execute("DELETE FROM batch_trend_keys")
+        conn.executemany("INSERT INTO batch_trend_keys VALUES (?, ?, ?)", list(batch))
+
+        existing = {}
+        for row in conn.execute(f"""
+            SELECT t.id, t.{", t.".join(columns)} FROM trends t
+            JOIN batch_trend_keys k
+              ON t.name = k.name AND t.source_url = k.source_url AND t.season = k.season
+        """):
+            values = tuple(row)[1:]
+            existing[tuple(values[i] for i in key_positions)] = (row["id"], values)
+
+        to_write = []
+        changed_ids = []
+        for key, (row, trend) in batch.items():
+            if key not in existing:
+                to_write.append((key, row, trend))
+                continue
+            trend_id, current = existing[key]
+            if all(row[i] == current[i] for i in compare_positions):
+                result["skipped"] += 1
+            else:
+                to_write.append((key, row, trend))
+                changed_ids.append(trend_id)
+
+        try:
+            conn.execute("SAVEPOINT upsert_batch")
+            conn.executemany(upsert_sql, [row for _, row, _ in to_write])
+            conn.execute("RELEASE upsert_batch")
+        except sqlite3.Error:
+            # Isolate the bad rows instead of losing the whole batch
+            conn.execute("ROLLBACK TO upsert_batch")
+            conn.execute("RELEASE upsert_batch")
+            written = []
+            for key, row, trend in to_write:
+                try:
+                    conn.execute(upsert_sql, row)
+                    written.append((key, row, trend))
+                except sqlite3.Error as e:
+                    result["failed"].append({"name": key[0], "error": str(e)})
+                    if key in existing:
+                        changed_ids.remove(existing[key][0])
+            to_write = written
+
+        # Re-sync attribute rows for everything written in this batch
+        for table in ATTRIBUTE_TABLES:
+            conn.executemany(
+                f"DELETE FROM {table} WHERE trend_id = ?",
+                [(trend_id,) for trend_id in changed_ids]
+            )
+        ids = {}
+        for row in conn.execute("""
+            SELECT t.id, t.name, t.source_url, t.season FROM trends t
+            JOIN batch_trend_keys k
+              ON t.name = k.name AND t.source_url = k.source_url AND t.season = k.season
+        """):
+            ids[(row["name"], row["source_url"], row["season"])] = row["id"]
+        _write_trend_attributes(conn, [(ids[key], trend) for key, _, trend in to_write])
+        conn.execute("DELETE FROM batch_trend_keys")
+
+        result["updated"] = len(changed_ids)
+        result["inserted"] = len(to_write) - len(changed_ids)
+        if to_write:
+            _bump_generation(conn)
+
+    if to_write:
+        _trend_cache.invalidate()
+
+    return result
+
+
+def describe_failures(failed: List[Dict[str, Any]], limit: int = 3) -> str:
+    """
+    Summarize upsert_trends failures for a one-line log message.
+
+    Args:
+        failed: The "failed" list from upsert_trends
+        limit: Most failures to name
+
+    Returns:
+        "; failed: name (error), ..." naming the first few failures, or "" if none
+    """
+    if not failed:
+        return ""
+    named = ", ".join(f"{failure['name']} ({failure['error']})" for failure in failed[:limit])
+    more = f" and {len(failed) - limit} more" if len(failed) > limit else ""
+    return f"; failed: {named}{more}"
 
 
 def insert_trends(trends: List[Dict[str, Any]]) -> int:
     """
     Bulk insert trends into the database.
 
+    Thin wrapper over upsert_trends that logs the outcome.
+
     Args:
         trends: List of trend dictionaries matching the trend schema
 
     Returns:
-        Number of trends inserted
+        Number of trends inserted or updated
     """
     if not trends:
         return 0
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    result = upsert_trends(trends)
 
-    inserted_count = 0
+    print(
+        f"Inserted {result['inserted']} trends into database "
+        f"({result['updated']} updated, {result['skipped']} unchanged, "
+        f"{len(result['failed'])} failed){describe_failures(result['failed'])}"
+    )
+    return result["inserted"] + result["updated"]
 
-    for trend in trends:
+
+# ============================================================================
+# Trend Snapshot Cache
+# ============================================================================
+
+def _bump_generation(conn: sqlite3.Connection) -> None:
+    """Advance the trend generation inside the caller's write transaction."""
+    conn.execute("UPDATE trend_meta SET value = value + 1 WHERE key = 'generation'")
+
+
+def get_trend_generation() -> int:
+    """
+    Get the current trend generation from the database.
+
+    Returns:
+        Generation counter (0 if the meta table has not been created yet)
+    """
+    with get_pool().reader() as conn:
         try:
-            # Convert list fields to JSON strings
-            garment_types_json = json.dumps(trend.get("garment_types", []))
-            style_tags_json = json.dumps(trend.get("style_tags", []))
-            colour_palette_json = json.dumps(trend.get("colour_palette", []))
-            contexts_json = json.dumps(trend.get("contexts", []))
-            climate_suitability_json = json.dumps(trend.get("climate_suitability", []))
-            key_items_json = json.dumps(trend.get("key_items", []))
-            avoid_for_body_types_json = json.dumps(trend.get("avoid_for_body_types", []))
-
-            cursor.execute("""
-                INSERT INTO trends (
-                    name, season, garment_types, gender_focus, style_tags,
-                    colour_palette, fit_notes, contexts, formality,
-                    climate_suitability, region, key_items, avoid_for_body_types,
-                    source_title, source_url, published_at, confidence
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                trend.get("name", ""),
-                trend.get("season", "All season"),
-                garment_types_json,
-                trend.get("gender_focus", "all"),
-                style_tags_json,
-                colour_palette_json,
-                trend.get("fit_notes", ""),
-                contexts_json,
-                trend.get("formality", "casual"),
-                climate_suitability_json,
-                trend.get("region", "global"),
-                key_items_json,
-                avoid_for_body_types_json,
-                trend.get("source_title", ""),
-                trend.get("source_url", ""),
-                trend.get("published_at", datetime.now().isoformat()),
-                trend.get("confidence", "medium")
-            ))
-            inserted_count += 1
-        except Exception as e:
-            print(f"Error inserting trend '{trend.get('name', 'unknown')}': {e}")
-            continue
+            row = conn.execute("SELECT value FROM trend_meta WHERE key = 'generation'").fetchone()
+        except sqlite3.OperationalError:
+            return 0
+    return row["value"] if row else 0
+
+
+class TrendCache:
+    """
+    Read-through LRU cache of parsed get_recent_trends results.
+
+    Entries are valid for one trend generation. Writes in this process
+    invalidate immediately; writes from other processes (update_trends.py,
+    other workers) are noticed by re-reading the generation at most once
+    per check_interval, so a hot lookup makes no database calls.
+    """
+
+    def __init__(self, max_entries: int = TREND_CACHE_SIZE, check_interval: float = TREND_CACHE_CHECK_INTERVAL):
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self._entries: "OrderedDict[Tuple[Any, ...], List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+        self._checked_at = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation_checks = 0
+
+    def _current_generation(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            if self._generation is not None and now - self._checked_at < self.check_interval:
+                return self._generation
+
+        generation = get_trend_generation()
+        with self._lock:
+            self.generation_checks += 1
+            self._checked_at = now
+            if generation != self._generation:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._generation = generation
+            return generation
+
+    def get(self, key: Tuple[Any, ...]) -> Tuple[Optional[List[Dict[str, Any]]], int]:
+        """
+        Look up a cached result.
+
+        Returns:
+            (trends or None, generation the caller should pass to put on a miss)
+        """
+        generation = self._current_generation()
+        with self._lock:
+            trends = self._entries.get(key)
+            if trends is None:
+                self.misses += 1
+                return None, generation
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Shallow copies so callers can't mutate the cached snapshot
+        return [dict(trend) for trend in trends], generation
+
+    def put(self, key: Tuple[Any, ...], trends: List[Dict[str, Any]], generation: int) -> None:
+        """Store a result read at the given generation, unless it is already stale."""
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = [dict(trend) for trend in trends]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self) -> None:
+        """Drop all entries and force the next lookup to re-read the generation."""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._generation = None
+
+    def clear(self) -> None:
+        """Drop all entries without counting an invalidation (e.g. DB_PATH changed)."""
+        with self._lock:
+            self._entries.clear()
+            self._generation = None
 
-    conn.commit()
-    conn.close()
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get cache hit/miss/eviction counters.
 
-    print(f"Inserted {inserted_count} trends into database")
-    return inserted_count
+        Returns:
+            Dictionary of counters, current size and generation
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "generation": self._generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "generation_checks": self.generation_checks,
+            }
+
+
+_trend_cache = TrendCache()
+
+
+def get_trend_cache_metrics() -> Dict[str, Any]:
+    """
+    Get hit/miss/eviction counters for the trend snapshot cache.
+
+    Returns:
+        Dictionary of cache counters
+    """
+    return _trend_cache.metrics()
 
 
 def get_recent_trends(
     limit: int = 40,
     region: Optional[str] = None,
-    contexts: Optional[List[str]] = None
+    contexts: Optional[List[str]] = None,
+    use_cache: bool = True,
+    search: Optional[str] = None
 ) -> List[Dict[str, Any]]:
     """
     Query recent trends from the database with optional filters.
 
+    Results are served from the trend snapshot cache until the next trend write.
+
     Args:
         limit: Maximum number of trends to return (default 40)
         region: Optional region filter (e.g., "India", "global")
         contexts: Optional list of context filters (e.g., ["office", "party"])
+        use_cache: Set False to bypass the cache and always query SQLite
+        search: Optional free-text query; when set, only matching trends are
+            returned, ordered by relevance instead of recency
 
     Returns:
         List of trend dictionaries with JSON fields parsed
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    def query() -> List[Dict[str, Any]]:
+        if search:
+            return search_trends(search, limit=limit, region=region, contexts=contexts)
+        return _query_recent_trends(limit, region, contexts)
+
+    if not use_cache:
+        return query()
+
+    key = (region, tuple(sorted(set(contexts))) if contexts else None, limit, search)
+    trends, generation = _trend_cache.get(key)
+    if trends is not None:
+        return trends
+
+    trends = query()
+    _trend_cache.put(key, trends, generation)
+    return trends
+
+
+def _query_recent_trends(
+    limit: int,
+    region: Optional[str],
+    contexts: Optional[List[str]]
+) -> List[Dict[str, Any]]:
+    """Run the filtered trend query against SQLite and parse the JSON fields."""
+    context_clause, context_params = _context_filter(contexts)
 
-    # Build query with filters
-    query = "SELECT * FROM trends WHERE 1=1"
-    params = []
+    order = " ORDER BY created_at DESC, id DESC LIMIT ?"
 
     if region:
-        query += " AND (region = ? OR region = 'global')"
-        params.append(region)
+        # One index range per region, each capped at limit, then merged.
+        # This keeps the (region, created_at) index usable for the ORDER BY,
+        # which an "region = ? OR region = 'global'" predicate would not.
+        branch = f"SELECT * FROM (SELECT * FROM trends WHERE region = ?{context_clause}{order})"
+        query = f"SELECT * FROM ({branch} UNION ALL {branch}){order}"
+        params = (
+            [region] + context_params + [limit]
+            + ["global"] + context_params + [limit]
+            + [limit]
+        )
+        if region == "global":
+            query = f"SELECT * FROM trends WHERE region = ?{context_clause}{order}"
+            params = [region] + context_params + [limit]
+    else:
+        query = f"SELECT * FROM trends WHERE 1=1{context_clause}{order}"
+        params = context_params + [limit]
 
-    # For contexts, we need to check if any of the provided contexts appear in the JSON array
-    # SQLite doesn't have great JSON support, so we'll do a simple LIKE check
-    if contexts:
-        context_conditions = []
-        for ctx in contexts:
-            context_conditions.append("contexts LIKE ?")
-            params.append(f'%"{ctx}"%')
-        query += " AND (" + " OR ".join(context_conditions) + ")"
+    with get_pool().reader() as conn:
+        rows = conn.execute(query, params).fetchall()
 
-    query += " ORDER BY created_at DESC LIMIT ?"
-    params.append(limit)
+    return _parse_trend_rows(rows)
+
+
+def _context_filter(contexts: Optional[List[str]]) -> Tuple[str, List[Any]]:
+    """
+    Build the SQL clause restricting trends to any of the given contexts.
+
+    Context filters probe trend_contexts through its (trend_id, value) key
+    while the trends side is walked newest-first by index.
 
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
+    Returns:
+        (clause starting with " AND", or "" when unfiltered; its parameters)
+    """
+    if not contexts:
+        return "", []
+    placeholders = ", ".join("?" for _ in contexts)
+    clause = (
+        " AND EXISTS (SELECT 1 FROM trend_contexts c"
+        f" WHERE c.trend_id = trends.id AND c.value IN ({placeholders}))"
+    )
+    return clause, list(contexts)
 
-    # Convert rows to dictionaries and parse JSON fields
+
+def _parse_trend_rows(rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+    """Convert trend rows to dictionaries with the JSON list fields parsed."""
     trends = []
     for row in rows:
         trend = dict(row)
@@ -190,6 +965,71 @@ def get_recent_trends(
     return trends
 
 
+def build_fts_query(text: str) -> str:
+    """
+    Turn free text into a safe FTS5 MATCH expression.
+
+    Every word is quoted (so FTS5 operators in user input are inert) and
+    prefix-matched, and all words must appear: "linen wide leg" becomes
+    '"linen"* "wide"* "leg"*'.
+
+    Args:
+        text: User-supplied search text
+
+    Returns:
+        MATCH expression, or "" if the text has no searchable words
+    """
+    words = re.findall(r"\w+", text.lower())
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_trends(
+    text: str,
+    limit: int = 20,
+    region: Optional[str] = None,
+    contexts: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Full-text search over trend names, fit notes, key items, style tags and colours.
+
+    Args:
+        text: Free-text query (e.g., "linen wide leg", "jhumka")
+        limit: Maximum number of trends to return (default 20)
+        region: Optional region filter (matches the region or "global")
+        contexts: Optional list of context filters
+
+    Returns:
+        Trend dictionaries ordered by BM25 relevance (newest first on ties),
+        each with a search_score where higher is more relevant
+    """
+    match = build_fts_query(text)
+    if not match:
+        return []
+
+    weights = ", ".join(str(weight) for _, weight in FTS_COLUMNS)
+    context_clause, context_params = _context_filter(contexts)
+
+    query = f"""
+        SELECT trends.*, -bm25(trends_fts, {weights}) AS search_score
+        FROM trends_fts JOIN trends ON trends.id = trends_fts.rowid
+        WHERE trends_fts MATCH ?{context_clause}
+    """
+    params: List[Any] = [match] + context_params
+    if region:
+        query += " AND trends.region IN (?, 'global')"
+        params.append(region)
+    query += " ORDER BY search_score DESC, trends.created_at DESC, trends.id DESC LIMIT ?"
+    params.append(limit)
+
+    with get_pool().reader() as conn:
+        rows = conn.execute(query, params).fetchall()
+
+    trends = _parse_trend_rows(rows)
+    for trend in trends:
+        trend["search_score"] = round(trend["search_score"], 4)
+    return trends
+
+
 def get_trend_count() -> int:
     """
     Get the total number of trends in the database.
@@ -197,14 +1037,131 @@ def get_trend_count() -> int:
     Returns:
         Total trend count
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) as count FROM trends")
-    count = cursor.fetchone()["count"]
-    conn.close()
+    with get_pool().reader() as conn:
+        count = conn.execute("SELECT COUNT(*) as count FROM trends").fetchone()["count"]
     return count
 
 
+# ============================================================================
+# Batch Ingestion State
+# ============================================================================
+
+# ingest_batches.status once every result has been written back
+INGEST_BATCH_COMPLETE = "complete"
+
+
+def _create_ingest_batch_tables(conn: sqlite3.Connection) -> None:
+    """Create the tables tracking Message Batches submitted by update_trends.py."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_batches (
+            batch_id TEXT PRIMARY KEY,
+            backend TEXT NOT NULL,
+            status TEXT NOT NULL,
+            submitted_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    # outcome stays NULL until the request's result has been processed, so a
+    # resumed run skips everything already written to the trends table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_batch_requests (
+            batch_id TEXT NOT NULL REFERENCES ingest_batches(batch_id) ON DELETE CASCADE,
+            custom_id TEXT NOT NULL,
+            source_title TEXT NOT NULL,
+            source_url TEXT NOT NULL,
+            cache_key TEXT NOT NULL,
+            outcome TEXT,
+            trends_stored INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (batch_id, custom_id)
+        ) WITHOUT ROWID
+    """)
+
+
+def save_ingest_batch(batch_id: str, backend: str, requests: List[Dict[str, Any]]) -> None:
+    """
+    Record a submitted batch and its requests.
+
+    Args:
+        batch_id: Batch ID returned by the backend
+        backend: Backend name, so a resumed run polls the same service
+        requests: Dictionaries with custom_id, source_title, source_url and cache_key
+    """
+    now = datetime.now().isoformat()
+    with get_pool().writer() as conn:
+        conn.execute(
+            "INSERT INTO ingest_batches (batch_id, backend, status, submitted_at, updated_at) "
+            "VALUES (?, ?, 'submitted', ?, ?)",
+            (batch_id, backend, now, now)
+        )
+        conn.executemany(
+            "INSERT INTO ingest_batch_requests (batch_id, custom_id, source_title, source_url, cache_key) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (batch_id, r["custom_id"], r["source_title"], r["source_url"], r["cache_key"])
+                for r in requests
+            ]
+        )
+
+
+def get_unfinished_ingest_batch() -> Optional[Dict[str, Any]]:
+    """
+    Get the most recent batch whose results have not all been written back.
+
+    Returns:
+        Dictionary with batch_id, backend, status and requests (custom_id ->
+        request row), or None if every batch is complete
+    """
+    with get_pool().reader() as conn:
+        batch = conn.execute(
+            "SELECT batch_id, backend, status FROM ingest_batches WHERE status != ? "
+            "ORDER BY submitted_at DESC LIMIT 1",
+            (INGEST_BATCH_COMPLETE,)
+        ).fetchone()
+        if batch is None:
+            return None
+        rows = conn.execute(
+            "SELECT * FROM ingest_batch_requests WHERE batch_id = ?", (batch["batch_id"],)
+        ).fetchall()
+
+    return {
+        **dict(batch),
+        "requests": {row["custom_id"]: dict(row) for row in rows},
+    }
+
+
+def set_ingest_batch_status(batch_id: str, status: str) -> None:
+    """
+    Update a batch's status (the backend's processing_status, or INGEST_BATCH_COMPLETE).
+
+    Args:
+        batch_id: Batch ID
+        status: New status
+    """
+    with get_pool().writer() as conn:
+        conn.execute(
+            "UPDATE ingest_batches SET status = ?, updated_at = ? WHERE batch_id = ?",
+            (status, datetime.now().isoformat(), batch_id)
+        )
+
+
+def record_ingest_result(batch_id: str, custom_id: str, outcome: str, trends_stored: int) -> None:
+    """
+    Mark one batch request as processed.
+
+    Args:
+        batch_id: Batch ID
+        custom_id: Request ID within the batch
+        outcome: Result type (succeeded, errored, canceled, expired)
+        trends_stored: Trends inserted or updated from this result
+    """
+    with get_pool().writer() as conn:
+        conn.execute(
+            "UPDATE ingest_batch_requests SET outcome = ?, trends_stored = ? "
+            "WHERE batch_id = ? AND custom_id = ?",
+            (outcome, trends_stored, batch_id, custom_id)
+        )
+
+
 if __name__ == "__main__":
     # Initialize database when run directly
     init_db()
@@ -0,0 +1,361 @@
+"""
+Execution model for blocking work in Alex Fashion Stylist
+Dedicated bounded thread pools keep SQLite, Claude and Gemini/Veo calls off the
+event loop, and an event-loop lag monitor shows when something slips through
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from metrics import LatencyStats
+
+
+T = TypeVar("T")
+
+# Worker threads per pool. Pools are separate so a burst of slow Veo calls
+# can't starve /health of a database thread, and vice versa.
+EXECUTOR_SIZES = {
+    "db": int(os.getenv("ALEX_DB_WORKERS", os.getenv("ALEX_DB_READ_POOL_SIZE", "8"))),
+    "llm": int(os.getenv("ALEX_LLM_WORKERS", "16")),
+    "media": int(os.getenv("ALEX_MEDIA_WORKERS", "8")),
+    # Sub-calls fanned out by a media task (e.g. the angles of a multi-angle
+    # request); separate from "media" so a task never waits on its own pool
+    "fanout": int(os.getenv("ALEX_FANOUT_WORKERS", "16")),
+}
+
+# How often the lag monitor wakes up, in seconds
+LOOP_LAG_INTERVAL = float(os.getenv("ALEX_LOOP_LAG_INTERVAL", "0.25"))
+
+
+class BoundedExecutor:
+    """
+    Named thread pool with queue-depth and timing instrumentation.
+
+    Tasks keep the caller's contextvars, so request-scoped context set in
+    an endpoint is still visible inside the worker thread.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=f"alex-{name}"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._queue_wait = LatencyStats()
+        self._run_time = LatencyStats()
+
+    def _instrumented(
+        self,
+        fn: Callable[..., T],
+        args: Any,
+        kwargs: Any,
+        state: Dict[str, bool]
+    ) -> Callable[[], T]:
+        context = contextvars.copy_context()
+        submitted = time.perf_counter()
+
+        def task() -> T:
+            started = time.perf_counter()
+            with self._lock:
+                if state["abandoned"]:
+                    raise asyncio.CancelledError()
+                state["started"] = True
+                self._queued -= 1
+                self._running += 1
+            self._queue_wait.record((started - submitted) * 1000)
+            failed = False
+            try:
+                return context.run(fn, *args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                self._run_time.record((time.perf_counter() - started) * 1000)
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+                    if failed:
+                        self._failed += 1
+
+        with self._lock:
+            self._queued += 1
+        return task
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run a blocking callable on this pool and await its result.
+
+        Args:
+            fn: Blocking function to call
+            *args: Positional arguments for fn
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            Whatever fn returns (exceptions propagate to the awaiting coroutine)
+        """
+        state = {"started": False, "abandoned": False}
+        task = self._instrumented(fn, args, kwargs, state)
+        future = asyncio.get_running_loop().run_in_executor(self._executor, task)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # A task that hasn't started is abandoned; one already running
+            # finishes in its thread and its result is discarded
+            with self._lock:
+                if not state["started"]:
+                    state["abandoned"] = True
+                    self._queued -= 1
+            raise
+
+    def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> "Future[T]":
+        """
+        Run a blocking callable on this pool from a thread.
+
+        Args:
+            fn: Blocking function to call
+            *args: Positional arguments for fn
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            concurrent.futures.Future for fn's result
+        """
+        task = self._instrumented(fn, args, kwargs, {"started": False, "abandoned": False})
+        future = self._executor.submit(task)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: "Future[Any]") -> None:
+        # A future cancelled before it started never runs its task
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def shutdown(self) -> None:
+        """Stop accepting work and release idle threads."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get queue depth, utilisation and timing for this pool.
+
+        Returns:
+            Dictionary of gauges and latency summaries
+        """
+        with self._lock:
+            gauges = {
+                "max_workers": self.max_workers,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+            }
+        gauges["queue_wait"] = self._queue_wait.snapshot()
+        gauges["run_time"] = self._run_time.snapshot()
+        return gauges
+
+
+_executors: Dict[str, BoundedExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name: str) -> BoundedExecutor:
+    """
+    Get a named executor, creating it on first use.
+
+    Args:
+        name: One of EXECUTOR_SIZES ("db", "llm", "media", "fanout")
+
+    Raises:
+        KeyError: If the name is not a configured pool
+    """
+    executor = _executors.get(name)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                executor = BoundedExecutor(name, EXECUTOR_SIZES[name])
+                _executors[name] = executor
+    return executor
+
+
+async def run_blocking(pool: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a blocking callable on a named executor from async code.
+
+    Args:
+        pool: Executor name ("db", "llm" or "media")
+        fn: Blocking function to call
+        *args: Positional arguments for fn
+        **kwargs: Keyword arguments for fn
+
+    Returns:
+        Whatever fn returns
+    """
+    return await get_executor(pool).run(fn, *args, **kwargs)
+
+
+def run_concurrently(
+    pool: str,
+    calls: List[Callable[[], T]],
+    max_concurrency: int,
+    timeout: Optional[float] = None
+) -> List[Tuple[Optional[T], Optional[BaseException], float]]:
+    """
+    Run blocking calls on a named executor, at most max_concurrency at a time.
+
+    For use from worker threads (e.g. a "media" task fanning out to
+    "fanout"). A call still running after timeout seconds is reported as
+    timed out and its slot is freed; the thread itself can't be interrupted,
+    so it finishes in the background and its result is discarded. Calls
+    that haven't started when the caller stops waiting are cancelled.
+
+    Args:
+        pool: Executor name
+        calls: Zero-argument callables
+        max_concurrency: Most calls in flight at once
+        timeout: Per-call limit in seconds, counted from when the call starts
+            running (time queued behind max_concurrency or the pool doesn't
+            use it up)
+
+    Returns:
+        (result, error, elapsed_ms) for each call, in the order of calls;
+        elapsed_ms is the call's running time
+    """
+    executor = get_executor(pool)
+    outcomes: List[Optional[Tuple[Optional[T], Optional[BaseException], float]]] = [None] * len(calls)
+    pending = list(enumerate(calls))
+    pending.reverse()
+    running: Dict["Future[T]", int] = {}
+    # Set by each call as it starts running, so its clock excludes queueing
+    started_at: Dict[int, float] = {}
+
+    def timed(index: int, call: Callable[[], T]) -> Callable[[], T]:
+        def run() -> T:
+            started_at[index] = time.perf_counter()
+            return call()
+        return run
+
+    try:
+        while pending or running:
+            while pending and len(running) < max(max_concurrency, 1):
+                index, call = pending.pop()
+                running[executor.submit(timed(index, call))] = index
+
+            wait_for = None
+            if timeout is not None:
+                # A call that starts during this wait has a deadline after it,
+                # so waking at least every timeout seconds never misses one
+                now = time.perf_counter()
+                deadlines = [
+                    started_at[index] + timeout if index in started_at else now + timeout
+                    for index in running.values()
+                ]
+                wait_for = max(min(deadlines) - now, 0.0)
+            done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            now = time.perf_counter()
+            for future, index in list(running.items()):
+                started = started_at.get(index)
+                elapsed_ms = (now - started) * 1000 if started is not None else 0.0
+                if future in done:
+                    error = future.exception()
+                    outcomes[index] = (None if error else future.result(), error, elapsed_ms)
+                elif timeout is not None and started is not None and now - started >= timeout:
+                    future.cancel()
+                    outcomes[index] = (None, TimeoutError(f"Timed out after {timeout:g}s"), elapsed_ms)
+                else:
+                    continue
+                del running[future]
+    finally:
+        # Don't let queued calls spend upstream quota after we've given up on them
+        for future in running:
+            future.cancel()
+
+    return outcomes
+
+
+def shutdown_executors() -> None:
+    """Shut down every executor (used on application shutdown)."""
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown()
+        _executors.clear()
+
+
+def get_executor_metrics() -> Dict[str, Any]:
+    """
+    Get metrics for every executor created so far.
+
+    Returns:
+        Dictionary of executor name to metrics
+    """
+    with _executors_lock:
+        executors = dict(_executors)
+    return {name: executor.metrics() for name, executor in executors.items()}
+
+
+# ============================================================================
+# Event Loop Lag Monitor
+# ============================================================================
+
+class EventLoopLagMonitor:
+    """
+    Measures how late the event loop wakes a sleeping task.
+
+    Any lag well above zero means something ran blocking code on the loop
+    and every other request on this worker waited for it.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self._lag = LatencyStats()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - start - self.interval
+            self._lag.record(max(0.0, lag) * 1000)
+
+    def start(self) -> None:
+        """Start sampling on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop sampling."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get the event-loop lag summary.
+
+        Returns:
+            Dictionary with sampling interval and lag latency summary
+        """
+        return {
+            "interval_ms": self.interval * 1000,
+            "running": self._task is not None and not self._task.done(),
+            "lag": self._lag.snapshot(),
+        }
+
+
+loop_lag_monitor = EventLoopLagMonitor()
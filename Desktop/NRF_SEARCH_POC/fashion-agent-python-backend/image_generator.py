@@ -4,10 +4,54 @@ Uses Google's Gemini 2.5 Flash Image and Imagen 3 with Claude fallback
 """
 import os
 import base64
-from typing import Optional
-from google import genai
+import time
+from typing import List, Optional
 from google.genai import types
 
+from executors import run_concurrently
+from media_cache import MEDIA_CACHE_ENABLED, make_media_key, media_cache
+from model_health import model_health
+from providers import claude_is_stubbed, create_google_client
+from resilience import CircuitOpenError, call_with_retry
+from telemetry import estimate_cost, extract_usage
+
+
+# Fallback chain for text-to-image, in order of preference. Imagen 3 and the
+# Claude prompt-enhancement fallback come after these Gemini models.
+GEMINI_IMAGE_MODELS = [
+    'gemini-2.5-flash-image',
+    'gemini-2.0-flash-preview-image-generation',
+    'gemini-2.0-flash-thinking-exp-01-21',
+]
+IMAGEN_MODEL = 'imagen-3.0-generate-001'
+IMAGEN_FALLBACK_DEPTH = len(GEMINI_IMAGE_MODELS)
+CLAUDE_FALLBACK_DEPTH = IMAGEN_FALLBACK_DEPTH + 1
+
+# Multi-angle requests generate their angles concurrently: at most this many
+# at once, each given up on after MULTI_ANGLE_TIMEOUT seconds
+MULTI_ANGLE_CONCURRENCY = int(os.getenv("ALEX_MULTI_ANGLE_CONCURRENCY", "4"))
+MULTI_ANGLE_TIMEOUT = float(os.getenv("ALEX_MULTI_ANGLE_TIMEOUT", "120"))
+# Extra attempts a multi-angle request may spend re-running failed angles
+# (in total, not per angle)
+MULTI_ANGLE_RETRY_BUDGET = int(os.getenv("ALEX_MULTI_ANGLE_RETRIES", "2"))
+
+# Outfit variations: "fanout" (default) runs every modifier variation through
+# the full fallback chain concurrently. "batch" (opt-in) drops the modifiers
+# and asks Imagen for IMAGEN_MAX_IMAGES_PER_CALL samples of the base prompt
+# per generate_images call, since Imagen applies one prompt to every image
+VARIATIONS_MODE = os.getenv("ALEX_VARIATIONS_MODE", "fanout")
+VARIATIONS_CONCURRENCY = int(os.getenv("ALEX_VARIATIONS_CONCURRENCY", "4"))
+VARIATIONS_TIMEOUT = float(os.getenv("ALEX_VARIATIONS_TIMEOUT", "120"))
+# Most images Imagen returns from one call (number_of_images)
+IMAGEN_MAX_IMAGES_PER_CALL = 4
+
+# Modifiers that make each variation distinct; later ones are numbered
+VARIATION_MODIFIERS = [
+    "Styling variation 1: Classic interpretation with traditional accessories",
+    "Styling variation 2: Modern twist with contemporary accessories and bold styling choices",
+    "Styling variation 3: Fashion-forward approach with unique accessories and creative details"
+]
+
 
 class ImageGeneratorError(Exception):
     """Custom exception for image generation errors"""
@@ -33,38 +77,250 @@ def get_gemini_api_key() -> str:
             "Get your API key from: https://makersuite.google.com/app/apikey"
         )
 
-    print(f"🔑 Using API key: {api_key[:20]}...")  # Debug: Show first 20 chars
     return api_key
 
 
+def _probe_model(model: str) -> None:
+    """Check a skipped Gemini/Imagen model is back (a metadata lookup, not a generation)."""
+    create_google_client(get_gemini_api_key).models.get(model=model)
+
+
+model_health.register_prober("gemini", _probe_model)
+model_health.register_prober("imagen", _probe_model)
+
+
+def _select_angles(angles, only_angles):
+    """
+    Narrow a multi-angle request to the named angles.
+
+    Raises:
+        ValueError: If a name isn't one of the request's angles
+    """
+    if not only_angles:
+        return angles
+    names = [angle_name for angle_name, _ in angles]
+    unknown = [name for name in only_angles if name not in names]
+    if unknown:
+        raise ValueError(f"Unknown angle(s) {', '.join(unknown)}; expected one of {', '.join(names)}")
+    return [(angle_name, description) for angle_name, description in angles if angle_name in only_angles]
+
+
+def _generate_angles(angles, generate_angle, retry_budget: int = MULTI_ANGLE_RETRY_BUDGET):
+    """
+    Generate every angle concurrently, then retry only the failed ones.
+
+    Each round re-runs the angles that failed in the previous one, until all
+    have succeeded or retry_budget extra attempts (across all angles) are
+    spent. Angles rejected by an open circuit breaker aren't retried, nor are
+    timed-out ones: their first call is still running in the background, so
+    they are returned with status "timeout" for the client to regenerate.
+
+    Args:
+        angles: (angle name, description) pairs
+        generate_angle: Called with (angle name, description); returns a
+            base64 image or raises
+        retry_budget: Extra attempts allowed for the whole request
+
+    Returns:
+        (angle_results, timing): per-angle status in angle order
+        ({"angle", "status": "success"/"failed"/"timeout", "attempts",
+        "error" if not successful, "image_data" if successful}), and the
+        wall-clock ms plus total ms spent on each angle
+    """
+    start = time.perf_counter()
+    angle_results = {
+        angle_name: {"angle": angle_name, "status": "failed", "attempts": 0, "elapsed_ms": 0.0}
+        for angle_name, _ in angles
+    }
+
+    pending = list(angles)
+    while pending:
+        # Outcomes come back in angle order whichever finishes first
+        outcomes = run_concurrently(
+            "fanout",
+            [
+                lambda name=angle_name, description=description: generate_angle(name, description)
+                for angle_name, description in pending
+            ],
+            MULTI_ANGLE_CONCURRENCY,
+            MULTI_ANGLE_TIMEOUT
+        )
+        failed = []
+        for (angle_name, description), (image_data, error, elapsed_ms) in zip(pending, outcomes):
+            angle_result = angle_results[angle_name]
+            angle_result["attempts"] += 1
+            angle_result["elapsed_ms"] += elapsed_ms
+            if error is None:
+                angle_result.pop("error", None)
+                angle_result.update(status="success", image_data=image_data)
+                print(f"  ✅ {angle_name.capitalize()} view generated")
+            else:
+                angle_result.update(
+                    status="timeout" if isinstance(error, TimeoutError) else "failed",
+                    error=str(error) or type(error).__name__
+                )
+                print(f"  ❌ {angle_name.capitalize()} view failed: {angle_result['error']}")
+                # Retrying against an open circuit would fail immediately, and
+                # retrying a timeout would pay for a second concurrent generation
+                if not isinstance(error, (CircuitOpenError, TimeoutError)):
+                    failed.append((angle_name, description))
+
+        pending = failed[:retry_budget]
+        retry_budget -= len(pending)
+        if pending:
+            print(f"  🔁 Retrying {', '.join(angle_name for angle_name, _ in pending)}...")
+
+    timing = {
+        "wall_ms": round((time.perf_counter() - start) * 1000, 1),
+        "angles_ms": {
+            angle_name: round(angle_results[angle_name].pop("elapsed_ms"), 1) for angle_name, _ in angles
+        },
+    }
+    return [angle_results[angle_name] for angle_name, _ in angles], timing
+
+
+def _collect_angles(results: dict, angle_results) -> None:
+    """
+    Fill a multi-angle result from per-angle outcomes.
+
+    images/angles list the successful angles in order (what clients display);
+    angle_results keeps every angle's status without the image data, and
+    failed_angles names the ones a client can ask to regenerate.
+    """
+    results['images'] = [r['image_data'] for r in angle_results if r['status'] == 'success']
+    results['angles'] = [r['angle'] for r in angle_results if r['status'] == 'success']
+    results['angle_results'] = [
+        {key: value for key, value in r.items() if key != 'image_data'} for r in angle_results
+    ]
+    results['failed_angles'] = [r['angle'] for r in angle_results if r['status'] != 'success']
+    if results['failed_angles']:
+        results['status'] = "partial"
+
+
+def _generate_reference_angle(
+    client,
+    image_bytes: bytes,
+    angle_name: str,
+    angle_instruction: str,
+    prompt: str,
+    style: str
+) -> str:
+    """
+    Generate one angle of the reference image with Gemini 2.5 Flash Image.
+
+    Returns:
+        Base64 encoded image
+
+    Raises:
+        ImageGeneratorError: If no image was generated
+    """
+    from google.genai.types import Part, Content
+
+    # Create multimodal prompt with image + text
+    enhanced_prompt = f"""{angle_instruction}.
+
+Maintain the exact same:
+- Person (same face, body type, skin tone)
+- Outfit (same dress/clothing items, colors, patterns)
+- Accessories (same clutch, jewelry, shoes)
+- Styling (same hair, makeup)
+
+Additional context: {prompt}
+
+Style: {style}, professional fashion photography
+Lighting: Professional studio lighting
+Quality: High resolution fashion editorial
+"""
+
+    response = call_with_retry(
+        "gemini:gemini-2.5-flash-image",
+        client.models.generate_content,
+        model='gemini-2.5-flash-image',
+        contents=[
+            Content(
+                parts=[
+                    Part.from_bytes(
+                        data=image_bytes,
+                        mime_type="image/png"
+                    ),
+                    Part.from_text(text=enhanced_prompt)
+                ]
+            )
+        ],
+        config=types.GenerateContentConfig(
+            response_modalities=["TEXT", "IMAGE"],
+            safety_settings=[
+                types.SafetySetting(
+                    category="HARM_CATEGORY_HARASSMENT",
+                    threshold="BLOCK_NONE"
+                ),
+                types.SafetySetting(
+                    category="HARM_CATEGORY_HATE_SPEECH",
+                    threshold="BLOCK_NONE"
+                ),
+                types.SafetySetting(
+                    category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                    threshold="BLOCK_NONE"
+                ),
+                types.SafetySetting(
+                    category="HARM_CATEGORY_DANGEROUS_CONTENT",
+                    threshold="BLOCK_NONE"
+                ),
+            ]
+        )
+    )
+
+    # Extract generated image
+    if not response.candidates:
+        raise ImageGeneratorError(f"No candidates in response for {angle_name}")
+    for part in response.candidates[0].content.parts:
+        if hasattr(part, 'inline_data') and part.inline_data:
+            return base64.b64encode(part.inline_data.data).decode()
+    raise ImageGeneratorError(f"No image generated for {angle_name}")
+
+
 def generate_multi_angle_images(
     prompt: str,
     aspect_ratio: str = "9:16",
-    style: str = "photorealistic"
+    style: str = "photorealistic",
+    only_angles: Optional[List[str]] = None
 ) -> Optional[dict]:
     """
     Generate 4-angle fashion showcase: Front, Left, Rear, Right views.
 
+    Failed angles are retried (up to MULTI_ANGLE_RETRY_BUDGET extra attempts);
+    angles that still fail don't discard the ones that succeeded.
+
     Args:
         prompt: Base outfit description
         aspect_ratio: Image aspect ratio (default "9:16")
         style: Style preset (default "photorealistic")
+        only_angles: Generate only these angles, e.g. ["left"] to regenerate
+            one that failed (default: all four)
 
     Returns:
         Dictionary containing:
-        - status: "success" or "fallback"
-        - images: List of 4 base64 images [front, left, rear, right]
-        - angles: List of angle names
+        - status: "success", "partial" (some angles failed) or "fallback"
+          (every angle failed)
+        - images: List of base64 images for the successful angles, in
+          [front, left, rear, right] order
+        - angles: Names of the successful angles, matching images
+        - angle_results: Per-angle status, attempts and error
+        - failed_angles: Names of the angles that failed
         - parameters: Generation parameters
-    """
-    print(f"🎨 Generating 4-angle fashion showcase...")
+        - timing: Wall-clock ms and ms per angle (angles run concurrently)
 
-    angles = [
+    Raises:
+        ValueError: If only_angles names an unknown angle
+    """
+    angles = _select_angles([
         ("front", "Front view, facing camera directly, centered pose"),
         ("left", "Left side profile view, 90 degrees to the left, showing full side silhouette"),
         ("rear", "Rear view, back facing camera, showing outfit from behind"),
         ("right", "Right side profile view, 90 degrees to the right, showing full side silhouette")
-    ]
+    ], only_angles)
+
+    print(f"🎨 Generating {len(angles)}-angle fashion showcase...")
 
     results = {
         "status": "success",
@@ -73,38 +329,49 @@ def generate_multi_angle_images(
         "parameters": {
             "aspect_ratio": aspect_ratio,
             "style": style,
-            "angles_count": 4
+            "angles_count": len(angles)
         }
     }
 
-    for angle_name, angle_description in angles:
-        print(f"  📸 Generating {angle_name} view...")
+    # Claude-enhanced prompt of the first angle that fell back, for the
+    # all-failed response
+    fallback_prompts = {}
 
+    def generate_angle(angle_name: str, angle_description: str) -> str:
+        print(f"  📸 Generating {angle_name} view...")
         # Append angle-specific description to base prompt
         angle_prompt = f"{prompt}. {angle_description}. Same person, same outfit, professional studio photography."
-
-        # Generate single image
         single_result = generate_image_with_nanoBanana(
             prompt=angle_prompt,
             aspect_ratio=aspect_ratio,
             style=style
         )
+        if single_result['status'] != 'success':
+            fallback_prompts.setdefault(angle_name, single_result.get('enhanced_prompt', angle_prompt))
+            raise ImageGeneratorError(single_result.get('message', f"No image generated for {angle_name}"))
+        return single_result['image_data']
+
+    angle_results, results['timing'] = _generate_angles(angles, generate_angle)
+    _collect_angles(results, angle_results)
+
+    if not results['images']:
+        first_failed = angle_results[0]
+        angle_name = first_failed['angle']
+        print(f"❌ Every angle failed, using fallback")
+        return {
+            "status": "fallback",
+            "message": f"Image generation failed at {angle_name} view: {first_failed['error']}",
+            "enhanced_prompt": fallback_prompts.get(angle_name, prompt),
+            "angle_results": results['angle_results'],
+            "failed_angles": results['failed_angles'],
+            "parameters": results['parameters'],
+            "timing": results['timing']
+        }
 
-        if single_result['status'] == 'success':
-            results['images'].append(single_result['image_data'])
-            results['angles'].append(angle_name)
-            print(f"  ✅ {angle_name.capitalize()} view generated")
-        else:
-            # If any angle fails, return fallback for all
-            print(f"  ❌ {angle_name.capitalize()} view failed, using fallback")
-            return {
-                "status": "fallback",
-                "message": f"Image generation failed at {angle_name} view",
-                "enhanced_prompt": single_result.get('enhanced_prompt', angle_prompt),
-                "parameters": results['parameters']
-            }
-
-    print(f"✅ All 4 angles generated successfully!")
+    print(
+        f"✅ {len(results['images'])}/{len(angles)} angles generated "
+        f"in {results['timing']['wall_ms']:.0f}ms!"
+    )
     return results
 
 
@@ -112,34 +379,46 @@ def generate_multi_angle_from_image(
     reference_image_base64: str,
     prompt: str,
     aspect_ratio: str = "9:16",
-    style: str = "photorealistic"
+    style: str = "photorealistic",
+    only_angles: Optional[List[str]] = None
 ) -> dict:
     """
     Generate 4-angle views using a reference image for consistency.
 
     Uses Gemini's multimodal capabilities to generate new angles
     while maintaining visual consistency with the reference image.
+    Failed angles are retried (up to MULTI_ANGLE_RETRY_BUDGET extra attempts);
+    angles that still fail don't discard the ones that succeeded.
 
     Args:
         reference_image_base64: Base64 encoded reference image
         prompt: Additional styling instructions
         aspect_ratio: Image aspect ratio (default: "9:16")
         style: Style preset (default: "photorealistic")
+        only_angles: Generate only these angles, e.g. ["left"] to regenerate
+            one that failed (default: all four)
 
     Returns:
         Dictionary containing:
-        - status: "success" or "error"
-        - images: List of 4 base64 images [front, left, back, right]
-        - angles: List of angle names
-    """
-    print(f"🎨 Generating 4-angle views from reference image...")
+        - status: "success", "partial" (some angles failed) or "error"
+        - images: List of base64 images for the successful angles, in
+          [front, left, back, right] order
+        - angles: Names of the successful angles, matching images
+        - angle_results: Per-angle status, attempts and error
+        - failed_angles: Names of the angles that failed
+        - timing: Wall-clock ms and ms per angle (angles run concurrently)
 
-    angles = [
+    Raises:
+        ValueError: If only_angles names an unknown angle
+    """
+    angles = _select_angles([
         ("front", "Show the exact same person and outfit from the front view, facing camera directly"),
         ("left", "Show the exact same person and outfit from the left side profile, 90 degrees left"),
         ("back", "Show the exact same person and outfit from the back view, back facing camera"),
         ("right", "Show the exact same person and outfit from the right side profile, 90 degrees right")
-    ]
+    ], only_angles)
+
+    print(f"🎨 Generating {len(angles)}-angle views from reference image...")
 
     results = {
         "status": "success",
@@ -152,109 +431,75 @@ def generate_multi_angle_from_image(
     }
 
     try:
-        api_key = get_gemini_api_key()
-        client = genai.Client(api_key=api_key)
+        client = create_google_client(get_gemini_api_key)
 
         # Decode base64 image
         image_bytes = base64.b64decode(reference_image_base64)
 
-        for angle_name, angle_instruction in angles:
+        def generate_angle(angle_name: str, angle_instruction: str) -> str:
             print(f"  📸 Generating {angle_name} view...")
+            return _generate_reference_angle(client, image_bytes, angle_name, angle_instruction, prompt, style)
 
-            # Create multimodal prompt with image + text
-            enhanced_prompt = f"""{angle_instruction}.
+        angle_results, results['timing'] = _generate_angles(angles, generate_angle)
+        _collect_angles(results, angle_results)
 
-Maintain the exact same:
-- Person (same face, body type, skin tone)
-- Outfit (same dress/clothing items, colors, patterns)
-- Accessories (same clutch, jewelry, shoes)
-- Styling (same hair, makeup)
-
-Additional context: {prompt}
-
-Style: {style}, professional fashion photography
-Lighting: Professional studio lighting
-Quality: High resolution fashion editorial
-"""
-
-            # Try Gemini 2.5 Flash with multimodal input
-            try:
-                from google.genai.types import Part, Content
-
-                response = client.models.generate_content(
-                    model='gemini-2.5-flash-image',
-                    contents=[
-                        Content(
-                            parts=[
-                                Part.from_bytes(
-                                    data=image_bytes,
-                                    mime_type="image/png"
-                                ),
-                                Part.from_text(text=enhanced_prompt)
-                            ]
-                        )
-                    ],
-                    config=types.GenerateContentConfig(
-                        response_modalities=["TEXT", "IMAGE"],
-                        safety_settings=[
-                            types.SafetySetting(
-                                category="HARM_CATEGORY_HARASSMENT",
-                                threshold="BLOCK_NONE"
-                            ),
-                            types.SafetySetting(
-                                category="HARM_CATEGORY_HATE_SPEECH",
-                                threshold="BLOCK_NONE"
-                            ),
-                            types.SafetySetting(
-                                category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                                threshold="BLOCK_NONE"
-                            ),
-                            types.SafetySetting(
-                                category="HARM_CATEGORY_DANGEROUS_CONTENT",
-                                threshold="BLOCK_NONE"
-                            ),
-                        ]
-                    )
-                )
+        if not results['images']:
+            raise ImageGeneratorError(
+                "Failed to generate any view: "
+                + "; ".join(f"{r['angle']}: {r['error']}" for r in angle_results)
+            )
 
-                # Extract generated image
-                if response.candidates:
-                    for part in response.candidates[0].content.parts:
-                        if hasattr(part, 'inline_data') and part.inline_data:
-                            angle_image_bytes = part.inline_data.data
-                            angle_img_base64 = base64.b64encode(angle_image_bytes).decode()
-                            results['images'].append(angle_img_base64)
-                            results['angles'].append(angle_name)
-                            print(f"  ✅ {angle_name.capitalize()} view generated")
-                            break
-                    else:
-                        raise ImageGeneratorError(f"No image generated for {angle_name}")
-                else:
-                    raise ImageGeneratorError(f"No candidates in response for {angle_name}")
-
-            except Exception as e:
-                print(f"  ❌ {angle_name} failed: {str(e)}")
-                raise ImageGeneratorError(f"Failed to generate {angle_name} view: {str(e)}")
-
-        if len(results['images']) == 4:
-            print(f"✅ All 4 angle views generated successfully from reference image!")
-            return results
-        else:
-            raise ImageGeneratorError(f"Only generated {len(results['images'])}/4 angles")
+        print(
+            f"✅ {len(results['images'])}/{len(angles)} angle views generated from reference image "
+            f"in {results['timing']['wall_ms']:.0f}ms!"
+        )
+        return results
 
     except Exception as e:
         print(f"❌ Image-to-image generation failed: {str(e)}")
-        return {
+        error = {
             "status": "error",
             "message": str(e),
             "parameters": results['parameters']
         }
+        for key in ("angle_results", "failed_angles", "timing"):
+            if key in results:
+                error[key] = results[key]
+        return error
+
+
+def _fashion_photo_prompt(prompt: str, aspect_ratio: str, style: str) -> str:
+    """Enhance an outfit description with fashion-specific context for the image models."""
+    return f"""Generate a high-quality fashion photograph with these specifications:
+
+{prompt}
+
+Style: {style}, professional fashion editorial
+Aspect ratio: {aspect_ratio}
+Lighting: Professional studio lighting with soft shadows
+Focus: Sharp focus on clothing details and fit
+Quality: High resolution, suitable for fashion magazine
+Composition: Full body shot, model in neutral pose showcasing the complete outfit
+Background: Clean, minimal background that doesn't distract from the outfit
+Mood: Professional, elegant, fashion-forward
+"""
+
+
+def _cache_image(cache_key: str, image_bytes: bytes, mime_type: Optional[str], result: dict) -> dict:
+    """Store a generated image in the media cache (without its base64 copy) and return the result."""
+    if MEDIA_CACHE_ENABLED:
+        media_cache.put(
+            cache_key, "image", image_bytes, mime_type or "image/png",
+            {key: value for key, value in result.items() if key != 'image_data'}
+        )
+    return result
 
 
 def generate_image_with_nanoBanana(
     prompt: str,
     aspect_ratio: str = "9:16",
-    style: str = "photorealistic"
+    style: str = "photorealistic",
+    use_cache: bool = True
 ) -> Optional[dict]:
     """
     Generate image using Google Gemini 2.5 Flash Image (Nano Banana capability).
@@ -264,10 +509,15 @@ def generate_image_with_nanoBanana(
     2. Imagen 3 standalone model
     3. Claude-enhanced prompt fallback
 
+    Generated images are stored in the media cache (media_cache.py), and an
+    identical request is answered from it without calling any model.
+
     Args:
         prompt: Detailed fashion outfit description
         aspect_ratio: Desired aspect ratio (e.g., "9:16", "16:9", "1:1")
         style: Style of image (e.g., "photorealistic", "artistic", "fashion")
+        use_cache: Serve a cached image if there is one (default: True); a
+            new image is cached either way
 
     Returns:
         Dictionary containing:
@@ -280,25 +530,24 @@ def generate_image_with_nanoBanana(
     print(f"Generating image with Gemini 2.5 Flash Image (Nano Banana)...")
     print(f"Prompt: {prompt[:100]}...")
 
+    cache_key = make_media_key("image", prompt, {"aspect_ratio": aspect_ratio, "style": style})
+    if MEDIA_CACHE_ENABLED and use_cache:
+        cached = media_cache.get(cache_key)
+        if cached is not None:
+            image_bytes, _, result = cached
+            print("✅ Image served from media cache")
+            # Nothing was spent on this request
+            result['metadata'] = {**result.get('metadata', {}), "cached": True, "cost_usd": 0.0}
+            return {**result, "image_data": base64.b64encode(image_bytes).decode()}
+    elif MEDIA_CACHE_ENABLED:
+        media_cache.record_bypass()
+
     try:
-        # Get API key and initialize client
-        api_key = get_gemini_api_key()
-        client = genai.Client(api_key=api_key)
+        # Initialize client (the API key is only needed for the live provider)
+        client = create_google_client(get_gemini_api_key)
 
         # Enhance prompt with fashion-specific context
-        enhanced_prompt = f"""Generate a high-quality fashion photograph with these specifications:
-
-{prompt}
-
-Style: {style}, professional fashion editorial
-Aspect ratio: {aspect_ratio}
-Lighting: Professional studio lighting with soft shadows
-Focus: Sharp focus on clothing details and fit
-Quality: High resolution, suitable for fashion magazine
-Composition: Full body shot, model in neutral pose showcasing the complete outfit
-Background: Clean, minimal background that doesn't distract from the outfit
-Mood: Professional, elegant, fashion-forward
-"""
+        enhanced_prompt = _fashion_photo_prompt(prompt, aspect_ratio, style)
 
         # Strategy 1: Try Gemini 2.5 Flash Image with TEXT+IMAGE modalities
         print("📸 Trying Gemini 2.5 Flash Image (primary method)...")
@@ -326,18 +575,19 @@ Mood: Professional, elegant, fashion-forward
             ]
         )
 
-        # Try Gemini 2.5 Flash Image models
-        gemini_models_to_try = [
-            'gemini-2.5-flash-image',
-            'gemini-2.0-flash-preview-image-generation',
-            'gemini-2.0-flash-thinking-exp-01-21',
-        ]
-
+        # Try Gemini 2.5 Flash Image models, skipping any recently found
+        # unavailable and trying recently failing ones last
         gemini_success = False
-        for model_id in gemini_models_to_try:
+        for depth, model_id in model_health.candidates("gemini", GEMINI_IMAGE_MODELS):
+            started = time.perf_counter()
             try:
                 print(f"  Trying Gemini model: {model_id}")
-                response = client.models.generate_content(
+                # Fails fast with CircuitOpenError while this model is
+                # unhealthy, so we move straight on to the next one
+                response = call_with_retry(
+                    f"gemini:{model_id}",
+                    client.models.generate_content,
+                    fallback_depth=depth,
                     model=model_id,
                     contents=enhanced_prompt,
                     config=generate_config
@@ -351,7 +601,10 @@ Mood: Professional, elegant, fashion-forward
                             img_base64 = base64.b64encode(image_bytes).decode()
 
                             print(f"✅ Image generated successfully with {model_id}!")
-                            return {
+                            model_health.record_success(
+                                "gemini", model_id, (time.perf_counter() - started) * 1000
+                            )
+                            return _cache_image(cache_key, image_bytes, part.inline_data.mime_type, {
                                 "status": "success",
                                 "image_data": img_base64,
                                 "image_url": None,
@@ -363,51 +616,66 @@ Mood: Professional, elegant, fashion-forward
                                 "metadata": {
                                     "generation_time": "instant",
                                     "prompt_used": enhanced_prompt,
-                                    "note": f"Generated with {model_id} (Nano Banana)"
+                                    "note": f"Generated with {model_id} (Nano Banana)",
+                                    "cost_usd": estimate_cost(model_id, extract_usage(response))
                                 }
-                            }
+                            })
 
                 print(f"  ⚠️  {model_id} returned text only (no image)")
+                model_health.record_no_output("gemini", model_id, (time.perf_counter() - started) * 1000)
 
             except Exception as model_error:
                 print(f"  ❌ {model_id} failed: {str(model_error)[:100]}")
+                model_health.record_error("gemini", model_id, model_error)
                 continue
 
         # Strategy 2: Try standalone Imagen 3 model
-        print("🔄 Trying standalone Imagen 3 model...")
-        try:
-            imagen_resp = client.models.generate_images(
-                model='imagen-3.0-generate-001',
-                prompt=enhanced_prompt,
-                config=types.GenerateImagesConfig(
-                    number_of_images=1,
-                    aspect_ratio=aspect_ratio,
-                    include_rai_reason=True
+        if not model_health.is_skipped("imagen", IMAGEN_MODEL):
+            print("🔄 Trying standalone Imagen 3 model...")
+            started = time.perf_counter()
+            try:
+                imagen_resp = call_with_retry(
+                    f"imagen:{IMAGEN_MODEL}",
+                    client.models.generate_images,
+                    fallback_depth=IMAGEN_FALLBACK_DEPTH,
+                    model=IMAGEN_MODEL,
+                    prompt=enhanced_prompt,
+                    config=types.GenerateImagesConfig(
+                        number_of_images=1,
+                        aspect_ratio=aspect_ratio,
+                        include_rai_reason=True
+                    )
                 )
-            )
 
-            if imagen_resp.generated_images:
-                img_bytes = imagen_resp.generated_images[0].image.image_bytes
-                img_base64 = base64.b64encode(img_bytes).decode()
-
-                print("✅ Image generated successfully with Imagen 3!")
-                return {
-                    "status": "success",
-                    "image_data": img_base64,
-                    "image_url": None,
-                    "parameters": {
-                        "aspect_ratio": aspect_ratio,
-                        "style": style,
-                        "model": "imagen-3.0-generate-001"
-                    },
-                    "metadata": {
-                        "generation_time": "instant",
-                        "prompt_used": enhanced_prompt,
-                        "note": "Generated with Imagen 3"
-                    }
-                }
-        except Exception as imagen_error:
-            print(f"❌ Imagen 3 fallback failed: {str(imagen_error)[:100]}")
+                if imagen_resp.generated_images:
+                    img_bytes = imagen_resp.generated_images[0].image.image_bytes
+                    img_base64 = base64.b64encode(img_bytes).decode()
+
+                    print("✅ Image generated successfully with Imagen 3!")
+                    model_health.record_success("imagen", IMAGEN_MODEL, (time.perf_counter() - started) * 1000)
+                    return _cache_image(cache_key, img_bytes, imagen_resp.generated_images[0].image.mime_type, {
+                        "status": "success",
+                        "image_data": img_base64,
+                        "image_url": None,
+                        "parameters": {
+                            "aspect_ratio": aspect_ratio,
+                            "style": style,
+                            "model": IMAGEN_MODEL
+                        },
+                        "metadata": {
+                            "generation_time": "instant",
+                            "prompt_used": enhanced_prompt,
+                            "note": "Generated with Imagen 3",
+                            "cost_usd": estimate_cost(IMAGEN_MODEL, extract_usage(imagen_resp))
+                        }
+                    })
+                # Empty results are usually the RAI filter rejecting this prompt
+                model_health.record_no_output(
+                    "imagen", IMAGEN_MODEL, (time.perf_counter() - started) * 1000, skip=False
+                )
+            except Exception as imagen_error:
+                print(f"❌ Imagen 3 fallback failed: {str(imagen_error)[:100]}")
+                model_health.record_error("imagen", IMAGEN_MODEL, imagen_error)
 
         # If we get here, all Google models failed
         raise ImageGeneratorError("All Google image generation models failed")
@@ -424,10 +692,10 @@ Mood: Professional, elegant, fashion-forward
 
     # Strategy 3: FALLBACK - Use Claude to enhance the prompt
     try:
-        from anthropic import Anthropic
+        from llm_client import get_claude_client
 
         claude_api_key = os.getenv("CLAUDE_API_KEY")
-        if not claude_api_key:
+        if not claude_api_key and not claude_is_stubbed():
             # If Claude API key also not available, return basic fallback
             basic_prompt = f"""Fashion photography: {prompt}
 
@@ -449,8 +717,11 @@ Clean background, emphasis on clothing details and fit"""
             }
 
         # Use Claude to create an enhanced prompt
-        client = Anthropic(api_key=claude_api_key)
-        response = client.messages.create(
+        client = get_claude_client()
+        response = call_with_retry(
+            "claude:claude-sonnet-4-20250514",
+            client.messages.create,
+            fallback_depth=CLAUDE_FALLBACK_DEPTH,
             model="claude-sonnet-4-20250514",
             max_tokens=1024,
             messages=[
@@ -512,6 +783,87 @@ Clean background, emphasis on clothing details and fit"""
         }
 
 
+def _variation_modifier(index: int) -> str:
+    return VARIATION_MODIFIERS[index] if index < len(VARIATION_MODIFIERS) else f"Styling variation {index+1}"
+
+
+def _generate_variations_batch(prompt: str, count: int, aspect_ratio: str, style: str) -> list:
+    """
+    Generate several samples of one prompt with one Imagen generate_images call.
+
+    Imagen applies one prompt to every image of a call, so the images are
+    variations of the same prompt rather than of different modifiers. The
+    first image is stored in the media cache under the same key
+    generate_image_with_nanoBanana uses.
+
+    Args:
+        prompt: Outfit description shared by every image
+        count: Number of images to ask for (at most IMAGEN_MAX_IMAGES_PER_CALL)
+        aspect_ratio: Image aspect ratio
+        style: Style preset
+
+    Returns:
+        Success results shaped like generate_image_with_nanoBanana's, one per
+        returned image (possibly fewer than count)
+
+    Raises:
+        ImageGeneratorError: If Imagen is currently being skipped as unavailable
+    """
+    if model_health.is_skipped("imagen", IMAGEN_MODEL):
+        raise ImageGeneratorError(f"{IMAGEN_MODEL} is currently unavailable")
+    client = create_google_client(get_gemini_api_key)
+    enhanced_prompt = _fashion_photo_prompt(prompt, aspect_ratio, style)
+
+    started = time.perf_counter()
+    try:
+        imagen_resp = call_with_retry(
+            f"imagen:{IMAGEN_MODEL}",
+            client.models.generate_images,
+            fallback_depth=IMAGEN_FALLBACK_DEPTH,
+            model=IMAGEN_MODEL,
+            prompt=enhanced_prompt,
+            config=types.GenerateImagesConfig(
+                number_of_images=count,
+                aspect_ratio=aspect_ratio,
+                include_rai_reason=True
+            )
+        )
+    except Exception as e:
+        model_health.record_error("imagen", IMAGEN_MODEL, e)
+        raise
+
+    generated = [img for img in imagen_resp.generated_images or [] if img.image and img.image.image_bytes]
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if generated:
+        model_health.record_success("imagen", IMAGEN_MODEL, elapsed_ms)
+    else:
+        model_health.record_no_output("imagen", IMAGEN_MODEL, elapsed_ms, skip=False)
+    cost_per_image = estimate_cost(IMAGEN_MODEL, extract_usage(imagen_resp)) / max(len(generated), 1)
+    results = [
+        {
+            "status": "success",
+            "image_data": base64.b64encode(img.image.image_bytes).decode(),
+            "image_url": None,
+            "parameters": {
+                "aspect_ratio": aspect_ratio,
+                "style": style,
+                "model": IMAGEN_MODEL
+            },
+            "metadata": {
+                "generation_time": "instant",
+                "prompt_used": enhanced_prompt,
+                "note": f"Generated with Imagen 3 (batch of {len(generated)})",
+                "cost_usd": round(cost_per_image, 6)
+            }
+        }
+        for img in generated
+    ]
+    if generated:
+        cache_key = make_media_key("image", prompt, {"aspect_ratio": aspect_ratio, "style": style})
+        _cache_image(cache_key, generated[0].image.image_bytes, generated[0].image.mime_type, results[0])
+    return results
+
+
 def generate_multiple_variations(
     prompt: str,
     count: int = 3,
@@ -525,6 +877,13 @@ def generate_multiple_variations(
     modifiers to the base prompt, ensuring each image is unique while
     maintaining the core style guide.
 
+    By default each variation goes through generate_image_with_nanoBanana,
+    concurrently, so latency doesn't grow with count. In the opt-in "batch"
+    mode (ALEX_VARIATIONS_MODE=batch) the modifiers are not used: variations
+    are Imagen samples of the base prompt, IMAGEN_MAX_IMAGES_PER_CALL per
+    generate_images call, and any a batch didn't return go through
+    generate_image_with_nanoBanana.
+
     Args:
         prompt: Base outfit description
         count: Number of variations to generate (default: 3)
@@ -537,16 +896,12 @@ def generate_multiple_variations(
         - variations: List of image data dictionaries
         - count: Number of successful generations
         - parameters: Generation parameters
+        - strategy: "batch", "fanout" or "batch+fanout"
+        - timing: Wall-clock ms, ms of each batch call and ms per variation
+        - cost_usd: Estimated cost of the generated images
     """
     print(f"🎨 Generating {count} outfit variations...")
 
-    # Variation modifiers to ensure diversity
-    variation_modifiers = [
-        "Styling variation 1: Classic interpretation with traditional accessories",
-        "Styling variation 2: Modern twist with contemporary accessories and bold styling choices",
-        "Styling variation 3: Fashion-forward approach with unique accessories and creative details"
-    ]
-
     results = {
         "status": "success",
         "variations": [],
@@ -558,33 +913,127 @@ def generate_multiple_variations(
         }
     }
 
-    for i in range(count):
-        modifier = variation_modifiers[i] if i < len(variation_modifiers) else f"Styling variation {i+1}"
-        variation_prompt = f"{prompt}. {modifier}"
+    start = time.perf_counter()
+    variations = [None] * count
+    variations_ms = [0.0] * count
+    timing = {}
+    strategies = []
 
-        print(f"  📸 Generating variation {i+1}/{count}...")
+    # Imagen applies one prompt to every image of a call, so batched
+    # variations are samples of the unmodified prompt
+    batched = VARIATIONS_MODE == "batch"
+    prompts = [prompt if batched else f"{prompt}. {_variation_modifier(i)}" for i in range(count)]
 
-        single_result = generate_image_with_nanoBanana(
-            prompt=variation_prompt,
+    def generate_variation(i: int) -> dict:
+        return generate_image_with_nanoBanana(
+            prompt=prompts[i],
             aspect_ratio=aspect_ratio,
-            style=style
+            style=style,
+            # A batch already cached an image for this prompt; don't repeat it
+            use_cache=not batched
+        )
+
+    def failed_variation(i: int, error: BaseException) -> dict:
+        return {
+            "status": "error",
+            "message": f"Variation {i+1} failed: {str(error) or type(error).__name__}",
+            "parameters": {
+                "aspect_ratio": aspect_ratio,
+                "style": style
+            }
+        }
+
+    def record_fanout(indices, outcomes) -> None:
+        for i, (single_result, error, elapsed_ms) in zip(indices, outcomes):
+            variations_ms[i] = round(elapsed_ms, 1)
+            variations[i] = single_result if error is None else failed_variation(i, error)
+        if indices and "fanout" not in strategies:
+            strategies.append("fanout")
+
+    batches = [
+        list(range(offset, min(offset + IMAGEN_MAX_IMAGES_PER_CALL, count)))
+        for offset in range(0, count, IMAGEN_MAX_IMAGES_PER_CALL)
+    ] if batched else []
+    overflow = [] if batched else list(range(count))
+
+    # The batch calls (or the single variations) start together, up to the
+    # concurrency cap
+    calls = [
+        lambda indices=indices: _generate_variations_batch(prompt, len(indices), aspect_ratio, style)
+        for indices in batches
+    ]
+    calls += [lambda i=i: generate_variation(i) for i in overflow]
+    for indices in batches:
+        print(f"  📸 Requesting {len(indices)} variations from Imagen in one call...")
+    if overflow:
+        print(f"  📸 Generating {len(overflow)} variation(s) concurrently...")
+    outcomes = run_concurrently("fanout", calls, VARIATIONS_CONCURRENCY, VARIATIONS_TIMEOUT)
+
+    shortfall = []
+    if batches:
+        timing['batch_ms'] = []
+    for indices, (batch, error, elapsed_ms) in zip(batches, outcomes[:len(batches)]):
+        timing['batch_ms'].append(round(elapsed_ms, 1))
+        if isinstance(error, TimeoutError):
+            # The Imagen call is still running; generating these again now
+            # would pay for every image twice
+            print("  ⚠️  Batched generation timed out")
+            for i in indices:
+                variations[i] = failed_variation(i, error)
+                variations_ms[i] = round(elapsed_ms, 1)
+        elif error is not None:
+            print(f"  ⚠️  Batched generation failed: {str(error)[:100]}")
+            shortfall.extend(indices)
+        else:
+            for i, variation in zip(indices, batch):
+                variations[i] = variation
+                variations_ms[i] = round(elapsed_ms, 1)
+            shortfall.extend(indices[len(batch):])
+            if batch and "batch" not in strategies:
+                strategies.append("batch")
+    record_fanout(overflow, outcomes[len(batches):])
+
+    # Whatever a finished batch didn't return goes through the full fallback chain
+    if shortfall:
+        print(f"  📸 Generating {len(shortfall)} missing variation(s) concurrently...")
+        record_fanout(
+            shortfall,
+            run_concurrently(
+                "fanout",
+                [lambda i=i: generate_variation(i) for i in shortfall],
+                VARIATIONS_CONCURRENCY,
+                VARIATIONS_TIMEOUT
+            )
         )
 
+    for i, single_result in enumerate(variations):
         if single_result['status'] == 'success':
-            results['variations'].append(single_result)
             results['count'] += 1
             print(f"  ✅ Variation {i+1} generated successfully")
         else:
             # On failure, still include the fallback result
-            results['variations'].append(single_result)
             results['status'] = 'partial'
             print(f"  ⚠️  Variation {i+1} failed, added fallback")
+    results['variations'] = variations
+
+    results['strategy'] = "+".join(strategies)
+    results['timing'] = {
+        "wall_ms": round((time.perf_counter() - start) * 1000, 1),
+        **timing,
+        "variations_ms": variations_ms
+    }
+    results['cost_usd'] = round(
+        sum(v.get('metadata', {}).get('cost_usd', 0.0) for v in variations if v['status'] == 'success'), 6
+    )
 
     if results['count'] == 0:
         results['status'] = 'error'
         print(f"❌ All {count} variations failed to generate")
     else:
-        print(f"✅ Generated {results['count']}/{count} variations successfully")
+        print(
+            f"✅ Generated {results['count']}/{count} variations successfully "
+            f"in {results['timing']['wall_ms']:.0f}ms (${results['cost_usd']:.4f})"
+        )
 
     return results
 
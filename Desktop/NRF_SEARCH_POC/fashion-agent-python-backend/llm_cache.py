@@ -0,0 +1,295 @@
+"""
+Response cache for deterministic Claude calls in Alex Fashion Stylist
+Content-hash keyed, with a bounded in-memory LRU in front of a SQLite disk tier
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from provider_config import claude_is_stubbed
+
+
+# Set ALEX_LLM_CACHE=0 to disable the cache entirely
+LLM_CACHE_ENABLED = os.getenv("ALEX_LLM_CACHE", "1") != "0"
+# Stub responses get their own file so they are never served as real Claude output
+LLM_CACHE_PATH = os.getenv("ALEX_LLM_CACHE_PATH", "llm_cache_stub.db" if claude_is_stubbed() else "llm_cache.db")
+# Seconds an entry stays valid (default 7 days)
+LLM_CACHE_TTL = float(os.getenv("ALEX_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+# Size caps, in bytes of cached response text
+LLM_CACHE_MEMORY_BYTES = int(os.getenv("ALEX_LLM_CACHE_MEMORY_BYTES", str(16 * 1024 * 1024)))
+LLM_CACHE_DISK_BYTES = int(os.getenv("ALEX_LLM_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+
+
+def make_cache_key(
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    max_tokens: int,
+    tool_name: Optional[str]
+) -> str:
+    """
+    Hash the inputs that fully determine a temperature-0 Claude response.
+
+    Args:
+        tool_name: Name of the structured output tool the call forces, or
+            None for a free-text call (the two are parsed differently)
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    payload = json.dumps([model, system_prompt, user_prompt, max_tokens, tool_name], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier LRU cache of Claude response text.
+
+    The memory tier answers repeated requests in this process without I/O;
+    the disk tier survives restarts and is shared by every process using
+    the same file (the API workers and update_trends.py). Both tiers evict
+    least-recently-used entries once their byte cap is exceeded, and
+    entries older than the TTL are treated as misses.
+    """
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        ttl: float = LLM_CACHE_TTL,
+        memory_bytes: int = LLM_CACHE_MEMORY_BYTES,
+        disk_bytes: int = LLM_CACHE_DISK_BYTES
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._memory_size = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_lock = threading.Lock()
+
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "expired": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "disk_errors": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Disk tier
+    # ------------------------------------------------------------------
+
+    def _disk(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used ON llm_responses (last_used_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        with self._disk_lock:
+            conn = self._disk()
+            row = conn.execute(
+                "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                conn.commit()
+                self._count("expired")
+                return None
+            conn.execute("UPDATE llm_responses SET last_used_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return row[0], row[1]
+
+    def _disk_put(self, key: str, response: str, size: int, now: float) -> None:
+        with self._disk_lock:
+            conn = self._disk()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, response, size, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now)
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+            evicted = 0
+            if total > self.disk_bytes:
+                # Walk oldest-used entries until enough bytes are freed
+                excess = total - self.disk_bytes
+                victims = []
+                for victim_key, victim_size in conn.execute(
+                    "SELECT key, size FROM llm_responses WHERE key != ? ORDER BY last_used_at", (key,)
+                ):
+                    victims.append((victim_key,))
+                    excess -= victim_size
+                    if excess <= 0:
+                        break
+                conn.executemany("DELETE FROM llm_responses WHERE key = ?", victims)
+                evicted = len(victims)
+            conn.commit()
+        if evicted:
+            self._count("disk_evictions", evicted)
+
+    # ------------------------------------------------------------------
+    # Memory tier
+    # ------------------------------------------------------------------
+
+    def _memory_put(self, key: str, response: str, created_at: float) -> None:
+        size = len(response.encode("utf-8"))
+        if size > self.memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_size -= len(previous[0].encode("utf-8"))
+            self._memory[key] = (response, created_at)
+            self._memory_size += size
+            while self._memory_size > self.memory_bytes:
+                _, (evicted, _) = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted.encode("utf-8"))
+                self._counters["memory_evictions"] += 1
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] += amount
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a response, checking memory first and then disk.
+
+        Args:
+            key: Key from make_cache_key
+
+        Returns:
+            Cached response text, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return entry[0]
+                # The disk copy has the same age, so expiry is counted there
+                del self._memory[key]
+                self._memory_size -= len(entry[0].encode("utf-8"))
+
+        try:
+            entry = self._disk_get(key, now)
+        except sqlite3.Error as e:
+            print(f"LLM cache disk read failed: {e}")
+            self._count("disk_errors")
+            entry = None
+
+        if entry is None:
+            self._count("misses")
+            return None
+
+        self._count("disk_hits")
+        self._memory_put(key, entry[0], entry[1])
+        return entry[0]
+
+    def put(self, key: str, response: str) -> None:
+        """
+        Store a response in both tiers.
+
+        Args:
+            key: Key from make_cache_key
+            response: Response text to cache
+        """
+        now = time.time()
+        self._memory_put(key, response, now)
+        try:
+            self._disk_put(key, response, len(response.encode("utf-8")), now)
+        except sqlite3.Error as e:
+            print(f"LLM cache disk write failed: {e}")
+            self._count("disk_errors")
+        self._count("stores")
+
+    def record_bypass(self) -> None:
+        """Count a lookup skipped because the caller asked to bypass the cache."""
+        self._count("bypassed")
+
+    def clear(self) -> None:
+        """Remove every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+        with self._disk_lock:
+            conn = self._disk()
+            conn.execute("DELETE FROM llm_responses")
+            conn.commit()
+
+    def close(self) -> None:
+        """Close the disk tier connection."""
+        with self._disk_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get hit-rate and size metrics for both tiers.
+
+        Returns:
+            Dictionary of counters, hit rate and tier sizes
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            memory = {
+                "entries": len(self._memory),
+                "bytes": self._memory_size,
+                "max_bytes": self.memory_bytes,
+            }
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        hits = counters["memory_hits"] + counters["disk_hits"]
+
+        disk = {"path": self.path, "max_bytes": self.disk_bytes}
+        if self._conn is not None:
+            with self._disk_lock:
+                entries, size = self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses"
+                ).fetchone()
+            disk.update({"entries": entries, "bytes": size})
+
+        return {
+            "enabled": LLM_CACHE_ENABLED,
+            "ttl_s": self.ttl,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            **counters,
+            "memory": memory,
+            "disk": disk,
+        }
+
+
+response_cache = ResponseCache()
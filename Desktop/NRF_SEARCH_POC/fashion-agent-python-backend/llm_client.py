@@ -2,21 +2,74 @@
 Claude LLM client wrapper for Alex Fashion Stylist
 Handles API calls to Anthropic's Claude API
 """
+import asyncio
+import json
 import os
-from typing import Optional
-from anthropic import Anthropic, APIError
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from anthropic import (
+    Anthropic, AsyncAnthropic, APIError, DefaultHttpxClient, DefaultAsyncHttpxClient, Timeout
+)
+
+from executors import run_blocking
+from llm_cache import LLM_CACHE_ENABLED, make_cache_key, response_cache
+from metrics import LatencyStats
+from rate_limits import estimate_tokens, get_limiter
+from resilience import CircuitOpenError, call_with_retry, call_with_retry_async, classify_error, get_breaker, get_retry_after
+from providers import AsyncStubClaudeClient, StubClaudeClient, claude_is_stubbed
+from singleflight import get_flight
+from structured_output import STRUCTURED_OUTPUT_ENABLED, StructuredTool, get_tool
+from telemetry import llm_telemetry
 
 
 # Default model for Claude API calls
 # Using Claude Sonnet 4 - the latest and most capable model
 DEFAULT_MODEL = "claude-sonnet-4-20250514"
 
+# HTTP connection pool settings shared by every Claude client
+CLAUDE_MAX_CONNECTIONS = int(os.getenv("CLAUDE_MAX_CONNECTIONS", "50"))
+CLAUDE_MAX_KEEPALIVE = int(os.getenv("CLAUDE_MAX_KEEPALIVE", "20"))
+CLAUDE_KEEPALIVE_EXPIRY = float(os.getenv("CLAUDE_KEEPALIVE_EXPIRY", "60"))
+CLAUDE_CONNECT_TIMEOUT = float(os.getenv("CLAUDE_CONNECT_TIMEOUT", "10"))
+CLAUDE_TIMEOUT = float(os.getenv("CLAUDE_TIMEOUT", "120"))
+
+# Mark system prompts with cache_control so Anthropic reuses the processed
+# prefix across calls (set CLAUDE_PROMPT_CACHE=0 to disable). Prefixes below
+# the model's minimum cacheable length are simply not cached.
+CLAUDE_PROMPT_CACHE = os.getenv("CLAUDE_PROMPT_CACHE", "1") != "0"
+
 
 class ClaudeClientError(Exception):
     """Custom exception for Claude client errors"""
     pass
 
 
+class ClaudeUnavailableError(ClaudeClientError):
+    """Claude is rate limited, overloaded or behind an open circuit breaker; worth retrying later"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def to_claude_error(e: Exception) -> ClaudeClientError:
+    """
+    Convert an Anthropic API error or open breaker into a ClaudeClientError.
+
+    Transient failures that survived our retries are reported as
+    unavailability rather than a plain client error.
+    """
+    if isinstance(e, CircuitOpenError):
+        return ClaudeUnavailableError(f"Claude is temporarily unavailable: {e}", e.retry_after)
+    if classify_error(e)[0]:
+        return ClaudeUnavailableError(f"Claude API error: {e}", get_retry_after(e))
+    return ClaudeClientError(f"Claude API error: {e}")
+
+
 def get_api_key() -> str:
     """
     Get Claude API key from environment variable.
@@ -38,22 +91,316 @@ def get_api_key() -> str:
     return api_key
 
 
+# ============================================================================
+# Shared Client Registry
+# ============================================================================
+
+_client_lock = threading.Lock()
+_sync_client: Optional[Anthropic] = None
+_sync_client_key: Optional[str] = None
+# Async clients hold connections bound to the event loop that opened them,
+# so there is one per loop (in practice, one per uvicorn worker)
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = weakref.WeakKeyDictionary()
+_clients_created = {"sync": 0, "async": 0}
+_call_latency = LatencyStats()
+
+# Token usage across calls, split by whether the prompt prefix was read from cache
+_usage_lock = threading.Lock()
+_usage_totals = {
+    "calls": 0,
+    "cache_hit_calls": 0,
+    "input_tokens": 0,
+    "cache_read_input_tokens": 0,
+    "cache_creation_input_tokens": 0,
+    "output_tokens": 0,
+}
+_cache_hit_latency = LatencyStats()
+_cache_miss_latency = LatencyStats()
+
+# Coalesces concurrent identical JSON calls, keyed on the response cache key
+_json_flight = get_flight("claude_json")
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=CLAUDE_MAX_CONNECTIONS,
+        max_keepalive_connections=CLAUDE_MAX_KEEPALIVE,
+        keepalive_expiry=CLAUDE_KEEPALIVE_EXPIRY
+    )
+
+
+def _http_timeout() -> Timeout:
+    return Timeout(CLAUDE_TIMEOUT, connect=CLAUDE_CONNECT_TIMEOUT)
+
+
+def get_claude_client() -> Anthropic:
+    """
+    Get the shared synchronous Claude client, creating it on first use.
+
+    The client owns a keep-alive HTTP connection pool, so reusing it skips
+    the TCP/TLS handshake on every call after the first. A new client is
+    created if CLAUDE_API_KEY changes.
+
+    Returns:
+        Shared Anthropic client
+
+    Raises:
+        ClaudeClientError: If API key is not set
+    """
+    global _sync_client, _sync_client_key
+    api_key = "stub" if claude_is_stubbed() else get_api_key()
+
+    with _client_lock:
+        if _sync_client is None or _sync_client_key != api_key:
+            if _sync_client is not None:
+                _sync_client.close()
+            _sync_client = StubClaudeClient() if claude_is_stubbed() else Anthropic(
+                api_key=api_key,
+                timeout=_http_timeout(),
+                # Retries are handled by resilience.py, which shares backoff
+                # and breaker state across requests
+                max_retries=0,
+                http_client=DefaultHttpxClient(limits=_http_limits(), timeout=_http_timeout())
+            )
+            _sync_client_key = api_key
+            _clients_created["sync"] += 1
+        return _sync_client
+
+
+def get_async_claude_client() -> AsyncAnthropic:
+    """
+    Get the shared async Claude client for the running event loop.
+
+    Returns:
+        Shared AsyncAnthropic client
+
+    Raises:
+        ClaudeClientError: If API key is not set
+        RuntimeError: If called outside a running event loop
+    """
+    api_key = "stub" if claude_is_stubbed() else get_api_key()
+    loop = asyncio.get_running_loop()
+
+    with _client_lock:
+        entry = _async_clients.get(loop)
+        if entry is None or entry[1] != api_key:
+            client = AsyncStubClaudeClient() if claude_is_stubbed() else AsyncAnthropic(
+                api_key=api_key,
+                timeout=_http_timeout(),
+                max_retries=0,
+                http_client=DefaultAsyncHttpxClient(limits=_http_limits(), timeout=_http_timeout())
+            )
+            entry = (client, api_key)
+            _async_clients[loop] = entry
+            _clients_created["async"] += 1
+        return entry[0]
+
+
+async def close_claude_clients() -> None:
+    """Close the shared clients (used on application shutdown)."""
+    global _sync_client, _sync_client_key
+    with _client_lock:
+        sync_client, _sync_client, _sync_client_key = _sync_client, None, None
+        try:
+            async_entry = _async_clients.pop(asyncio.get_running_loop(), None)
+        except RuntimeError:
+            async_entry = None
+
+    if sync_client is not None:
+        sync_client.close()
+    if async_entry is not None:
+        await async_entry[0].close()
+
+
+def get_claude_client_metrics() -> Dict[str, Any]:
+    """
+    Get client reuse and call latency metrics.
+
+    clients_created stays at 1 per process (plus 1 per event loop for async)
+    while connections are being reused; call_latency p50 is the number to
+    compare against per-call client construction.
+
+    Returns:
+        Dictionary of counters, pool settings and latency summary
+    """
+    with _client_lock:
+        created = dict(_clients_created)
+        async_clients = len(_async_clients)
+    return {
+        "clients_created": created,
+        "async_clients_open": async_clients,
+        "pool": {
+            "max_connections": CLAUDE_MAX_CONNECTIONS,
+            "max_keepalive_connections": CLAUDE_MAX_KEEPALIVE,
+            "keepalive_expiry_s": CLAUDE_KEEPALIVE_EXPIRY,
+            "timeout_s": CLAUDE_TIMEOUT,
+        },
+        "call_latency": _call_latency.snapshot(),
+        "prompt_cache": get_prompt_cache_metrics(),
+    }
+
+
+def get_prompt_cache_metrics() -> Dict[str, Any]:
+    """
+    Get Anthropic prompt cache token usage.
+
+    Compare latency_cache_hit with latency_cache_miss to see the
+    time-to-first-token saving from reusing the static prompt prefix.
+
+    Returns:
+        Dictionary of token totals and latency split by cache hit/miss
+    """
+    with _usage_lock:
+        totals = dict(_usage_totals)
+    prompt_tokens = (
+        totals["input_tokens"]
+        + totals["cache_read_input_tokens"]
+        + totals["cache_creation_input_tokens"]
+    )
+    return {
+        "enabled": CLAUDE_PROMPT_CACHE,
+        **totals,
+        "cached_prompt_ratio": (
+            round(totals["cache_read_input_tokens"] / prompt_tokens, 4) if prompt_tokens else 0.0
+        ),
+        "latency_cache_hit": _cache_hit_latency.snapshot(),
+        "latency_cache_miss": _cache_miss_latency.snapshot(),
+    }
+
+
+def _system_blocks(system_prompt: str) -> Any:
+    # A system prompt sent as a content block can carry the cache breakpoint;
+    # everything before the breakpoint (here, the whole system prompt) is cached
+    if not CLAUDE_PROMPT_CACHE:
+        return system_prompt
+    return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+
+
+def forced_tool_name(tool: Optional[StructuredTool]) -> Optional[str]:
+    """
+    Get the name of the tool a call will actually force, for response cache keys.
+
+    Returns:
+        The tool's name, or None if the call is free text (no tool, or
+        CLAUDE_STRUCTURED_OUTPUT=0)
+    """
+    if tool is None or not STRUCTURED_OUTPUT_ENABLED:
+        return None
+    return tool.name
+
+
+def _tool_params(tool: Optional[StructuredTool]) -> Dict[str, Any]:
+    # Tools precede the system prompt in the cached prefix, so a static tool
+    # definition is covered by the system prompt's cache breakpoint
+    if tool is None or not STRUCTURED_OUTPUT_ENABLED:
+        return {}
+    return {"tools": [tool.definition()], "tool_choice": tool.tool_choice()}
+
+
+def response_text(content: List[Any]) -> str:
+    """
+    Get the answer text from a response's content blocks.
+
+    A forced tool call is returned as the JSON text of its input (unwrapped
+    by the structured output tool), so callers parse text either way.
+
+    Args:
+        content: Message content blocks
+
+    Returns:
+        Response text
+
+    Raises:
+        ClaudeClientError: If there is no content
+    """
+    if not content:
+        raise ClaudeClientError("Empty response from Claude API")
+    for block in content:
+        if block.type == "tool_use":
+            tool = get_tool(block.name)
+            return tool.result_text(block.input) if tool is not None else json.dumps(block.input)
+    return content[0].text
+
+
+def build_message_params(
+    system_prompt: str,
+    user_prompt: str,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 4000,
+    temperature: float = 0.0,
+    tool: Optional[StructuredTool] = None
+) -> Dict[str, Any]:
+    """
+    Build Messages API parameters for a request submitted outside call_claude,
+    e.g. one entry of a Message Batch.
+
+    Args:
+        system_prompt: System-level instructions for Claude
+        user_prompt: User message/prompt
+        model: Claude model to use
+        max_tokens: Maximum tokens in response
+        temperature: Sampling temperature (default: 0.0 for structured output)
+        tool: Structured output tool to force (see structured_output.py)
+
+    Returns:
+        Keyword arguments for messages.create
+    """
+    return {
+        "model": model,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "system": _system_blocks(system_prompt),
+        "messages": [{"role": "user", "content": user_prompt}],
+        **_tool_params(tool),
+    }
+
+
+def _record_usage(model: str, response: Any, duration_ms: float) -> None:
+    """Record latency and token usage for one call and print the cache breakdown."""
+    _call_latency.record(duration_ms)
+
+    usage = getattr(response, "usage", None)
+    input_tokens = getattr(usage, "input_tokens", 0) or 0
+    cache_read = getattr(usage, "cache_read_input_tokens", 0) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", 0) or 0
+    output_tokens = getattr(usage, "output_tokens", 0) or 0
+
+    (_cache_hit_latency if cache_read else _cache_miss_latency).record(duration_ms)
+    with _usage_lock:
+        _usage_totals["calls"] += 1
+        _usage_totals["cache_hit_calls"] += 1 if cache_read else 0
+        _usage_totals["input_tokens"] += input_tokens
+        _usage_totals["cache_read_input_tokens"] += cache_read
+        _usage_totals["cache_creation_input_tokens"] += cache_write
+        _usage_totals["output_tokens"] += output_tokens
+
+    print(
+        f"Claude {model}: {duration_ms:.0f}ms, {input_tokens} input + "
+        f"{cache_read} cache read + {cache_write} cache write tokens, {output_tokens} output tokens"
+    )
+
+
 def call_claude(
     system_prompt: str,
     user_prompt: str,
     model: str = DEFAULT_MODEL,
     max_tokens: int = 4000,
-    temperature: float = 1.0
+    temperature: float = 1.0,
+    tool: Optional[StructuredTool] = None
 ) -> str:
     """
     Call Claude API with system and user prompts.
 
+    The system prompt is sent with a cache_control marker, so keep it
+    static and put per-request data in the user prompt.
+
     Args:
         system_prompt: System-level instructions for Claude
         user_prompt: User message/prompt for the specific task
         model: Claude model to use (default: claude-3-5-sonnet-20241022)
         max_tokens: Maximum tokens in response (default: 4000)
         temperature: Sampling temperature 0-1 (default: 1.0)
+        tool: Structured output tool to force; its input is returned as JSON text
 
     Returns:
         Response text content from Claude
@@ -62,56 +409,73 @@ def call_claude(
         ClaudeClientError: If API call fails or returns invalid response
     """
     try:
-        # Get API key
-        api_key = get_api_key()
-
-        # Initialize Anthropic client
-        client = Anthropic(api_key=api_key)
+        # Reuse the shared client and its connection pool
+        client = get_claude_client()
 
         # Make API call
-        response = client.messages.create(
+        start = time.perf_counter()
+        response = call_with_retry(
+            f"claude:{model}",
+            client.messages.create,
+            estimated_tokens=estimate_tokens(system_prompt + user_prompt),
             model=model,
             max_tokens=max_tokens,
             temperature=temperature,
-            system=system_prompt,
+            system=_system_blocks(system_prompt),
             messages=[
                 {
                     "role": "user",
                     "content": user_prompt
                 }
-            ]
+            ],
+            **_tool_params(tool)
         )
+        _record_usage(model, response, (time.perf_counter() - start) * 1000)
 
-        # Extract text content from response
-        if not response.content or len(response.content) == 0:
-            raise ClaudeClientError("Empty response from Claude API")
+        # Extract text content (or forced tool input) from response
+        return response_text(response.content)
 
-        # Get the text from the first content block
-        text_content = response.content[0].text
-
-        return text_content
-
-    except APIError as e:
-        raise ClaudeClientError(f"Claude API error: {e}")
+    except (APIError, CircuitOpenError) as e:
+        raise to_claude_error(e)
+    except ClaudeClientError:
+        raise
     except Exception as e:
         raise ClaudeClientError(f"Unexpected error calling Claude: {e}")
 
 
+def _is_cacheable(response_text: str) -> bool:
+    # Only keep responses callers can actually parse, so a malformed reply
+    # is retried next time instead of being served until it expires
+    try:
+        json.loads(response_text)
+        return True
+    except ValueError:
+        return False
+
+
 def call_claude_json(
     system_prompt: str,
     user_prompt: str,
     model: str = DEFAULT_MODEL,
-    max_tokens: int = 4000
+    max_tokens: int = 4000,
+    use_cache: bool = True,
+    tool: Optional[StructuredTool] = None
 ) -> str:
     """
     Call Claude API specifically for JSON output.
     Uses temperature=0 for more deterministic, structured output.
 
+    Identical requests are answered from the response cache (llm_cache.py)
+    when it is enabled; pass use_cache=False to always call the API.
+    Identical requests made concurrently share a single API call.
+
     Args:
         system_prompt: System-level instructions (should specify JSON output)
         user_prompt: User message/prompt
         model: Claude model to use
         max_tokens: Maximum tokens in response
+        use_cache: Read and write the response cache (default: True)
+        tool: Structured output tool to force (see structured_output.py)
 
     Returns:
         Response text content (should be valid JSON)
@@ -119,13 +483,251 @@ def call_claude_json(
     Raises:
         ClaudeClientError: If API call fails
     """
-    return call_claude(
-        system_prompt=system_prompt,
-        user_prompt=user_prompt,
-        model=model,
-        max_tokens=max_tokens,
-        temperature=0.0  # Low temperature for structured output
-    )
+    key = make_cache_key(model, system_prompt, user_prompt, max_tokens, forced_tool_name(tool))
+    if LLM_CACHE_ENABLED and use_cache:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+    elif LLM_CACHE_ENABLED:
+        response_cache.record_bypass()
+
+    def fetch() -> str:
+        response_text = call_claude(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            model=model,
+            max_tokens=max_tokens,
+            temperature=0.0,  # Low temperature for structured output
+            tool=tool
+        )
+        # A bypassed call still refreshes the cache with the new response
+        if LLM_CACHE_ENABLED and _is_cacheable(response_text):
+            response_cache.put(key, response_text)
+        return response_text
+
+    # Concurrent cache misses for the same request share one API call
+    return _json_flight.do_sync(key, fetch)
+
+
+# ============================================================================
+# Async API
+# ============================================================================
+
+async def call_claude_async(
+    system_prompt: str,
+    user_prompt: str,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 4000,
+    temperature: float = 1.0,
+    tool: Optional[StructuredTool] = None
+) -> str:
+    """
+    Async counterpart of call_claude, using the shared AsyncAnthropic client.
+
+    Cancelling the awaiting task (e.g. because the HTTP client disconnected)
+    aborts the in-flight request; CancelledError propagates unchanged.
+
+    Args:
+        system_prompt: System-level instructions for Claude
+        user_prompt: User message/prompt for the specific task
+        model: Claude model to use
+        max_tokens: Maximum tokens in response (default: 4000)
+        temperature: Sampling temperature 0-1 (default: 1.0)
+        tool: Structured output tool to force; its input is returned as JSON text
+
+    Returns:
+        Response text content from Claude
+
+    Raises:
+        ClaudeClientError: If API call fails or returns invalid response
+    """
+    try:
+        client = get_async_claude_client()
+
+        start = time.perf_counter()
+        response = await call_with_retry_async(
+            f"claude:{model}",
+            client.messages.create,
+            estimated_tokens=estimate_tokens(system_prompt + user_prompt),
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system=_system_blocks(system_prompt),
+            messages=[
+                {
+                    "role": "user",
+                    "content": user_prompt
+                }
+            ],
+            **_tool_params(tool)
+        )
+        _record_usage(model, response, (time.perf_counter() - start) * 1000)
+
+        return response_text(response.content)
+
+    except (APIError, CircuitOpenError) as e:
+        raise to_claude_error(e)
+    except ClaudeClientError:
+        raise
+    except Exception as e:
+        raise ClaudeClientError(f"Unexpected error calling Claude: {e}")
+
+
+async def call_claude_json_async(
+    system_prompt: str,
+    user_prompt: str,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 4000,
+    use_cache: bool = True,
+    tool: Optional[StructuredTool] = None
+) -> str:
+    """
+    Async counterpart of call_claude_json (temperature=0 for structured output).
+
+    Cache lookups that reach the disk tier run on the "db" executor.
+
+    Args:
+        system_prompt: System-level instructions (should specify JSON output)
+        user_prompt: User message/prompt
+        model: Claude model to use
+        max_tokens: Maximum tokens in response
+        use_cache: Read and write the response cache (default: True)
+        tool: Structured output tool to force (see structured_output.py)
+
+    Returns:
+        Response text content (should be valid JSON)
+
+    Raises:
+        ClaudeClientError: If API call fails
+    """
+    key = make_cache_key(model, system_prompt, user_prompt, max_tokens, forced_tool_name(tool))
+    if LLM_CACHE_ENABLED and use_cache:
+        cached = await run_blocking("db", response_cache.get, key)
+        if cached is not None:
+            return cached
+    elif LLM_CACHE_ENABLED:
+        response_cache.record_bypass()
+
+    async def fetch() -> str:
+        response_text = await call_claude_async(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            model=model,
+            max_tokens=max_tokens,
+            temperature=0.0,
+            tool=tool
+        )
+        if LLM_CACHE_ENABLED and _is_cacheable(response_text):
+            await run_blocking("db", response_cache.put, key, response_text)
+        return response_text
+
+    return await _json_flight.do(key, fetch)
+
+
+async def stream_claude_json_async(
+    system_prompt: str,
+    user_prompt: str,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 4000,
+    use_cache: bool = True,
+    tool: Optional[StructuredTool] = None
+) -> AsyncIterator[str]:
+    """
+    Stream a temperature-0 JSON response from Claude as text chunks.
+
+    Shares the response cache with call_claude_json_async: a cached
+    response is yielded as a single chunk, and a completed stream that
+    parses as JSON is stored. Closing the generator early (e.g. because
+    the HTTP client disconnected) closes the upstream stream. With a tool,
+    the chunks are the tool input JSON as Claude writes it.
+
+    Args:
+        system_prompt: System-level instructions (should specify JSON output)
+        user_prompt: User message/prompt
+        model: Claude model to use
+        max_tokens: Maximum tokens in response
+        use_cache: Read and write the response cache (default: True)
+        tool: Structured output tool to force; must not use result_key
+
+    Yields:
+        Response text chunks in order
+
+    Raises:
+        ClaudeClientError: If API call fails or returns no content
+    """
+    if tool is not None and tool.result_key is not None:
+        raise ValueError("Streaming can't unwrap a tool result_key")
+
+    key = make_cache_key(model, system_prompt, user_prompt, max_tokens, forced_tool_name(tool))
+    if LLM_CACHE_ENABLED and use_cache:
+        cached = await run_blocking("db", response_cache.get, key)
+        if cached is not None:
+            yield cached
+            return
+    elif LLM_CACHE_ENABLED:
+        response_cache.record_bypass()
+
+    chunks = []
+    try:
+        client = get_async_claude_client()
+
+        # A stream can't be replayed once chunks have been sent, so it goes
+        # through the breaker but is not retried
+        breaker = get_breaker(f"claude:{model}")
+        breaker.before_call()
+        start = time.perf_counter()
+        try:
+            async with get_limiter(f"claude:{model}").acquire_async(
+                estimate_tokens(system_prompt + user_prompt)
+            ), client.messages.stream(
+                model=model,
+                max_tokens=max_tokens,
+                temperature=0.0,
+                system=_system_blocks(system_prompt),
+                messages=[
+                    {
+                        "role": "user",
+                        "content": user_prompt
+                    }
+                ],
+                **_tool_params(tool)
+            ) as stream:
+                async for event in stream:
+                    if event.type != "content_block_delta":
+                        continue
+                    if event.delta.type == "text_delta":
+                        text = event.delta.text
+                    elif event.delta.type == "input_json_delta":
+                        text = event.delta.partial_json
+                    else:
+                        continue
+                    chunks.append(text)
+                    yield text
+                final_message = await stream.get_final_message()
+        except Exception as e:
+            breaker.record_error(e)
+            llm_telemetry.record(f"claude:{model}", "error", (time.perf_counter() - start) * 1000, error=e)
+            raise
+        except BaseException as e:
+            breaker.release()
+            llm_telemetry.record(f"claude:{model}", "cancelled", (time.perf_counter() - start) * 1000, error=e)
+            raise
+        breaker.record_success()
+        duration_ms = (time.perf_counter() - start) * 1000
+        _record_usage(model, final_message, duration_ms)
+        llm_telemetry.record(f"claude:{model}", "ok", duration_ms, response=final_message)
+
+    except (APIError, CircuitOpenError) as e:
+        raise to_claude_error(e)
+    except Exception as e:
+        raise ClaudeClientError(f"Unexpected error calling Claude: {e}")
+
+    if not chunks:
+        raise ClaudeClientError("Empty response from Claude API")
+
+    response_text = "".join(chunks)
+    if LLM_CACHE_ENABLED and _is_cacheable(response_text):
+        await run_blocking("db", response_cache.put, key, response_text)
 
 
 if __name__ == "__main__":
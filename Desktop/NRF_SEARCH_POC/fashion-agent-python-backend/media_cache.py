@@ -0,0 +1,277 @@
+"""
+Generated-media cache for Alex Fashion Stylist
+Content-addressed image and video files on local disk, in a sharded directory
+with a SQLite index, evicted least-recently-used under a byte cap
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from provider_config import google_is_stubbed
+
+
+# Set ALEX_MEDIA_CACHE=0 to always generate media from scratch
+MEDIA_CACHE_ENABLED = os.getenv("ALEX_MEDIA_CACHE", "1") != "0"
+# Stub media gets its own directory so it is never served as real output
+MEDIA_CACHE_DIR = os.getenv(
+    "ALEX_MEDIA_CACHE_DIR", "media_cache_stub" if google_is_stubbed() else "media_cache"
+)
+# Total bytes of cached files (default 2 GiB)
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("ALEX_MEDIA_CACHE_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+_EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "video/mp4": "mp4"}
+
+
+def make_media_key(kind: str, prompt: str, parameters: Dict[str, Any], reference: Optional[bytes] = None) -> str:
+    """
+    Hash the inputs that determine a generated image or video.
+
+    Args:
+        kind: "image" or "video"
+        prompt: Generation prompt as given by the caller
+        parameters: Everything else that changes the output (aspect ratio, style, duration, ...)
+        reference: Bytes of the input image, for image-to-video or image-to-image
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    reference_digest = hashlib.sha256(reference).hexdigest() if reference is not None else None
+    payload = json.dumps([kind, prompt, parameters, reference_digest], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MediaCache:
+    """
+    Disk cache of generated media.
+
+    Each file is stored under objects/<key[:2]>/<key[2:4]>/<key>.<ext>, so
+    no directory grows past a few hundred entries. The SQLite index holds
+    each entry's size, MIME type, the generator's result metadata and when
+    it was last served. Once the indexed bytes exceed the cap, the
+    least-recently-used entries and their files are removed. Files are
+    written to a temporary name and renamed into place, so a reader never
+    sees a partial file, and an index row whose file has gone missing is
+    treated as a miss.
+    """
+
+    def __init__(self, directory: str = MEDIA_CACHE_DIR, max_bytes: int = MEDIA_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._index_lock = threading.Lock()
+
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "evictions": 0,
+            "bytes_served": 0,
+            "bytes_stored": 0,
+            "missing_files": 0,
+            "errors": 0,
+        }
+
+    def _index(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.directory, "index.db"), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS media (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    mime_type TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    metadata TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_media_last_used ON media (last_used_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _relative_path(self, key: str, mime_type: str) -> str:
+        return os.path.join("objects", key[:2], key[2:4], f"{key}.{_EXTENSIONS.get(mime_type, 'bin')}")
+
+    def _remove_file(self, relative_path: str) -> None:
+        try:
+            os.remove(os.path.join(self.directory, relative_path))
+        except FileNotFoundError:
+            pass
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] += amount
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str, Dict[str, Any]]]:
+        """
+        Look up cached media.
+
+        Args:
+            key: Key from make_media_key
+
+        Returns:
+            (bytes, MIME type, stored metadata), or None on a miss
+        """
+        try:
+            with self._index_lock:
+                row = self._index().execute(
+                    "SELECT mime_type, path, metadata FROM media WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+            mime_type, relative_path, metadata = row
+            try:
+                with open(os.path.join(self.directory, relative_path), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                # Deleted from under us (another process evicted it, or by hand)
+                with self._index_lock:
+                    conn = self._index()
+                    conn.execute("DELETE FROM media WHERE key = ?", (key,))
+                    conn.commit()
+                self._count("missing_files")
+                self._count("misses")
+                return None
+            with self._index_lock:
+                conn = self._index()
+                conn.execute(
+                    "UPDATE media SET last_used_at = ?, hits = hits + 1 WHERE key = ?", (time.time(), key)
+                )
+                conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            print(f"Media cache read failed: {e}")
+            self._count("errors")
+            self._count("misses")
+            return None
+
+        with self._lock:
+            self._counters["hits"] += 1
+            self._counters["bytes_served"] += len(data)
+        return data, mime_type, json.loads(metadata)
+
+    def put(self, key: str, kind: str, data: bytes, mime_type: str, metadata: Dict[str, Any]) -> None:
+        """
+        Store generated media, evicting least-recently-used entries past the byte cap.
+
+        Args:
+            key: Key from make_media_key
+            kind: "image" or "video"
+            data: Image or video bytes
+            mime_type: e.g. "image/png" or "video/mp4"
+            metadata: JSON-serializable result details returned again on a hit
+        """
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        relative_path = self._relative_path(key, mime_type)
+        full_path = os.path.join(self.directory, relative_path)
+        now = time.time()
+        try:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            temp_path = f"{full_path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, full_path)
+
+            with self._index_lock:
+                conn = self._index()
+                conn.execute(
+                    "INSERT OR REPLACE INTO media "
+                    "(key, kind, mime_type, path, size, metadata, created_at, last_used_at, hits) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                    (key, kind, mime_type, relative_path, size, json.dumps(metadata, ensure_ascii=False), now, now)
+                )
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM media").fetchone()[0]
+                victims = []
+                if total > self.max_bytes:
+                    # Walk oldest-used entries until enough bytes are freed
+                    excess = total - self.max_bytes
+                    for victim_key, victim_path, victim_size in conn.execute(
+                        "SELECT key, path, size FROM media WHERE key != ? ORDER BY last_used_at", (key,)
+                    ):
+                        victims.append((victim_key, victim_path))
+                        excess -= victim_size
+                        if excess <= 0:
+                            break
+                    conn.executemany("DELETE FROM media WHERE key = ?", [(k,) for k, _ in victims])
+                conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            print(f"Media cache write failed: {e}")
+            self._count("errors")
+            return
+
+        # Files go once their rows are gone, so a reader sees a miss, not a broken entry
+        for _, victim_path in victims:
+            self._remove_file(victim_path)
+        with self._lock:
+            self._counters["stores"] += 1
+            self._counters["bytes_stored"] += size
+            self._counters["evictions"] += len(victims)
+
+    def record_bypass(self) -> None:
+        """Count a lookup skipped because the caller asked to bypass the cache."""
+        self._count("bypassed")
+
+    def clear(self) -> None:
+        """Remove every entry and its file."""
+        with self._index_lock:
+            conn = self._index()
+            paths = [row[0] for row in conn.execute("SELECT path FROM media")]
+            conn.execute("DELETE FROM media")
+            conn.commit()
+        for relative_path in paths:
+            self._remove_file(relative_path)
+
+    def close(self) -> None:
+        """Close the index connection."""
+        with self._index_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get hit-rate, bytes-served and size metrics.
+
+        Returns:
+            Dictionary of counters, hit rate and per-kind entry counts and bytes
+        """
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+
+        disk: Dict[str, Any] = {"path": self.directory, "max_bytes": self.max_bytes}
+        if self._conn is not None:
+            with self._index_lock:
+                rows = self._conn.execute(
+                    "SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM media GROUP BY kind"
+                ).fetchall()
+            disk["entries"] = sum(count for _, count, _ in rows)
+            disk["bytes"] = sum(size for _, _, size in rows)
+            disk["kinds"] = {kind: {"entries": count, "bytes": size} for kind, count, size in rows}
+
+        return {
+            "enabled": MEDIA_CACHE_ENABLED,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            **counters,
+            "disk": disk,
+        }
+
+
+media_cache = MediaCache()
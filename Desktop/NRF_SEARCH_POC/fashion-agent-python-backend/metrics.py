@@ -0,0 +1,81 @@
+"""
+Lightweight in-process metrics for Alex Fashion Stylist
+Thread-safe latency summaries shared by the database and upstream call layers
+"""
+import math
+import threading
+from collections import deque
+from typing import Dict, Iterable, List
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+
+    Args:
+        sorted_values: Values sorted ascending
+        pct: Percentile in the range 0-100
+
+    Returns:
+        The percentile value, or 0.0 for an empty list
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(values: Iterable[float]) -> Dict[str, float]:
+    """
+    Summarize a collection of millisecond durations.
+
+    Args:
+        values: Durations in milliseconds
+
+    Returns:
+        Dictionary with count, avg_ms, max_ms, p50_ms, p95_ms and p99_ms
+    """
+    ordered = sorted(values)
+    count = len(ordered)
+    return {
+        "count": count,
+        "avg_ms": round(sum(ordered) / count, 3) if count else 0.0,
+        "max_ms": round(ordered[-1], 3) if count else 0.0,
+        "p50_ms": round(percentile(ordered, 50), 3),
+        "p95_ms": round(percentile(ordered, 95), 3),
+        "p99_ms": round(percentile(ordered, 99), 3),
+    }
+
+
+class LatencyStats:
+    """
+    Running summary of durations in milliseconds.
+
+    Keeps an exact total count and a bounded window of recent samples
+    for percentile estimates, so memory stays flat under load.
+    """
+
+    def __init__(self, window: int = 1024):
+        self._samples = deque(maxlen=window)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def record(self, duration_ms: float) -> None:
+        """Record a single duration in milliseconds."""
+        with self._lock:
+            self._samples.append(duration_ms)
+            self._count += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Get a point-in-time summary.
+
+        Returns:
+            Dictionary with total count plus avg/max/p50/p95/p99 over the recent window
+        """
+        with self._lock:
+            samples = list(self._samples)
+            count = self._count
+        summary = summarize(samples)
+        summary["count"] = count
+        return summary
@@ -0,0 +1,282 @@
+"""
+Model availability memory for Alex Fashion Stylist
+Remembers how each model in the Gemini/Imagen/Veo fallback chains last
+answered, so requests skip models that were just found unavailable (403/404)
+or answering without media, and a background thread probes them until they
+recover
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from metrics import LatencyStats
+from resilience import CircuitOpenError, UNAVAILABLE_STATUS_CODES, get_status_code
+
+
+# Set ALEX_MODEL_HEALTH=0 to always try every model in chain order
+MODEL_HEALTH_ENABLED = os.getenv("ALEX_MODEL_HEALTH", "1") != "0"
+# How long a model is skipped after a 403/404, or after answering without the
+# requested image/video; doubled each further time in a row, up to MAX_TTL
+MODEL_UNAVAILABLE_TTL = float(os.getenv("ALEX_MODEL_UNAVAILABLE_TTL", "600"))
+MODEL_NO_OUTPUT_TTL = float(os.getenv("ALEX_MODEL_NO_OUTPUT_TTL", "300"))
+MODEL_MAX_TTL = float(os.getenv("ALEX_MODEL_MAX_TTL", "3600"))
+# A model whose last call failed some other way (5xx, timeout, ...) is tried
+# after its healthy peers for this long; repeated failures are the circuit
+# breaker's job (resilience.py)
+MODEL_ERROR_DEMOTE_TTL = float(os.getenv("ALEX_MODEL_ERROR_DEMOTE_TTL", "60"))
+# When a skipped model's TTL expires, check it with a metadata lookup
+# (models.get, no generation cost) and keep skipping it until that succeeds,
+# rather than letting a user request find out. Without probes it is simply
+# tried again once the TTL expires.
+MODEL_PROBES_ENABLED = os.getenv("ALEX_MODEL_PROBES", "1") != "0"
+# Wait before re-probing after a probe failed for a reason other than 403/404
+MODEL_PROBE_RETRY = float(os.getenv("ALEX_MODEL_PROBE_RETRY", "60"))
+
+UNAVAILABLE = "unavailable"
+NO_OUTPUT = "no_output"
+
+
+class _ModelState:
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self.skip_reason: Optional[str] = None
+        self.skipped_until = 0.0
+        # Still skipped after skipped_until until a probe succeeds
+        self.awaiting_probe = False
+        # Consecutive unavailable/no-output outcomes, for TTL doubling
+        self.strikes = 0
+        self.last_error_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.latency = LatencyStats(window=256)
+        self.counters = {
+            "successes": 0, "unavailable": 0, "no_output": 0, "errors": 0,
+            "skipped": 0, "probes": 0, "probe_failures": 0,
+        }
+
+    def is_skipped(self, now: float) -> bool:
+        return self.skip_reason is not None and (now < self.skipped_until or self.awaiting_probe)
+
+
+class ModelHealthRegistry:
+    """
+    Per-model outcome memory shared by every request.
+
+    candidates() returns a fallback chain in the order to try it: models
+    with no recent trouble in preference order, then models whose last call
+    failed within MODEL_ERROR_DEMOTE_TTL. Models that answered 403/404 or
+    without media are left out until their TTL expires and, if a prober is
+    registered for the provider, a background probe confirms they are back.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[Tuple[str, str], _ModelState] = {}
+        self._probers: Dict[str, Callable[[str], Any]] = {}
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _state(self, provider: str, model: str) -> _ModelState:
+        state = self._models.get((provider, model))
+        if state is None:
+            state = self._models[(provider, model)] = _ModelState(provider, model)
+        return state
+
+    def register_prober(self, provider: str, probe: Callable[[str], Any]) -> None:
+        """
+        Set how to check whether a provider's model is back.
+
+        Args:
+            provider: "gemini", "imagen" or "veo"
+            probe: Called with a model name; raises if the model is unavailable
+        """
+        with self._lock:
+            self._probers[provider] = probe
+
+    def candidates(self, provider: str, models: Sequence[str]) -> List[Tuple[int, str]]:
+        """
+        Order a fallback chain by what is known about its models.
+
+        Args:
+            provider: "gemini", "imagen" or "veo"
+            models: Models in order of preference
+
+        Returns:
+            (position in the original chain, model) pairs to try, in order;
+            skipped models are left out
+        """
+        if not MODEL_HEALTH_ENABLED:
+            return list(enumerate(models))
+        now = time.monotonic()
+        ready: List[Tuple[int, str]] = []
+        demoted: List[Tuple[int, str]] = []
+        skipped: List[str] = []
+        with self._lock:
+            for depth, model in enumerate(models):
+                state = self._state(provider, model)
+                if state.is_skipped(now):
+                    state.counters["skipped"] += 1
+                    skipped.append(model)
+                elif state.last_error_at is not None and now - state.last_error_at < MODEL_ERROR_DEMOTE_TTL:
+                    demoted.append((depth, model))
+                else:
+                    ready.append((depth, model))
+        if skipped:
+            print(f"  ⏭️  Skipping recently unavailable {provider} model(s): {', '.join(skipped)}")
+        return ready + demoted
+
+    def is_skipped(self, provider: str, model: str) -> bool:
+        """Whether a single model is currently being skipped (counted like candidates())."""
+        return not self.candidates(provider, [model])
+
+    def record_success(self, provider: str, model: str, duration_ms: float) -> None:
+        """Record a call that produced the requested media."""
+        with self._lock:
+            state = self._state(provider, model)
+            state.counters["successes"] += 1
+            state.latency.record(duration_ms)
+            state.skip_reason = None
+            state.awaiting_probe = False
+            state.strikes = 0
+            state.last_error_at = None
+
+    def record_no_output(self, provider: str, model: str, duration_ms: float, skip: bool = True) -> None:
+        """
+        Record a call that succeeded but returned no image or video.
+
+        Args:
+            skip: Skip the model for MODEL_NO_OUTPUT_TTL (a model that answers
+                text only can't do the job); False only demotes it, for
+                empty results that are more likely a safety filter on this
+                prompt than a problem with the model
+        """
+        with self._lock:
+            state = self._state(provider, model)
+            state.counters["no_output"] += 1
+            state.latency.record(duration_ms)
+            state.last_error = "returned no media"
+            if skip:
+                self._skip(state, NO_OUTPUT, MODEL_NO_OUTPUT_TTL)
+            else:
+                state.last_error_at = time.monotonic()
+
+    def record_error(self, provider: str, model: str, exc: BaseException) -> None:
+        """
+        Record a call that raised.
+
+        403/404 mean the model can't serve this key, so it is skipped; other
+        errors only demote it. CircuitOpenError isn't recorded: the breaker
+        rejected the call without asking the model.
+        """
+        if isinstance(exc, CircuitOpenError):
+            return
+        with self._lock:
+            state = self._state(provider, model)
+            state.last_error = f"{type(exc).__name__}: {str(exc)[:200]}"
+            if get_status_code(exc) in UNAVAILABLE_STATUS_CODES:
+                state.counters["unavailable"] += 1
+                self._skip(state, UNAVAILABLE, MODEL_UNAVAILABLE_TTL)
+            else:
+                state.counters["errors"] += 1
+                state.last_error_at = time.monotonic()
+
+    def _skip(self, state: _ModelState, reason: str, ttl: float) -> None:
+        # Called with the lock held
+        state.strikes += 1
+        state.skip_reason = reason
+        state.skipped_until = time.monotonic() + min(ttl * 2 ** (state.strikes - 1), MODEL_MAX_TTL)
+        state.awaiting_probe = MODEL_PROBES_ENABLED and state.provider in self._probers
+        if state.awaiting_probe:
+            self._ensure_prober()
+            self._wake.set()
+
+    # ------------------------------------------------------------------------
+    # Background probing
+    # ------------------------------------------------------------------------
+
+    def _ensure_prober(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="alex-model-probe", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                waiting = [state for state in self._models.values() if state.skip_reason and state.awaiting_probe]
+                due = [state for state in waiting if now >= state.skipped_until]
+                next_due = min((state.skipped_until for state in waiting if state not in due), default=None)
+            for state in due:
+                self._probe(state)
+            if not due:
+                self._wake.wait(None if next_due is None else max(0.0, next_due - time.monotonic()))
+                self._wake.clear()
+
+    def _probe(self, state: _ModelState) -> None:
+        probe = self._probers[state.provider]
+        try:
+            probe(state.model)
+        except Exception as e:
+            with self._lock:
+                state.counters["probe_failures"] += 1
+                state.last_error = f"probe {type(e).__name__}: {str(e)[:200]}"
+                if get_status_code(e) in UNAVAILABLE_STATUS_CODES:
+                    self._skip(state, UNAVAILABLE, MODEL_UNAVAILABLE_TTL)
+                else:
+                    state.skipped_until = time.monotonic() + MODEL_PROBE_RETRY
+            print(f"  🩺 {state.provider}:{state.model} still unavailable: {str(e)[:80]}")
+            return
+        with self._lock:
+            state.counters["probes"] += 1
+            # Back in the chain; strikes are kept, so if it fails again it is
+            # skipped for twice as long
+            state.awaiting_probe = False
+            state.skip_reason = None
+        print(f"  🩺 {state.provider}:{state.model} is available again")
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get per-model availability, outcome counts, success rate and latency.
+
+        Returns:
+            Dictionary of settings and "<provider>:<model>" to metrics
+        """
+        now = time.monotonic()
+        models = {}
+        with self._lock:
+            states = list(self._models.values())
+        for state in sorted(states, key=lambda s: (s.provider, s.model)):
+            with self._lock:
+                counters = dict(state.counters)
+                if state.is_skipped(now):
+                    status = "probing" if now >= state.skipped_until else "skipped"
+                elif state.last_error_at is not None and now - state.last_error_at < MODEL_ERROR_DEMOTE_TTL:
+                    status = "demoted"
+                else:
+                    status = "available"
+                skip_reason = state.skip_reason if status in ("skipped", "probing") else None
+                skipped_for = max(0.0, state.skipped_until - now) if status == "skipped" else 0.0
+                strikes = state.strikes
+                last_error = state.last_error
+            outcomes = counters["successes"] + counters["unavailable"] + counters["no_output"] + counters["errors"]
+            models[f"{state.provider}:{state.model}"] = {
+                "status": status,
+                "skip_reason": skip_reason,
+                "skipped_for_s": round(skipped_for, 1),
+                "strikes": strikes,
+                **counters,
+                "success_rate": round(counters["successes"] / outcomes, 4) if outcomes else None,
+                "latency": state.latency.snapshot(),
+                "last_error": last_error,
+            }
+        return {
+            "enabled": MODEL_HEALTH_ENABLED,
+            "probes_enabled": MODEL_PROBES_ENABLED,
+            "unavailable_ttl_s": MODEL_UNAVAILABLE_TTL,
+            "no_output_ttl_s": MODEL_NO_OUTPUT_TTL,
+            "models": models,
+        }
+
+
+model_health = ModelHealthRegistry()
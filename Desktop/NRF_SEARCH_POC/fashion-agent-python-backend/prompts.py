@@ -2,44 +2,38 @@
 Prompt engineering for Alex Fashion Stylist
 Contains prompt builders for Claude LLM interactions
 """
-import json
-from typing import Dict, List, Any
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, List, Any, Tuple
 from datetime import datetime
 
+from rate_limits import CHARS_PER_TOKEN, estimate_tokens
 
-def build_trend_ingestion_prompt(
-    article_text: str,
-    source_title: str,
-    source_url: str
-) -> str:
-    """
-    Build a prompt for Claude to extract fashion trends from an article.
 
-    Args:
-        article_text: The article content to analyze
-        source_title: Title of the source article
-        source_url: URL of the source article
+# ============================================================================
+# Static Prompt Prefixes
+# ============================================================================
+# Everything that is identical across requests lives in the system prompts
+# below, which llm_client sends with an Anthropic cache_control marker.
+# Keep them free of per-request values (dates, URLs, user data) or every
+# call becomes a cache write instead of a cache read.
 
-    Returns:
-        Formatted prompt string for Claude
-    """
-    today = datetime.now().isoformat()
-
-    prompt = f"""You are a fashion trend analyst extracting concrete, wearable fashion trends from articles.
+TREND_INGESTION_SYSTEM_PROMPT = """You are a fashion trend analyst specialized in extracting structured, actionable fashion trends from articles and content.
 
-SOURCE INFORMATION:
-- Title: {source_title}
-- URL: {source_url}
-- Analysis Date: {today}
+Your role is to:
+1. Identify concrete, wearable fashion trends (specific garments, cuts, styling approaches)
+2. Ignore vague concepts unless paired with specific clothing items
+3. Extract all relevant metadata (season, colours, contexts, etc.)
+4. Output clean, valid JSON that matches the provided schema exactly
 
-ARTICLE CONTENT:
-{article_text}
+You always respond with pure JSON arrays, never with explanatory text or markdown formatting.
 
 TASK:
-Extract fashion trends from this article and output ONLY a valid JSON array of trend objects. Do NOT include any other text, explanations, or markdown formatting - just the raw JSON array.
+Extract fashion trends from the article in the user message and output ONLY a valid JSON array of trend objects. Do NOT include any other text, explanations, or markdown formatting - just the raw JSON array.
 
 Each trend object must follow this exact schema:
-{{
+{
   "name": "Short descriptive name (e.g., 'Wide Leg Tailored Trousers')",
   "season": "Season (e.g., 'SS2026', 'AW2025', or 'All season' if not specified)",
   "garment_types": ["List of garment types, e.g., 'trousers', 'blazer', 'dress'"],
@@ -53,11 +47,10 @@ Each trend object must follow this exact schema:
   "region": "Geographic relevance: 'global', 'india', 'europe', 'us', 'asia', etc. (default 'global')",
   "key_items": ["Specific garments that make up this trend, e.g., 'linen blazer', 'wide leg trousers', 'loafers'"],
   "avoid_for_body_types": ["Body types that should avoid this (can be empty list)"],
-  "source_title": "{source_title}",
-  "source_url": "{source_url}",
-  "published_at": "{today}",
+  "source_title": "The Title from SOURCE INFORMATION, copied exactly",
+  "source_url": "The URL from SOURCE INFORMATION, copied exactly",
   "confidence": "One of: 'high', 'medium', or 'low' (default 'medium')"
-}}
+}
 
 IMPORTANT RULES:
 1. Only extract CONCRETE, WEARABLE trends - specific garments, cuts, or styling approaches
@@ -71,55 +64,24 @@ IMPORTANT RULES:
 4. Keep names short and descriptive (3-6 words max)
 5. Be specific about garments in key_items
 6. Output ONLY the JSON array, no explanatory text before or after
-7. Ensure the JSON is valid (proper quotes, no trailing commas)
+7. Ensure the JSON is valid (proper quotes, no trailing commas)"""
 
-Extract all concrete fashion trends you can find and output them as a JSON array."""
-
-    return prompt
-
-
-def build_stylist_prompt(
-    user_profile: Dict[str, Any],
-    context: Dict[str, Any],
-    trends: List[Dict[str, Any]]
-) -> str:
-    """
-    Build a prompt for Claude to generate personalized styling recommendations.
-
-    Args:
-        user_profile: User profile dictionary with preferences and constraints
-        context: Occasion context dictionary
-        trends: List of relevant fashion trend dictionaries
 
-    Returns:
-        Formatted prompt string for Claude
-    """
+STYLIST_SYSTEM_PROMPT = """You are Alex, an expert personal fashion stylist with deep knowledge of current trends, body types, cultural contexts, and personal style.
 
-    # Format trends for the prompt (limit details to keep prompt concise)
-    trends_summary = []
-    for i, trend in enumerate(trends[:30], 1):  # Limit to 30 trends
-        trend_str = f"{i}. {trend.get('name', 'Unknown')} ({trend.get('season', 'All season')})"
-        if trend.get('style_tags'):
-            trend_str += f" - Tags: {', '.join(trend['style_tags'][:3])}"
-        if trend.get('key_items'):
-            trend_str += f" - Items: {', '.join(trend['key_items'][:3])}"
-        trends_summary.append(trend_str)
-
-    trends_text = "\n".join(trends_summary) if trends_summary else "No specific trends available"
+Your role is to:
+1. Create personalized, wearable outfit recommendations
+2. Respect all user constraints (comfort, budget, colour preferences)
+3. Consider cultural context and occasion appropriateness
+4. Reference current fashion trends where relevant
+5. Provide complete styling guidance from garments to grooming
 
-    prompt = f"""You are Alex, a personal fashion stylist. Your task is to create a personalized outfit recommendation.
+You always respond with pure JSON matching the exact output schema provided, with no additional text or markdown formatting. Your recommendations are specific, practical, and tailored to each individual user.
 
 OUTPUT REQUIREMENT:
 You must respond with ONLY valid JSON matching the exact schema below. No additional text, explanations, or markdown - just pure JSON.
 
-USER PROFILE:
-{json.dumps(user_profile, indent=2)}
-
-OCCASION CONTEXT:
-{json.dumps(context, indent=2)}
-
-CURRENT FASHION TRENDS (for inspiration):
-{trends_text}
+The user message gives the USER PROFILE, OCCASION CONTEXT and CURRENT FASHION TRENDS for this request.
 
 STYLING REQUIREMENTS:
 1. RESPECT ALL CONSTRAINTS:
@@ -150,22 +112,22 @@ STYLING REQUIREMENTS:
    - Generate media prompts for image and video generation
 
 REQUIRED JSON OUTPUT SCHEMA:
-{{
-  "style_guide": {{
+{
+  "style_guide": {
     "title": "Short catchy title for this look (e.g., 'Modern Minimalist Office Chic')",
     "one_line_summary": "One sentence describing the overall vibe",
     "key_pieces": [
-      {{
+      {
         "item_type": "Type of garment (e.g., 'trousers', 'shirt', 'blazer', 'dress', 'saree')",
         "description": "Specific description (e.g., 'Wide-leg navy trousers in cotton blend')",
         "fit": "Fit description (e.g., 'relaxed', 'slim', 'boxy', 'tailored')",
         "price_band": "One of: 'low', 'medium', or 'high'"
-      }}
+      }
     ],
-    "colour_palette": {{
+    "colour_palette": {
       "primary": ["Main colours", "e.g. navy, cream"],
       "accent": ["Accent colours", "e.g. rust, gold"]
-    }},
+    },
     "fabrics_textures": ["List of fabrics/textures", "e.g. cotton, linen, silk"],
     "footwear": "Specific footwear recommendation (e.g., 'White leather sneakers or tan loafers')",
     "accessories": ["List of accessories", "e.g. 'Minimal gold hoops', 'Structured tote bag'"],
@@ -173,54 +135,280 @@ REQUIRED JSON OUTPUT SCHEMA:
     "dos": ["List of styling dos", "e.g. 'Keep jewelry minimal', 'Tuck in the shirt'"],
     "donts": ["List of styling don'ts", "e.g. 'Avoid over-accessorizing', 'Skip heavy prints'"],
     "trend_references": ["Names of trends from the list used", "or empty list if none"]
-  }},
-  "media_prompts": {{
+  },
+  "media_prompts": {
     "image_prompt": "A detailed prompt for generating a static outfit image showing [describe the complete outfit, colours, fit, styling, setting]. Make it specific and visual.",
     "video_prompt": "A detailed prompt for generating a 360-degree video showing [describe how the outfit looks from all angles, movement, drape, fit, setting]. Include camera movement description."
-  }}
-}}
+  }
+}
 
 CRITICAL:
 - Output ONLY the JSON object above, nothing else
 - Ensure valid JSON (proper quotes, no trailing commas, correct nesting)
 - All text fields must be strings, arrays must be arrays
 - Be concise but specific in all descriptions
-- Make the media prompts detailed enough for AI image/video generation
+- Make the media prompts detailed enough for AI image/video generation"""
+
+
+# ============================================================================
+# Dynamic Prompt Builders
+# ============================================================================
+# The per-request user prompts are filled into templates whose fixed text is
+# measured once at import, and trimmed to a token budget using the same
+# estimator as the rate limiters.
+
+# Token budgets for the per-request user prompts (the cached system prompts
+# are not counted)
+STYLIST_PROMPT_BUDGET = int(os.getenv("ALEX_STYLIST_PROMPT_BUDGET", "1200"))
+TREND_INGESTION_PROMPT_BUDGET = int(os.getenv("ALEX_INGESTION_PROMPT_BUDGET", "4000"))
+
+# Upper bound on trends listed, whatever the budget
+STYLIST_MAX_TRENDS = 30
+
+_TREND_INGESTION_TEMPLATE = """SOURCE INFORMATION:
+- Title: {title}
+- URL: {url}
+- Analysis Date: {today}
+
+ARTICLE CONTENT:
+{article}
+
+Extract all concrete fashion trends you can find and output them as a JSON array."""
+
+_STYLIST_TEMPLATE = """Create a personalized outfit recommendation for this user.
+
+USER PROFILE:
+{profile}
+
+OCCASION CONTEXT:
+{context}
+
+CURRENT FASHION TRENDS (for inspiration, most relevant first):
+{trends}
 
 Generate the styling recommendation now as pure JSON:"""
 
+_TRUNCATION_MARKER = "\n[article truncated]"
+
+# Estimated tokens of the fixed template text
+_TREND_INGESTION_TEMPLATE_TOKENS = estimate_tokens(
+    _TREND_INGESTION_TEMPLATE.format(title="", url="", today="", article="") + _TRUNCATION_MARKER
+)
+_STYLIST_TEMPLATE_TOKENS = estimate_tokens(_STYLIST_TEMPLATE.format(profile="", context="", trends=""))
+
+
+class PromptStats:
+    """Sizes of built prompts per kind, and how often they had to be trimmed to budget."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {
+            "prompts": 0, "tokens": 0, "max_tokens": 0, "trimmed": 0, "items_dropped": 0, "chars_dropped": 0,
+        })
+
+    def record(self, kind: str, tokens: int, items_dropped: int = 0, chars_dropped: int = 0) -> None:
+        with self._lock:
+            counts = self._counts[kind]
+            counts["prompts"] += 1
+            counts["tokens"] += tokens
+            counts["max_tokens"] = max(counts["max_tokens"], tokens)
+            counts["trimmed"] += 1 if items_dropped or chars_dropped else 0
+            counts["items_dropped"] += items_dropped
+            counts["chars_dropped"] += chars_dropped
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get prompt size counters.
+
+        Returns:
+            Dictionary with the budgets and, per kind, prompt count, average
+            and maximum estimated tokens, and how much was trimmed
+        """
+        with self._lock:
+            counts = {kind: dict(values) for kind, values in self._counts.items()}
+        for values in counts.values():
+            values["avg_tokens"] = round(values["tokens"] / values["prompts"], 1) if values["prompts"] else 0.0
+        return {
+            "budgets": {"stylist": STYLIST_PROMPT_BUDGET, "trend_ingestion": TREND_INGESTION_PROMPT_BUDGET},
+            **counts,
+        }
+
+
+prompt_stats = PromptStats()
+
+
+def compact_fields(values: Dict[str, Any]) -> str:
+    """
+    Serialize a flat dictionary as "key=value; key=value".
+
+    Lists are joined with commas and empty values are left out, which takes
+    a fraction of the tokens of indented JSON.
+
+    Args:
+        values: Dictionary of scalars and lists
+
+    Returns:
+        Compact single-line text
+    """
+    parts = []
+    for key, value in values.items():
+        if value is None or value == "" or value == []:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ", ".join(str(item) for item in value)
+        parts.append(f"{key}={value}")
+    return "; ".join(parts)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut text to roughly max_tokens, ending at a line or sentence break if one is close.
+
+    Args:
+        text: Text to shorten
+        max_tokens: Estimated token limit
+
+    Returns:
+        The text, shortened if it was over the limit
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    limit = max(max_tokens - 1, 0) * CHARS_PER_TOKEN
+    cut = text[:limit]
+    # Prefer a clean break in the last fifth of the kept text
+    boundary = max(cut.rfind("\n"), cut.rfind(". ") + 1)
+    if boundary > limit * 0.8:
+        cut = cut[:boundary]
+    return cut.rstrip()
+
+
+def build_trend_ingestion_prompt(
+    article_text: str,
+    source_title: str,
+    source_url: str
+) -> str:
+    """
+    Build the per-article part of the trend extraction prompt.
+
+    The extraction instructions and schema are in the system prompt; this
+    only carries the source details and article text. Articles longer than
+    TREND_INGESTION_PROMPT_BUDGET allows are truncated.
+
+    Args:
+        article_text: The article content to analyze
+        source_title: Title of the source article
+        source_url: URL of the source article
+
+    Returns:
+        Formatted prompt string for Claude
+    """
+    # Day granularity keeps re-runs on the same day byte-identical, so the
+    # response cache can answer them
+    today = datetime.now().date().isoformat()
+
+    available = (
+        TREND_INGESTION_PROMPT_BUDGET - _TREND_INGESTION_TEMPLATE_TOKENS
+        - estimate_tokens(source_title) - estimate_tokens(source_url)
+    )
+    article = truncate_to_tokens(article_text, available)
+    chars_dropped = len(article_text) - len(article)
+    if chars_dropped:
+        print(f"  Article '{source_title}' trimmed by {chars_dropped} characters to fit the prompt budget")
+        article += _TRUNCATION_MARKER
+
+    prompt = _TREND_INGESTION_TEMPLATE.format(title=source_title, url=source_url, today=today, article=article)
+    prompt_stats.record("trend_ingestion", estimate_tokens(prompt), chars_dropped=chars_dropped)
     return prompt
 
 
-def get_trend_ingestion_system_prompt() -> str:
+def _format_trend(index: int, trend: Dict[str, Any]) -> str:
+    trend_str = f"{index}. {trend.get('name', 'Unknown')} ({trend.get('season', 'All season')})"
+    if trend.get('style_tags'):
+        trend_str += f" - Tags: {', '.join(trend['style_tags'][:3])}"
+    if trend.get('key_items'):
+        trend_str += f" - Items: {', '.join(trend['key_items'][:3])}"
+    return trend_str
+
+
+def fit_stylist_prompt(
+    user_profile: Dict[str, Any],
+    context: Dict[str, Any],
+    trends: List[Dict[str, Any]]
+) -> Tuple[str, int]:
     """
-    Returns the system prompt for trend ingestion tasks.
+    Build the per-request styling prompt within STYLIST_PROMPT_BUDGET.
+
+    The profile and context are always included; trends are listed in the
+    order given until the budget runs out, so pass the most relevant first.
+
+    Args:
+        user_profile: User profile dictionary with preferences and constraints
+        context: Occasion context dictionary
+        trends: Fashion trend dictionaries, most relevant first
+
+    Returns:
+        Tuple of (prompt, number of trends included)
     """
-    return """You are a fashion trend analyst specialized in extracting structured, actionable fashion trends from articles and content.
+    profile_text = compact_fields(user_profile)
+    context_text = compact_fields(context)
+    available = (
+        STYLIST_PROMPT_BUDGET - _STYLIST_TEMPLATE_TOKENS
+        - estimate_tokens(profile_text) - estimate_tokens(context_text)
+    )
 
-Your role is to:
-1. Identify concrete, wearable fashion trends (specific garments, cuts, styling approaches)
-2. Ignore vague concepts unless paired with specific clothing items
-3. Extract all relevant metadata (season, colours, contexts, etc.)
-4. Output clean, valid JSON that matches the provided schema exactly
+    trend_lines = []
+    for i, trend in enumerate(trends[:STYLIST_MAX_TRENDS], 1):
+        line = _format_trend(i, trend)
+        cost = estimate_tokens(line + "\n")
+        if cost > available:
+            break
+        trend_lines.append(line)
+        available -= cost
 
-You always respond with pure JSON arrays, never with explanatory text or markdown formatting."""
+    trends_text = "\n".join(trend_lines) if trend_lines else "No specific trends available"
+    prompt = _STYLIST_TEMPLATE.format(profile=profile_text, context=context_text, trends=trends_text)
+    dropped = min(len(trends), STYLIST_MAX_TRENDS) - len(trend_lines)
+    prompt_stats.record("stylist", estimate_tokens(prompt), items_dropped=dropped)
+    return prompt, len(trend_lines)
 
 
-def get_stylist_system_prompt() -> str:
+def build_stylist_prompt(
+    user_profile: Dict[str, Any],
+    context: Dict[str, Any],
+    trends: List[Dict[str, Any]]
+) -> str:
     """
-    Returns the system prompt for styling recommendation tasks.
+    Build the per-request part of the styling prompt.
+
+    The styling requirements and output schema are in the system prompt;
+    this only carries the user profile, occasion and trends (trimmed to
+    the token budget, see fit_stylist_prompt).
+
+    Args:
+        user_profile: User profile dictionary with preferences and constraints
+        context: Occasion context dictionary
+        trends: Fashion trend dictionaries, most relevant first
+
+    Returns:
+        Formatted prompt string for Claude
     """
-    return """You are Alex, an expert personal fashion stylist with deep knowledge of current trends, body types, cultural contexts, and personal style.
+    return fit_stylist_prompt(user_profile, context, trends)[0]
 
-Your role is to:
-1. Create personalized, wearable outfit recommendations
-2. Respect all user constraints (comfort, budget, colour preferences)
-3. Consider cultural context and occasion appropriateness
-4. Reference current fashion trends where relevant
-5. Provide complete styling guidance from garments to grooming
 
-You always respond with pure JSON matching the exact output schema provided, with no additional text or markdown formatting. Your recommendations are specific, practical, and tailored to each individual user."""
+def get_trend_ingestion_system_prompt() -> str:
+    """
+    Returns the system prompt for trend ingestion tasks.
+    Static across calls, so it is eligible for Anthropic prompt caching.
+    """
+    return TREND_INGESTION_SYSTEM_PROMPT
+
+
+def get_stylist_system_prompt() -> str:
+    """
+    Returns the system prompt for styling recommendation tasks.
+    Static across calls, so it is eligible for Anthropic prompt caching.
+    """
+    return STYLIST_SYSTEM_PROMPT
 
 
 if __name__ == "__main__":
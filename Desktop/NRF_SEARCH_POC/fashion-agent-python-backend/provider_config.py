@@ -0,0 +1,32 @@
+"""
+Provider backend settings for Alex Fashion Stylist
+Which upstreams go to the live APIs and which to the local stubs, readable
+without importing any vendor SDK (the SQLite, cache and telemetry layers use
+it to keep stub data out of the real files)
+"""
+import os
+
+
+LIVE = "live"
+STUB = "stub"
+
+# ALEX_PROVIDERS selects the backend for every provider; ALEX_CLAUDE_PROVIDER
+# and ALEX_GOOGLE_PROVIDER (Gemini, Imagen and Veo) override it per provider
+PROVIDERS = os.getenv("ALEX_PROVIDERS", LIVE)
+CLAUDE_PROVIDER = os.getenv("ALEX_CLAUDE_PROVIDER", PROVIDERS)
+GOOGLE_PROVIDER = os.getenv("ALEX_GOOGLE_PROVIDER", PROVIDERS)
+
+
+def claude_is_stubbed() -> bool:
+    """Whether Claude calls go to the local stub."""
+    return CLAUDE_PROVIDER == STUB
+
+
+def google_is_stubbed() -> bool:
+    """Whether Gemini, Imagen and Veo calls go to the local stub."""
+    return GOOGLE_PROVIDER == STUB
+
+
+def any_provider_stubbed() -> bool:
+    """Whether Claude or the Google APIs go to a local stub."""
+    return STUB in (CLAUDE_PROVIDER, GOOGLE_PROVIDER)
@@ -0,0 +1,618 @@
+"""
+Upstream provider selection for Alex Fashion Stylist
+Chooses between the real Anthropic / google-genai SDK clients and deterministic
+local stubs with the same call surface, so the service can be load-tested and
+profiled without API keys or spend
+"""
+import asyncio
+import hashlib
+import io
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from anthropic import APIStatusError
+from anthropic.types import (
+    InputJSONDelta, Message, RawContentBlockDeltaEvent, TextBlock, TextDelta, ToolUseBlock, Usage
+)
+from google import genai
+from google.genai import errors as genai_errors
+from google.genai import types
+from PIL import Image, ImageDraw
+
+from prompts import STYLIST_SYSTEM_PROMPT, TREND_INGESTION_SYSTEM_PROMPT
+from provider_config import (
+    CLAUDE_PROVIDER, GOOGLE_PROVIDER, any_provider_stubbed, claude_is_stubbed, google_is_stubbed
+)
+from rate_limits import estimate_tokens
+
+# Stub behaviour per upstream. Latency is sampled from a distribution:
+#   {"distribution": "fixed", "ms": 500}
+#   {"distribution": "uniform", "min_ms": 200, "max_ms": 800}
+#   {"distribution": "lognormal", "median_ms": 1500, "sigma": 0.4}
+# error_rate is the fraction of calls failing with error_status.
+# unavailable_models answer 404 (as models that don't exist or aren't enabled
+# for the key do), and Gemini's text_only_models answer without an image.
+# ALEX_STUB_CONFIG (JSON) overrides individual settings, e.g.
+# '{"claude": {"error_rate": 0.05}, "gemini": {"image_width": 1024}}'
+DEFAULT_STUB_CONFIG: Dict[str, Dict[str, Any]] = {
+    "claude": {
+        "latency": {"distribution": "lognormal", "median_ms": 2500, "sigma": 0.35},
+        "error_rate": 0.0,
+        "error_status": 529,
+        # Share of the latency spent before the first streamed chunk
+        "first_token_fraction": 0.3,
+        "stream_chunk_chars": 40,
+        # Fraction of free-text (non-tool) responses wrapped in a markdown
+        # fence with a trailing comma, to exercise JSON repair
+        "malformed_rate": 0.0,
+        # Payload size: key pieces per style guide, trends per article
+        "key_pieces": 4,
+        "trends_per_article": 3,
+    },
+    "gemini": {
+        "latency": {"distribution": "lognormal", "median_ms": 6000, "sigma": 0.3},
+        "error_rate": 0.0,
+        "error_status": 503,
+        "image_width": 768,
+        "image_height": 1344,
+        # Random pixels make the PNG roughly width*height*3 bytes; flat images compress to a few KB
+        "image_noise": False,
+        "unavailable_models": [],
+        "text_only_models": [],
+    },
+    "imagen": {
+        "latency": {"distribution": "lognormal", "median_ms": 5000, "sigma": 0.3},
+        "error_rate": 0.0,
+        "error_status": 503,
+        "image_width": 768,
+        "image_height": 1344,
+        "image_noise": False,
+        "unavailable_models": [],
+    },
+    "veo": {
+        # Latency of starting and polling the operation; the video itself
+        # becomes available operation_seconds after it was started
+        "latency": {"distribution": "uniform", "min_ms": 300, "max_ms": 900},
+        "error_rate": 0.0,
+        "error_status": 503,
+        "operation_seconds": 30,
+        "video_bytes": 2 * 1024 * 1024,
+        "unavailable_models": [],
+    },
+}
+
+# Seed for every stub decision; the same seed and requests give the same
+# latencies, errors and payloads
+STUB_SEED = os.getenv("ALEX_STUB_SEED", "alex")
+
+
+def _load_stub_config() -> Dict[str, Dict[str, Any]]:
+    config = {key: dict(value) for key, value in DEFAULT_STUB_CONFIG.items()}
+    overrides = os.getenv("ALEX_STUB_CONFIG")
+    if overrides:
+        for key, value in json.loads(overrides).items():
+            config.setdefault(key, {}).update(value)
+    return config
+
+
+STUB_CONFIG = _load_stub_config()
+
+
+# ============================================================================
+# Deterministic Randomness
+# ============================================================================
+
+class _StubRandom:
+    """
+    Per-request random streams.
+
+    Each stream is seeded from the upstream, the request content and how
+    many times that exact request has been made, so results don't depend
+    on how concurrent requests interleave, and a retried request gets a
+    fresh draw rather than failing forever.
+    """
+
+    def __init__(self, seed: str):
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._seen: Counter = Counter()
+
+    def for_request(self, upstream: str, content: str) -> Tuple[random.Random, str]:
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        with self._lock:
+            occurrence = self._seen[(upstream, digest)]
+            self._seen[(upstream, digest)] += 1
+        seed = hashlib.sha256(f"{self.seed}:{upstream}:{digest}:{occurrence}".encode("utf-8")).digest()
+        return random.Random(seed), digest
+
+
+_random = _StubRandom(STUB_SEED)
+
+
+def sample_latency(spec: Dict[str, Any], rng: random.Random) -> float:
+    """
+    Draw a latency in seconds from a latency spec (see DEFAULT_STUB_CONFIG).
+
+    Args:
+        spec: Distribution settings
+        rng: Random stream to draw from
+
+    Returns:
+        Latency in seconds
+    """
+    distribution = spec.get("distribution", "fixed")
+    if distribution == "uniform":
+        ms = rng.uniform(spec["min_ms"], spec["max_ms"])
+    elif distribution == "lognormal":
+        ms = spec["median_ms"] * rng.lognormvariate(0.0, spec.get("sigma", 0.3))
+    else:
+        ms = spec.get("ms", 0)
+    return max(ms, 0) / 1000.0
+
+
+def _plan(upstream: str, content: str) -> Tuple[random.Random, str, float, bool]:
+    config = STUB_CONFIG[upstream]
+    rng, digest = _random.for_request(upstream, content)
+    latency = sample_latency(config["latency"], rng)
+    fails = rng.random() < config.get("error_rate", 0.0)
+    return rng, digest, latency, fails
+
+
+# ============================================================================
+# Stub Payloads
+# ============================================================================
+
+_COLOURS = ["navy", "ivory", "sage green", "terracotta", "charcoal", "camel", "burgundy", "sky blue"]
+_ITEMS = [
+    ("trousers", "wide-leg"), ("shirt", "relaxed"), ("blazer", "tailored"), ("dress", "a-line"),
+    ("kurta", "straight"), ("knit top", "fitted"), ("skirt", "midi"), ("jacket", "boxy"),
+]
+_FABRICS = ["cotton", "linen", "silk", "wool blend", "khadi", "denim"]
+
+
+def canned_style_response(rng: random.Random, digest: str) -> str:
+    """Build a valid AlexStyleResponse JSON document."""
+    config = STUB_CONFIG["claude"]
+    palette = rng.sample(_COLOURS, 4)
+    pieces = []
+    for i in range(config["key_pieces"]):
+        item, fit = _ITEMS[(rng.randrange(len(_ITEMS)) + i) % len(_ITEMS)]
+        pieces.append({
+            "item_type": item,
+            "description": f"{palette[i % len(palette)].capitalize()} {item} in {rng.choice(_FABRICS)}",
+            "fit": fit,
+            "price_band": rng.choice(["low", "medium", "high"]),
+        })
+    return json.dumps({
+        "style_guide": {
+            "title": f"Stub Look {digest[:6]}",
+            "one_line_summary": f"A {palette[0]} and {palette[1]} look generated by the local stub.",
+            "key_pieces": pieces,
+            "colour_palette": {"primary": palette[:2], "accent": palette[2:]},
+            "fabrics_textures": rng.sample(_FABRICS, 2),
+            "footwear": "Leather loafers",
+            "accessories": ["Structured tote", "Minimal watch"],
+            "grooming_hair": "Neat, natural finish",
+            "dos": ["Keep proportions balanced", "Repeat one colour from the palette"],
+            "donts": ["Avoid competing prints"],
+            "trend_references": [f"Stub Trend {digest[:4]}"],
+        },
+        "media_prompts": {
+            "image_prompt": f"Full-length fashion photo of a {pieces[0]['description'].lower()} outfit, studio lighting",
+            "video_prompt": "Slow 360-degree turn showing the outfit from every angle",
+        },
+    }, indent=2)
+
+
+def canned_trends_response(rng: random.Random, digest: str) -> str:
+    """Build a JSON array of trends as returned by trend extraction."""
+    config = STUB_CONFIG["claude"]
+    trends = []
+    for i in range(config["trends_per_article"]):
+        item, fit = rng.choice(_ITEMS)
+        trends.append({
+            "name": f"Stub {fit} {item} {digest[:6]}-{i}",
+            "season": rng.choice(["Spring/Summer 2026", "Autumn/Winter 2026", "All season"]),
+            "garment_types": [item],
+            "gender_focus": rng.choice(["all", "men", "women"]),
+            "style_tags": ["stub", fit],
+            "colour_palette": rng.sample(_COLOURS, 3),
+            "fit_notes": f"{fit.capitalize()} fit",
+            "contexts": rng.sample(["office", "date", "party", "casual_outing", "vacation"], 2),
+            "formality": rng.choice(["casual", "smart_casual", "semi_formal", "formal"]),
+            "climate_suitability": ["warm", "temperate"],
+            "region": "global",
+            "key_items": [f"{fit} {item}"],
+            "avoid_for_body_types": [],
+            "confidence": "low",
+        })
+    return json.dumps(trends, indent=2)
+
+
+def render_png(rng: random.Random, width: int, height: int, noise: bool) -> bytes:
+    """
+    Render a deterministic placeholder PNG.
+
+    Args:
+        rng: Random stream choosing colours (and pixels, with noise)
+        width: Image width in pixels
+        height: Image height in pixels
+        noise: Fill with random pixels so the file is roughly width*height*3 bytes
+
+    Returns:
+        PNG bytes
+    """
+    if noise:
+        image = Image.frombytes("RGB", (width, height), rng.randbytes(width * height * 3))
+    else:
+        image = Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        # A silhouette-sized block so different prompts are visibly different
+        draw.rectangle(
+            (width // 4, height // 8, 3 * width // 4, 7 * height // 8),
+            fill=tuple(rng.randrange(256) for _ in range(3))
+        )
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def fake_video(rng: random.Random, size: int) -> bytes:
+    """Bytes with an MP4 ftyp header, padded to size."""
+    header = b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom"
+    return header + rng.randbytes(max(size - len(header), 0))
+
+
+# ============================================================================
+# Claude Stub
+# ============================================================================
+
+def _system_text(system: Any) -> Tuple[str, bool]:
+    if isinstance(system, list):
+        return "".join(block.get("text", "") for block in system), any("cache_control" in b for b in system)
+    return system or "", False
+
+
+class _ClaudeStubCore:
+    """Builds Claude stub responses; shared by the sync and async clients."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cached_prefixes = set()
+
+    def plan(self, kwargs: Dict[str, Any]) -> Tuple[float, Optional[Exception], Optional[Message]]:
+        system, cacheable = _system_text(kwargs.get("system"))
+        user = kwargs["messages"][-1]["content"]
+        rng, digest, latency, fails = _plan("claude", system + user)
+
+        if fails:
+            status = STUB_CONFIG["claude"]["error_status"]
+            request = httpx.Request("POST", "https://stub.local/v1/messages")
+            error = APIStatusError(
+                f"Stub Claude error {status}",
+                response=httpx.Response(status, request=request),
+                body=None
+            )
+            # Errors come back quickly
+            return latency * 0.1, error, None
+
+        if system == STYLIST_SYSTEM_PROMPT:
+            text = canned_style_response(rng, digest)
+        elif system == TREND_INGESTION_SYSTEM_PROMPT:
+            text = canned_trends_response(rng, digest)
+        else:
+            text = f"Stub response {digest[:8]}: {user[:200]}"
+
+        tools = kwargs.get("tools")
+        if tools:
+            # Forced tool call: the payload becomes the tool input, wrapped
+            # under the schema's only property if the tool takes an object
+            tool = tools[0]
+            payload = json.loads(text) if text.startswith(("{", "[")) else {"text": text}
+            if not isinstance(payload, dict):
+                payload = {next(iter(tool["input_schema"]["properties"])): payload}
+            block = ToolUseBlock(type="tool_use", id=f"toolu_stub_{digest[:20]}", name=tool["name"], input=payload)
+            stop_reason = "tool_use"
+        else:
+            if rng.random() < STUB_CONFIG["claude"]["malformed_rate"]:
+                closer = text.rstrip()[-1]
+                text = f"Here is the JSON:\n```json\n{text.rstrip()[:-1].rstrip()},\n{closer}\n```"
+            block = TextBlock(type="text", text=text)
+            stop_reason = "end_turn"
+
+        # Mimic prompt caching: the first request with a cacheable system
+        # prompt writes the cache, later ones read it
+        cache_read = cache_write = 0
+        if cacheable:
+            with self._lock:
+                hit = system in self._cached_prefixes
+                self._cached_prefixes.add(system)
+            if hit:
+                cache_read = estimate_tokens(system)
+            else:
+                cache_write = estimate_tokens(system)
+        input_tokens = estimate_tokens(user) + (0 if cacheable else estimate_tokens(system))
+
+        message = Message(
+            id=f"msg_stub_{digest[:24]}",
+            type="message",
+            role="assistant",
+            model=kwargs["model"],
+            content=[block],
+            stop_reason=stop_reason,
+            stop_sequence=None,
+            usage=Usage(
+                input_tokens=input_tokens,
+                output_tokens=estimate_tokens(text),
+                cache_read_input_tokens=cache_read,
+                cache_creation_input_tokens=cache_write
+            )
+        )
+        return latency, None, message
+
+
+_claude_core = _ClaudeStubCore()
+
+
+class _StubMessages:
+    def create(self, **kwargs: Any) -> Message:
+        latency, error, message = _claude_core.plan(kwargs)
+        time.sleep(latency)
+        if error is not None:
+            raise error
+        return message
+
+
+class _AsyncStubStream:
+    """Async context manager matching AsyncAnthropic's messages.stream()."""
+
+    def __init__(self, kwargs: Dict[str, Any]):
+        self._latency, self._error, self._message = _claude_core.plan(kwargs)
+
+    async def __aenter__(self) -> "_AsyncStubStream":
+        if self._error is not None:
+            await asyncio.sleep(self._latency)
+            raise self._error
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        return None
+
+    async def __aiter__(self):
+        # Only the content_block_delta events callers read are emitted
+        config = STUB_CONFIG["claude"]
+        block = self._message.content[0]
+        text = block.text if block.type == "text" else json.dumps(block.input)
+        size = config["stream_chunk_chars"]
+        chunks = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        first = self._latency * config["first_token_fraction"]
+        between = (self._latency - first) / len(chunks)
+        await asyncio.sleep(first)
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(between)
+            if block.type == "text":
+                delta = TextDelta(type="text_delta", text=chunk)
+            else:
+                delta = InputJSONDelta(type="input_json_delta", partial_json=chunk)
+            yield RawContentBlockDeltaEvent(type="content_block_delta", index=0, delta=delta)
+
+    async def get_final_message(self) -> Message:
+        return self._message
+
+
+class _AsyncStubMessages:
+    async def create(self, **kwargs: Any) -> Message:
+        latency, error, message = _claude_core.plan(kwargs)
+        await asyncio.sleep(latency)
+        if error is not None:
+            raise error
+        return message
+
+    def stream(self, **kwargs: Any) -> _AsyncStubStream:
+        return _AsyncStubStream(kwargs)
+
+
+class StubClaudeClient:
+    """Stand-in for anthropic.Anthropic (messages.create)."""
+
+    def __init__(self):
+        self.messages = _StubMessages()
+
+    def close(self) -> None:
+        pass
+
+
+class AsyncStubClaudeClient:
+    """Stand-in for anthropic.AsyncAnthropic (messages.create and messages.stream)."""
+
+    def __init__(self):
+        self.messages = _AsyncStubMessages()
+
+    async def close(self) -> None:
+        pass
+
+
+# ============================================================================
+# Google Stub (Gemini image, Imagen, Veo)
+# ============================================================================
+
+def _google_error(upstream: str) -> Exception:
+    status = STUB_CONFIG[upstream]["error_status"]
+    body = {"error": {"code": status, "message": f"Stub {upstream} error {status}", "status": "UNAVAILABLE"}}
+    if status >= 500:
+        return genai_errors.ServerError(status, body)
+    return genai_errors.ClientError(status, body)
+
+
+def _check_available(upstream: str, model: str) -> None:
+    if model in STUB_CONFIG[upstream].get("unavailable_models", ()):
+        body = {"error": {"code": 404, "message": f"models/{model} is not found", "status": "NOT_FOUND"}}
+        raise genai_errors.ClientError(404, body)
+
+
+def _prompt_text(contents: Any) -> str:
+    if isinstance(contents, str):
+        return contents
+    texts: List[str] = []
+    for content in contents if isinstance(contents, list) else [contents]:
+        for part in getattr(content, "parts", None) or []:
+            if getattr(part, "text", None):
+                texts.append(part.text)
+    return "\n".join(texts)
+
+
+class _StubModels:
+    def __init__(self, operations: "_StubOperations"):
+        self._operations = operations
+
+    def get(self, model: str) -> types.Model:
+        for upstream in ("gemini", "imagen", "veo"):
+            _check_available(upstream, model)
+        return types.Model(name=f"models/{model}")
+
+    def generate_content(self, model: str, contents: Any, config: Any = None) -> types.GenerateContentResponse:
+        config_values = STUB_CONFIG["gemini"]
+        _check_available("gemini", model)
+        prompt = _prompt_text(contents)
+        rng, _, latency, fails = _plan("gemini", f"{model}:{prompt}")
+        if fails:
+            time.sleep(latency * 0.1)
+            raise _google_error("gemini")
+        if model in config_values["text_only_models"]:
+            time.sleep(latency)
+            return types.GenerateContentResponse(candidates=[types.Candidate(content=types.Content(
+                role="model",
+                parts=[types.Part(text="I can describe this outfit, but I can't generate images.")]
+            ))])
+        png = render_png(rng, config_values["image_width"], config_values["image_height"], config_values["image_noise"])
+        time.sleep(latency)
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(
+                role="model",
+                parts=[types.Part(inline_data=types.Blob(data=png, mime_type="image/png"))]
+            ))],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=estimate_tokens(prompt),
+                # Gemini bills an output image as 1290 tokens
+                candidates_token_count=1290
+            )
+        )
+
+    def generate_images(self, model: str, prompt: str, config: Any = None) -> types.GenerateImagesResponse:
+        config_values = STUB_CONFIG["imagen"]
+        _check_available("imagen", model)
+        count = getattr(config, "number_of_images", None) or 1
+        rng, _, latency, fails = _plan("imagen", f"{model}:{count}:{prompt}")
+        if fails:
+            time.sleep(latency * 0.1)
+            raise _google_error("imagen")
+        images = [
+            types.GeneratedImage(image=types.Image(
+                image_bytes=render_png(
+                    rng, config_values["image_width"], config_values["image_height"], config_values["image_noise"]
+                ),
+                mime_type="image/png"
+            ))
+            for _ in range(count)
+        ]
+        time.sleep(latency)
+        return types.GenerateImagesResponse(generated_images=images)
+
+    def generate_videos(
+        self,
+        model: str,
+        prompt: str = "",
+        image: Any = None,
+        config: Any = None
+    ) -> types.GenerateVideosOperation:
+        _check_available("veo", model)
+        rng, digest, latency, fails = _plan("veo", f"{model}:{prompt}")
+        time.sleep(latency)
+        if fails:
+            raise _google_error("veo")
+        return self._operations.start(rng, digest)
+
+
+class _StubOperations:
+    """Fake long-running Veo operations that finish operation_seconds after starting."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started: Dict[str, Tuple[float, random.Random]] = {}
+
+    def start(self, rng: random.Random, digest: str) -> types.GenerateVideosOperation:
+        name = f"operations/stub-{digest[:12]}-{uuid.uuid4().hex[:8]}"
+        with self._lock:
+            self._started[name] = (time.monotonic(), rng)
+        return types.GenerateVideosOperation(name=name, done=False)
+
+    def get(self, operation: types.GenerateVideosOperation) -> types.GenerateVideosOperation:
+        config = STUB_CONFIG["veo"]
+        rng, _, latency, fails = _plan("veo", operation.name)
+        time.sleep(latency)
+        if fails:
+            raise _google_error("veo")
+
+        with self._lock:
+            started, video_rng = self._started[operation.name]
+            if time.monotonic() - started < config["operation_seconds"]:
+                return types.GenerateVideosOperation(name=operation.name, done=False)
+            del self._started[operation.name]
+
+        video = types.Video(video_bytes=fake_video(video_rng, config["video_bytes"]), mime_type="video/mp4")
+        return types.GenerateVideosOperation(
+            name=operation.name,
+            done=True,
+            result=types.GenerateVideosResponse(generated_videos=[types.GeneratedVideo(video=video)])
+        )
+
+
+class StubGoogleClient:
+    """Stand-in for google.genai.Client (models.get, models.* image/video calls and operations.get)."""
+
+    _operations = _StubOperations()
+
+    def __init__(self):
+        self.operations = self._operations
+        self.models = _StubModels(self._operations)
+
+
+# ============================================================================
+# Backend Selection
+# ============================================================================
+
+def create_google_client(get_api_key: Callable[[], str]) -> Any:
+    """
+    Create the client for Gemini, Imagen and Veo calls.
+
+    Args:
+        get_api_key: Returns the Google API key; only called for the live backend
+
+    Returns:
+        google.genai.Client, or StubGoogleClient when ALEX_GOOGLE_PROVIDER=stub
+    """
+    if google_is_stubbed():
+        return StubGoogleClient()
+    return genai.Client(api_key=get_api_key())
+
+
+def get_provider_info() -> Dict[str, Any]:
+    """
+    Get the selected backends, and the stub settings if any stub is in use.
+
+    Returns:
+        Dictionary for /stats
+    """
+    info: Dict[str, Any] = {"claude": CLAUDE_PROVIDER, "google": GOOGLE_PROVIDER}
+    if any_provider_stubbed():
+        info["stub_seed"] = STUB_SEED
+        info["stub_config"] = STUB_CONFIG
+    return info
@@ -0,0 +1,368 @@
+"""
+Outbound concurrency and rate limiting for Alex Fashion Stylist
+Per-provider concurrency caps and per-model request/token buckets, usable from
+both worker threads and the event loop
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional
+
+from metrics import LatencyStats
+
+
+# Limits per provider. concurrency is shared by every model of the provider
+# unless a provider:model entry sets its own; rpm (requests/minute) and tpm
+# (input tokens/minute) are buckets per model, matching how Anthropic and
+# Google apply quotas. 0 means unlimited.
+DEFAULT_RATE_LIMITS: Dict[str, Dict[str, int]] = {
+    "claude": {"concurrency": 16, "rpm": 50, "tpm": 30000},
+    "gemini": {"concurrency": 8, "rpm": 60, "tpm": 0},
+    "imagen": {"concurrency": 4, "rpm": 20, "tpm": 0},
+    "veo": {"concurrency": 2, "rpm": 10, "tpm": 0},
+    # Polling a running Veo operation isn't a generation request, so it must
+    # not queue behind new generations for the provider's slots
+    "veo:operations": {"concurrency": 0, "rpm": 0},
+}
+
+
+def _load_rate_limits() -> Dict[str, Dict[str, int]]:
+    # ALEX_RATE_LIMITS overrides by provider or by provider:model, e.g.
+    # '{"claude": {"rpm": 1000}, "gemini:gemini-2.5-flash-image": {"rpm": 10}}'
+    limits = {key: dict(value) for key, value in DEFAULT_RATE_LIMITS.items()}
+    overrides = os.getenv("ALEX_RATE_LIMITS")
+    if overrides:
+        for key, value in json.loads(overrides).items():
+            limits.setdefault(key, {}).update(value)
+    return limits
+
+
+RATE_LIMITS = _load_rate_limits()
+
+
+# Rough size of a token in English text, for estimate_tokens
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for rate limiting and prompt budgets (about 4 characters per token).
+
+    Args:
+        text: Prompt text
+
+    Returns:
+        Estimated token count
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+# ============================================================================
+# Primitives
+# ============================================================================
+
+class TokenBucket:
+    """
+    Continuously refilling token bucket.
+
+    reserve() debits immediately and returns how long the caller must wait,
+    so waiters are served in arrival order without polling.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """
+        Take tokens, going into debt if necessary.
+
+        Args:
+            amount: Tokens to take (capped at the bucket capacity)
+
+        Returns:
+            Seconds to wait before using the reservation
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= min(amount, self.capacity)
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def available(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            return min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+
+
+class _Waiter:
+    __slots__ = ("event", "loop", "future", "granted")
+
+    def __init__(self, event=None, loop=None, future=None):
+        self.event = event
+        self.loop = loop
+        self.future = future
+        self.granted = False
+
+
+def _resolve(future: "asyncio.Future") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ConcurrencyLimiter:
+    """
+    FIFO semaphore that can be waited on from threads and from coroutines.
+
+    Async waiters park on a future instead of a thread, so a burst of
+    requests queues without tying up executor threads or the event loop.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._waiters: Deque[_Waiter] = deque()
+
+    def _try_acquire(self) -> bool:
+        if self._in_use < self.limit and not self._waiters:
+            self._in_use += 1
+            return True
+        return False
+
+    def acquire(self) -> None:
+        """Take a slot, blocking the calling thread until one is free."""
+        with self._lock:
+            if self._try_acquire():
+                return
+            waiter = _Waiter(event=threading.Event())
+            self._waiters.append(waiter)
+        waiter.event.wait()
+
+    async def acquire_async(self) -> None:
+        """Take a slot, suspending the calling coroutine until one is free."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._try_acquire():
+                return
+            waiter = _Waiter(loop=loop, future=loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._waiters.remove(waiter)
+            if granted:
+                # The slot was handed over as we were cancelled; pass it on
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """Free a slot, handing it straight to the longest waiter if there is one."""
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                if waiter.event is not None:
+                    waiter.event.set()
+                    return
+                try:
+                    waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+                    return
+                except RuntimeError:
+                    # The waiter's event loop has closed; try the next one
+                    continue
+            self._in_use -= 1
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return {"limit": self.limit, "in_use": self._in_use, "waiting": len(self._waiters)}
+
+
+# ============================================================================
+# Upstream Limiter
+# ============================================================================
+
+class UpstreamLimiter:
+    """
+    Admission control for one upstream model.
+
+    A call first reserves from the model's request and token buckets
+    (sleeping off any debt), then takes a slot from the provider's
+    concurrency limiter, and holds the slot until the call returns.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        slots: Optional[ConcurrencyLimiter],
+        rpm: int = 0,
+        tpm: int = 0
+    ):
+        self.key = key
+        self.slots = slots
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._admitted = 0
+        self._wait = LatencyStats()
+
+    def _reserve(self, tokens: int) -> float:
+        wait = self.requests.reserve(1) if self.requests else 0.0
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def _enter(self) -> float:
+        with self._lock:
+            self._queued += 1
+        return time.perf_counter()
+
+    def _admit(self, started: float) -> None:
+        self._wait.record((time.perf_counter() - started) * 1000)
+        with self._lock:
+            self._queued -= 1
+            self._in_flight += 1
+            self._admitted += 1
+
+    def _abandon(self) -> None:
+        with self._lock:
+            self._queued -= 1
+
+    def _finish(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        if self.slots:
+            self.slots.release()
+
+    @contextmanager
+    def acquire(self, tokens: int = 0) -> Iterator[None]:
+        """
+        Hold a permit for one blocking upstream call.
+
+        Args:
+            tokens: Estimated input tokens the call will use
+        """
+        started = self._enter()
+        try:
+            wait = self._reserve(tokens)
+            if wait:
+                time.sleep(wait)
+            if self.slots:
+                self.slots.acquire()
+        except BaseException:
+            self._abandon()
+            raise
+        self._admit(started)
+        try:
+            yield
+        finally:
+            self._finish()
+
+    @asynccontextmanager
+    async def acquire_async(self, tokens: int = 0) -> AsyncIterator[None]:
+        """
+        Hold a permit for one async upstream call without blocking the event loop.
+
+        Args:
+            tokens: Estimated input tokens the call will use
+        """
+        started = self._enter()
+        try:
+            wait = self._reserve(tokens)
+            if wait:
+                await asyncio.sleep(wait)
+            if self.slots:
+                await self.slots.acquire_async()
+        except BaseException:
+            self._abandon()
+            raise
+        self._admit(started)
+        try:
+            yield
+        finally:
+            self._finish()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get queue depth, wait time and bucket levels for this model.
+
+        Returns:
+            Dictionary of gauges, counters and wait-time summary
+        """
+        with self._lock:
+            gauges = {
+                "queued": self._queued,
+                "in_flight": self._in_flight,
+                "admitted": self._admitted,
+            }
+        gauges["wait"] = self._wait.snapshot()
+        for name, bucket in (("rpm", self.requests), ("tpm", self.tokens)):
+            if bucket:
+                gauges[name] = {"limit": int(bucket.capacity), "available": round(bucket.available(), 1)}
+        return gauges
+
+
+_provider_slots: Dict[str, Optional[ConcurrencyLimiter]] = {}
+_limiters: Dict[str, UpstreamLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(key: str) -> UpstreamLimiter:
+    """
+    Get the shared limiter for an upstream model, creating it on first use.
+
+    Args:
+        key: "<provider>:<model>", the same key used for circuit breakers
+    """
+    limiter = _limiters.get(key)
+    if limiter is None:
+        provider = key.split(":", 1)[0]
+        with _limiters_lock:
+            limiter = _limiters.get(key)
+            if limiter is None:
+                config = {**RATE_LIMITS.get(provider, {}), **RATE_LIMITS.get(key, {})}
+                # A model-level concurrency entry gets its own slots
+                slots_key = key if "concurrency" in RATE_LIMITS.get(key, {}) else provider
+                if slots_key not in _provider_slots:
+                    concurrency = config.get("concurrency", 0)
+                    _provider_slots[slots_key] = ConcurrencyLimiter(concurrency) if concurrency else None
+                limiter = UpstreamLimiter(
+                    key,
+                    _provider_slots[slots_key],
+                    rpm=config.get("rpm", 0),
+                    tpm=config.get("tpm", 0)
+                )
+                _limiters[key] = limiter
+    return limiter
+
+
+def get_rate_limit_metrics() -> Dict[str, Any]:
+    """
+    Get provider concurrency and per-model limiter metrics.
+
+    Returns:
+        Dictionary with "providers" and "models" sections
+    """
+    with _limiters_lock:
+        slots = dict(_provider_slots)
+        limiters = dict(_limiters)
+    return {
+        "providers": {
+            provider: limiter.metrics() if limiter else {"limit": 0}
+            for provider, limiter in sorted(slots.items())
+        },
+        "models": {key: limiter.metrics() for key, limiter in sorted(limiters.items())},
+    }
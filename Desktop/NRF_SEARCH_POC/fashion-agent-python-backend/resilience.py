@@ -0,0 +1,461 @@
+"""
+Retry and circuit breaker layer for Alex Fashion Stylist upstream calls
+Shared by Claude, Gemini image and Veo calls so that every request sees the
+same view of which models are healthy
+"""
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from rate_limits import get_limiter
+from telemetry import llm_telemetry
+
+
+T = TypeVar("T")
+
+# Attempts per call, including the first one
+RETRY_MAX_ATTEMPTS = int(os.getenv("ALEX_RETRY_MAX_ATTEMPTS", "3"))
+# Exponential backoff: attempt n waits up to BASE * 2**(n-1), capped at MAX
+RETRY_BASE_DELAY = float(os.getenv("ALEX_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("ALEX_RETRY_MAX_DELAY", "20"))
+# Consecutive failures that open a model's breaker, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("ALEX_BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("ALEX_BREAKER_RESET_TIMEOUT", "30"))
+
+# 529 is Anthropic's "overloaded"
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504, 529}
+# Not worth retrying, but they do mean the model can't serve us right now
+UNAVAILABLE_STATUS_CODES = {403, 404}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while a model's circuit breaker is open"""
+
+    def __init__(self, key: str, retry_after: float):
+        self.key = key
+        self.retry_after = retry_after
+        super().__init__(f"Circuit open for {key}, retry in {retry_after:.1f}s")
+
+
+# ============================================================================
+# Error Classification
+# ============================================================================
+
+def get_status_code(exc: BaseException) -> Optional[int]:
+    """
+    Get the HTTP status from an Anthropic or google-genai exception.
+
+    Returns:
+        Status code, or None for errors without one (e.g. connection failures)
+    """
+    for attr in ("status_code", "code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def get_retry_after(exc: BaseException) -> Optional[float]:
+    """
+    Read Retry-After (seconds or HTTP date) or retry-after-ms from an error response.
+
+    Returns:
+        Seconds to wait, or None if the server gave no hint
+    """
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            return max(0.0, float(retry_after_ms) / 1000)
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+            return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def _is_connection_error(exc: BaseException) -> bool:
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    # SDK transport errors (anthropic.APIConnectionError, httpx.ConnectError,
+    # httpx.ReadTimeout, ...) don't share a base class we can import here
+    return any(
+        word in cls.__name__
+        for cls in type(exc).__mro__
+        for word in ("Connection", "Connect", "Timeout")
+    )
+
+
+def classify_error(exc: BaseException) -> Tuple[bool, bool]:
+    """
+    Decide how an upstream error should be handled.
+
+    Returns:
+        Tuple of (retryable, counts against the circuit breaker)
+    """
+    status_code = get_status_code(exc)
+    if status_code is None:
+        retryable = _is_connection_error(exc)
+        return retryable, retryable
+    if status_code in RETRYABLE_STATUS_CODES:
+        return True, True
+    return False, status_code in UNAVAILABLE_STATUS_CODES
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Delay before the next attempt: full-jitter exponential backoff, but never
+    sooner than the server's Retry-After.
+
+    Args:
+        attempt: Number of the attempt that just failed (1-based)
+        retry_after: Server-provided minimum wait in seconds
+
+    Returns:
+        Seconds to wait
+    """
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+    if retry_after is not None:
+        # Spread clients that were all told the same Retry-After
+        delay = retry_after + random.uniform(0, RETRY_BASE_DELAY)
+    return delay
+
+
+# ============================================================================
+# Circuit Breaker
+# ============================================================================
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker.
+
+    closed: calls go through. After BREAKER_FAILURE_THRESHOLD consecutive
+    failures the breaker opens and calls fail fast with CircuitOpenError.
+    Once the reset timeout (or a longer Retry-After) has passed it goes
+    half-open and lets a single probe call through: success closes it,
+    failure opens it again.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT
+    ):
+        self.key = key
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        self._counters = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "rejected": 0,
+            "opened": 0,
+        }
+
+    def before_call(self) -> None:
+        """
+        Reserve permission to call upstream.
+
+        Raises:
+            CircuitOpenError: If the breaker is open or a half-open probe is already running
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._state == "open" and now >= self._open_until:
+                self._state = "half_open"
+            if self._state == "open" or (self._state == "half_open" and self._probe_in_flight):
+                self._counters["rejected"] += 1
+                raise CircuitOpenError(self.key, max(0.0, self._open_until - now))
+            if self._state == "half_open":
+                self._probe_in_flight = True
+            self._counters["calls"] += 1
+
+    def record_success(self) -> None:
+        """Record an upstream call that shows the model is serving requests."""
+        with self._lock:
+            self._state = "closed"
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+            self._counters["successes"] += 1
+
+    def record_failure(self, retry_after: Optional[float] = None) -> None:
+        """
+        Record a failure that counts against the model's health.
+
+        Args:
+            retry_after: Server-provided wait; one longer than RETRY_MAX_DELAY
+                opens the breaker straight away so other requests stop trying
+        """
+        with self._lock:
+            self._consecutive_failures += 1
+            self._probe_in_flight = False
+            self._counters["failures"] += 1
+            long_wait = retry_after is not None and retry_after > RETRY_MAX_DELAY
+            if (
+                self._state == "half_open"
+                or self._consecutive_failures >= self.failure_threshold
+                or long_wait
+            ):
+                if self._state != "open":
+                    self._counters["opened"] += 1
+                self._state = "open"
+                self._open_until = time.monotonic() + max(self.reset_timeout, retry_after or 0.0)
+
+    def record_error(self, exc: BaseException) -> None:
+        """Record the outcome of a call that raised, based on what the error says about the model."""
+        _, counts = classify_error(exc)
+        if counts:
+            self.record_failure(get_retry_after(exc))
+        else:
+            # The model answered (e.g. a 400 for a bad prompt), so it is healthy
+            self.record_success()
+
+    def record_retry(self) -> None:
+        with self._lock:
+            self._counters["retries"] += 1
+
+    def release(self) -> None:
+        """Give back a half-open probe slot without recording an outcome (e.g. on cancellation)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get breaker state and call counters.
+
+        Returns:
+            Dictionary with state, consecutive failures, seconds until half-open and counters
+        """
+        with self._lock:
+            state = self._state
+            open_for = max(0.0, self._open_until - time.monotonic()) if state == "open" else 0.0
+            if state == "open" and open_for == 0.0:
+                state = "half_open"
+            return {
+                "state": state,
+                "consecutive_failures": self._consecutive_failures,
+                "open_for_s": round(open_for, 3),
+                **self._counters,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(key: str) -> CircuitBreaker:
+    """
+    Get the shared circuit breaker for an upstream model, creating it on first use.
+
+    Args:
+        key: "<provider>:<model>", e.g. "claude:claude-sonnet-4-20250514"
+    """
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(key, CircuitBreaker(key))
+    return breaker
+
+
+def get_resilience_metrics() -> Dict[str, Any]:
+    """
+    Get state and retry counts for every breaker created so far.
+
+    Returns:
+        Dictionary of retry settings and breaker key to metrics
+    """
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {
+        "retry": {
+            "max_attempts": RETRY_MAX_ATTEMPTS,
+            "base_delay_s": RETRY_BASE_DELAY,
+            "max_delay_s": RETRY_MAX_DELAY,
+        },
+        "breakers": {key: breaker.metrics() for key, breaker in sorted(breakers.items())},
+    }
+
+
+# ============================================================================
+# Retrying Calls
+# ============================================================================
+
+def _handle_failure(
+    breaker: CircuitBreaker,
+    exc: Exception,
+    attempt: int,
+    max_attempts: int
+) -> Optional[float]:
+    """Record a failed attempt and return the delay before retrying, or None to give up."""
+    breaker.record_error(exc)
+    retryable, _ = classify_error(exc)
+    retry_after = get_retry_after(exc)
+    if not retryable or attempt >= max_attempts:
+        return None
+    if retry_after is not None and retry_after > RETRY_MAX_DELAY:
+        return None
+    breaker.record_retry()
+    delay = backoff_delay(attempt, retry_after)
+    print(f"  ↻ {breaker.key} attempt {attempt} failed ({str(exc)[:80]}), retrying in {delay:.1f}s")
+    return delay
+
+
+def _call_status(exc: BaseException) -> str:
+    if isinstance(exc, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(exc, Exception):
+        return "error"
+    return "cancelled"
+
+
+def call_with_retry(
+    key: str,
+    fn: Callable[..., T],
+    *args: Any,
+    max_attempts: int = RETRY_MAX_ATTEMPTS,
+    estimated_tokens: int = 0,
+    fallback_depth: int = 0,
+    billable_units: float = 0.0,
+    **kwargs: Any
+) -> T:
+    """
+    Call a blocking upstream function with retries and the model's circuit breaker.
+
+    Every attempt, retries included, waits for a permit from the model's
+    rate limiter (rate_limits.py) before calling upstream. The call as a
+    whole is recorded in telemetry (telemetry.py).
+
+    Args:
+        key: Breaker and limiter key, "<provider>:<model>"
+        fn: Upstream call (e.g. client.messages.create)
+        *args: Positional arguments for fn
+        max_attempts: Attempts including the first (default: ALEX_RETRY_MAX_ATTEMPTS)
+        estimated_tokens: Input tokens to reserve from the model's token bucket
+        fallback_depth: Position of this model in the caller's fallback chain
+        billable_units: Seconds of video requested, for per-second cost estimates
+        **kwargs: Keyword arguments for fn
+
+    Returns:
+        Whatever fn returns
+
+    Raises:
+        CircuitOpenError: If the breaker is open
+        Exception: The last upstream error once retries are exhausted
+    """
+    breaker = get_breaker(key)
+    limiter = get_limiter(key)
+    started = time.perf_counter()
+    attempt = 0
+    try:
+        while True:
+            attempt += 1
+            breaker.before_call()
+            try:
+                with limiter.acquire(estimated_tokens):
+                    result = fn(*args, **kwargs)
+            except Exception as exc:
+                delay = _handle_failure(breaker, exc, attempt, max_attempts)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.record_success()
+            break
+    except BaseException as exc:
+        llm_telemetry.record(
+            key, _call_status(exc), (time.perf_counter() - started) * 1000, attempts=attempt,
+            fallback_depth=fallback_depth, error=exc
+        )
+        raise
+    llm_telemetry.record(
+        key, "ok", (time.perf_counter() - started) * 1000, attempts=attempt,
+        fallback_depth=fallback_depth, units=billable_units, response=result
+    )
+    return result
+
+
+async def call_with_retry_async(
+    key: str,
+    fn: Callable[..., Awaitable[T]],
+    *args: Any,
+    max_attempts: int = RETRY_MAX_ATTEMPTS,
+    estimated_tokens: int = 0,
+    fallback_depth: int = 0,
+    billable_units: float = 0.0,
+    **kwargs: Any
+) -> T:
+    """
+    Async counterpart of call_with_retry; waits for permits and between
+    attempts without blocking the loop.
+
+    Args:
+        key: Breaker and limiter key, "<provider>:<model>"
+        fn: Async upstream call (e.g. async_client.messages.create)
+        *args: Positional arguments for fn
+        max_attempts: Attempts including the first (default: ALEX_RETRY_MAX_ATTEMPTS)
+        estimated_tokens: Input tokens to reserve from the model's token bucket
+        fallback_depth: Position of this model in the caller's fallback chain
+        billable_units: Seconds of video requested, for per-second cost estimates
+        **kwargs: Keyword arguments for fn
+
+    Returns:
+        Whatever fn returns
+
+    Raises:
+        CircuitOpenError: If the breaker is open
+        Exception: The last upstream error once retries are exhausted
+    """
+    breaker = get_breaker(key)
+    limiter = get_limiter(key)
+    started = time.perf_counter()
+    attempt = 0
+    try:
+        while True:
+            attempt += 1
+            breaker.before_call()
+            try:
+                async with limiter.acquire_async(estimated_tokens):
+                    result = await fn(*args, **kwargs)
+            except Exception as exc:
+                delay = _handle_failure(breaker, exc, attempt, max_attempts)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.record_success()
+            break
+    except BaseException as exc:
+        llm_telemetry.record(
+            key, _call_status(exc), (time.perf_counter() - started) * 1000, attempts=attempt,
+            fallback_depth=fallback_depth, error=exc
+        )
+        raise
+    llm_telemetry.record(
+        key, "ok", (time.perf_counter() - started) * 1000, attempts=attempt,
+        fallback_depth=fallback_depth, units=billable_units, response=result
+    )
+    return result
@@ -0,0 +1,195 @@
+"""
+Request coalescing for Alex Fashion Stylist
+Concurrent identical requests share one upstream call instead of each making their own
+"""
+import asyncio
+import hashlib
+import json
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+
+T = TypeVar("T")
+
+
+def canonical_key(*parts: Any) -> str:
+    """
+    Hash JSON-serializable values into a key that ignores dict ordering.
+
+    Args:
+        *parts: Values identifying the request (e.g. endpoint name and validated body)
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _AsyncCall:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class _SyncCall:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; duplicates wait for it and share the outcome.
+
+    The async path runs the shared call as its own task, so one caller
+    being cancelled (e.g. its HTTP client disconnecting) doesn't cancel it
+    for the others; it is only cancelled once every caller has gone. The
+    sync path is for code running on worker threads.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._async_calls: Dict[Tuple[asyncio.AbstractEventLoop, str], _AsyncCall] = {}
+        self._sync_calls: Dict[str, _SyncCall] = {}
+        self._counters = {"calls": 0, "executed": 0, "coalesced": 0}
+
+    def _count(self, leader: bool) -> None:
+        self._counters["calls"] += 1
+        self._counters["executed" if leader else "coalesced"] += 1
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Await fn() for this key, joining an identical call already in flight.
+
+        Args:
+            key: Request key, e.g. from canonical_key
+            fn: Zero-argument coroutine function making the upstream call
+
+        Returns:
+            The shared result (exceptions are shared too)
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)
+        with self._lock:
+            call = self._async_calls.get(flight_key)
+            leader = call is None
+            if leader:
+                call = _AsyncCall(loop.create_task(fn()))
+                self._async_calls[flight_key] = call
+                call.task.add_done_callback(lambda task: self._finish_async(flight_key, task))
+            self._count(leader)
+            call.waiters += 1
+
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done():
+                with self._lock:
+                    call.waiters -= 1
+                    abandoned = call.waiters == 0
+                    # Unregister before cancelling, so a caller arriving now
+                    # starts a fresh call instead of joining the dying one
+                    if abandoned and self._async_calls.get(flight_key) is call:
+                        del self._async_calls[flight_key]
+                if abandoned:
+                    call.task.cancel()
+            raise
+
+    def _finish_async(self, flight_key: Tuple[asyncio.AbstractEventLoop, str], task: "asyncio.Task") -> None:
+        with self._lock:
+            if self._async_calls.get(flight_key) is not None and self._async_calls[flight_key].task is task:
+                del self._async_calls[flight_key]
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def do_sync(self, key: str, fn: Callable[[], T]) -> T:
+        """
+        Call fn() for this key, blocking on an identical call already in flight.
+
+        Args:
+            key: Request key, e.g. from canonical_key
+            fn: Zero-argument blocking function making the upstream call
+
+        Returns:
+            The shared result (exceptions are shared too)
+        """
+        with self._lock:
+            call = self._sync_calls.get(key)
+            leader = call is None
+            if leader:
+                call = _SyncCall()
+                self._sync_calls[key] = call
+            self._count(leader)
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._sync_calls[key]
+            call.event.set()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get coalescing counters.
+
+        Returns:
+            Dictionary with calls, executed upstream calls, upstream calls
+            saved by coalescing, and keys currently in flight
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            in_flight = len(self._async_calls) + len(self._sync_calls)
+        return {
+            "calls": counters["calls"],
+            "executed": counters["executed"],
+            "upstream_calls_saved": counters["coalesced"],
+            "in_flight": in_flight,
+        }
+
+
+_flights: Dict[str, SingleFlight] = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name: str) -> SingleFlight:
+    """
+    Get a named SingleFlight group, creating it on first use.
+
+    Args:
+        name: Group name, reported in metrics (e.g. "alex_style")
+    """
+    with _flights_lock:
+        flight = _flights.get(name)
+        if flight is None:
+            flight = _flights[name] = SingleFlight(name)
+        return flight
+
+
+def get_singleflight_metrics() -> Dict[str, Any]:
+    """
+    Get coalescing metrics for every group.
+
+    Returns:
+        Dictionary of group name to metrics
+    """
+    with _flights_lock:
+        flights = dict(_flights)
+    return {name: flight.metrics() for name, flight in sorted(flights.items())}
@@ -0,0 +1,325 @@
+"""
+Structured output for Alex Fashion Stylist
+Tool definitions generated from the Pydantic response models so Claude returns
+schema-shaped JSON, a tolerant repair step for responses that still arrive as
+malformed text, and parse-failure metrics
+"""
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+
+from models import AlexStyleResponse, Trend
+from rate_limits import estimate_tokens
+
+
+# Force Claude to answer through a tool whose input schema is generated from
+# the response model (set CLAUDE_STRUCTURED_OUTPUT=0 to fall back to free-text
+# JSON, e.g. to compare parse-failure rates)
+STRUCTURED_OUTPUT_ENABLED = os.getenv("CLAUDE_STRUCTURED_OUTPUT", "1") != "0"
+
+T = TypeVar("T")
+
+
+class StructuredOutputError(ValueError):
+    """A response could not be parsed or validated, even after repair"""
+
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        # "unparseable" or "invalid"
+        self.reason = reason
+
+
+# ============================================================================
+# Tool Definitions
+# ============================================================================
+
+def _inline_refs(node: Any, defs: Dict[str, Any]) -> Any:
+    # Resolve $ref against $defs and drop titles, which only cost tokens.
+    # Property names are kept as-is (StyleGuide has a property called "title").
+    if isinstance(node, list):
+        return [_inline_refs(item, defs) for item in node]
+    if not isinstance(node, dict):
+        return node
+    if "$ref" in node:
+        return _inline_refs(defs[node["$ref"].rsplit("/", 1)[-1]], defs)
+    inlined = {}
+    for key, value in node.items():
+        if key in ("$defs", "title"):
+            continue
+        if key == "properties":
+            inlined[key] = {name: _inline_refs(schema, defs) for name, schema in value.items()}
+        else:
+            inlined[key] = _inline_refs(value, defs)
+    return inlined
+
+
+class StructuredTool:
+    """
+    A tool Claude is forced to call, with its input schema taken from a Pydantic model.
+
+    Tool input has to be a JSON object, so a tool producing a list wraps it
+    under result_key; result_text() unwraps it again, and callers see the
+    same JSON text a free-text response would have contained.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        model: Type[BaseModel],
+        exclude: Iterable[str] = (),
+        result_key: Optional[str] = None
+    ):
+        self.name = name
+        self.description = description
+        self.result_key = result_key
+
+        raw = model.model_json_schema()
+        schema = _inline_refs(raw, raw.get("$defs", {}))
+        excluded = set(exclude)
+        if excluded:
+            schema["properties"] = {k: v for k, v in schema["properties"].items() if k not in excluded}
+            schema["required"] = [k for k in schema.get("required", []) if k not in excluded]
+        if result_key is not None:
+            schema = {
+                "type": "object",
+                "properties": {result_key: {"type": "array", "items": schema}},
+                "required": [result_key],
+            }
+        self.input_schema = schema
+
+    def definition(self) -> Dict[str, Any]:
+        """Tool definition for the Messages API tools parameter."""
+        return {"name": self.name, "description": self.description, "input_schema": self.input_schema}
+
+    def tool_choice(self) -> Dict[str, Any]:
+        """tool_choice forcing Claude to answer with this tool."""
+        return {"type": "tool", "name": self.name}
+
+    def result_text(self, tool_input: Dict[str, Any]) -> str:
+        """
+        Serialize a tool_use input as the JSON text callers parse.
+
+        Args:
+            tool_input: Input of the tool_use content block
+
+        Returns:
+            JSON text
+        """
+        value = tool_input.get(self.result_key, []) if self.result_key is not None else tool_input
+        return json.dumps(value, ensure_ascii=False)
+
+
+STYLE_TOOL = StructuredTool(
+    "record_style_guide",
+    "Record the complete personalised style guide and the image/video generation prompts for it.",
+    AlexStyleResponse
+)
+
+# Source details are stamped on by the ingestion script, not written by Claude
+TREND_TOOL = StructuredTool(
+    "record_trends",
+    "Record every concrete, wearable fashion trend extracted from the article.",
+    Trend,
+    exclude=("source_title", "source_url", "published_at"),
+    result_key="trends"
+)
+
+_TOOLS = {tool.name: tool for tool in (STYLE_TOOL, TREND_TOOL)}
+
+
+def get_tool(name: str) -> Optional[StructuredTool]:
+    """Look up a structured output tool by name (None if unknown)."""
+    return _TOOLS.get(name)
+
+
+# ============================================================================
+# JSON Repair
+# ============================================================================
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL)
+
+
+def _drop_trailing_comma(out: List[str]) -> None:
+    i = len(out) - 1
+    while i >= 0 and out[i].isspace():
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i]
+
+
+def repair_json(text: str) -> Any:
+    """
+    Recover a JSON value from a sloppy model response.
+
+    Handles markdown fences, prose before or after the value, trailing
+    commas, raw newlines inside strings, mismatched closing brackets and
+    output truncated mid-value (the incomplete last element is dropped).
+
+    Args:
+        text: Response text
+
+    Returns:
+        The parsed value
+
+    Raises:
+        ValueError: If no JSON value can be recovered
+    """
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise ValueError("No JSON object or array found")
+
+    out: List[str] = []
+    stack: List[str] = []
+    # (output length, open containers) at each comma, for cutting back truncated output
+    commas: List[Tuple[int, Tuple[str, ...]]] = []
+    in_string = escaped = False
+
+    for ch in text[min(starts):]:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                ch = "\\n"
+            out.append(ch)
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            out.append(stack.pop())
+            if not stack:
+                break
+            continue
+        elif ch == ",":
+            commas.append((len(out), tuple(stack)))
+        out.append(ch)
+
+    if not stack:
+        return json.loads("".join(out))
+
+    # Truncated: close what is open, cutting back to earlier commas until it parses
+    if in_string:
+        out.append('"')
+    candidates = [(len(out), tuple(stack))] + list(reversed(commas))
+    for length, open_containers in candidates:
+        head = out[:length]
+        _drop_trailing_comma(head)
+        try:
+            return json.loads("".join(head) + "".join(reversed(open_containers)))
+        except ValueError:
+            continue
+    raise ValueError("Could not repair truncated JSON")
+
+
+# ============================================================================
+# Parsing and Metrics
+# ============================================================================
+
+class ParseStats:
+    """
+    Per-kind counts of how responses parsed.
+
+    Each response has exactly one outcome: strict (valid as returned),
+    repaired (valid after repair_json), unparseable or invalid (failed
+    model validation). Failed responses count their tokens as wasted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {
+            "responses": 0, "strict": 0, "repaired": 0, "unparseable": 0, "invalid": 0,
+            "wasted_input_tokens": 0, "wasted_output_tokens": 0,
+        })
+
+    def record(self, kind: str, outcome: str, text: str = "", prompt_tokens: int = 0) -> None:
+        with self._lock:
+            counts = self._counts[kind]
+            counts["responses"] += 1
+            counts[outcome] += 1
+            if outcome in ("unparseable", "invalid"):
+                counts["wasted_input_tokens"] += prompt_tokens
+                counts["wasted_output_tokens"] += estimate_tokens(text)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get parse outcomes per kind.
+
+        failure_rate_without_repair is what the failure rate would be with
+        strict json.loads only; failure_rate is what callers actually see.
+
+        Returns:
+            Dictionary with the output mode and per-kind counts and rates
+        """
+        with self._lock:
+            counts = {kind: dict(values) for kind, values in self._counts.items()}
+        kinds = {}
+        for kind, values in sorted(counts.items()):
+            total = values["responses"]
+            failed = values["unparseable"] + values["invalid"]
+            kinds[kind] = {
+                **values,
+                "failure_rate": round(failed / total, 4) if total else 0.0,
+                "failure_rate_without_repair": round((failed + values["repaired"]) / total, 4) if total else 0.0,
+            }
+        return {"mode": "tool" if STRUCTURED_OUTPUT_ENABLED else "text", "kinds": kinds}
+
+
+parse_stats = ParseStats()
+
+
+def parse_structured(
+    text: str,
+    kind: str,
+    validate: Callable[[Any], T],
+    prompt_tokens: int = 0
+) -> T:
+    """
+    Parse a JSON response, repairing it if needed, and validate it.
+
+    Args:
+        text: Response text from Claude
+        kind: Metrics label, e.g. "style" or "trends"
+        validate: Turns the parsed value into the result; raises ValueError
+            or TypeError if it doesn't fit
+        prompt_tokens: Input tokens of the call, counted as wasted on failure
+
+    Returns:
+        The validated result
+
+    Raises:
+        StructuredOutputError: If the response can't be parsed or validated
+    """
+    outcome = "strict"
+    try:
+        value = json.loads(text)
+    except ValueError as e:
+        try:
+            value = repair_json(text)
+            outcome = "repaired"
+        except ValueError:
+            parse_stats.record(kind, "unparseable", text, prompt_tokens)
+            raise StructuredOutputError(f"Invalid JSON: {e}", "unparseable")
+
+    try:
+        result = validate(value)
+    except (ValueError, TypeError) as e:
+        parse_stats.record(kind, "invalid", text, prompt_tokens)
+        raise StructuredOutputError(str(e), "invalid")
+
+    parse_stats.record(kind, outcome)
+    return result
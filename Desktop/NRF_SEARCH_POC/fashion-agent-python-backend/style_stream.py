@@ -0,0 +1,172 @@
+"""
+Incremental JSON parsing for streamed Alex Fashion Stylist responses
+Emits style guide sections as soon as their JSON values are complete
+"""
+import json
+from typing import Any, Iterator, List, Optional, Tuple
+
+
+Path = Tuple[Any, ...]
+
+# Sections of the AlexStyleResponse JSON reported as they complete, in the
+# order the output schema asks Claude to write them. An int in a pattern
+# matches any array index, so each key piece is reported on its own.
+STYLE_SECTIONS: List[Tuple[Path, str]] = [
+    (("style_guide", "title"), "title"),
+    (("style_guide", "key_pieces", 0), "key_piece"),
+    (("style_guide", "key_pieces"), "key_pieces"),
+    (("style_guide", "colour_palette"), "colour_palette"),
+    (("media_prompts",), "media_prompts"),
+]
+
+
+def _matches(pattern: Path, path: Path) -> bool:
+    if len(pattern) != len(path):
+        return False
+    for expected, actual in zip(pattern, path):
+        if isinstance(expected, int):
+            if not isinstance(actual, int):
+                return False
+        elif expected != actual:
+            return False
+    return True
+
+
+class _Container:
+    __slots__ = ("is_object", "path", "start", "key", "expect_key", "index")
+
+    def __init__(self, is_object: bool, path: Path, start: int):
+        self.is_object = is_object
+        self.path = path
+        self.start = start
+        self.key: Optional[str] = None
+        self.expect_key = is_object
+        self.index = 0
+
+    def child_path(self) -> Path:
+        return self.path + ((self.key,) if self.is_object else (self.index,))
+
+
+class IncrementalJSONParser:
+    """
+    Finds complete JSON values in a document that arrives in chunks.
+
+    Feed text as it streams in; every value whose path matches one of the
+    section patterns is parsed and returned as soon as its closing
+    character arrives, without waiting for the rest of the document.
+    Text before the top-level object (e.g. a stray markdown fence) is
+    ignored. This is a scanner, not a validator: the complete document
+    is still parsed and validated once the stream ends.
+    """
+
+    def __init__(self, sections: List[Tuple[Path, str]] = STYLE_SECTIONS):
+        self.sections = sections
+        self._text = ""
+        self._pos = 0
+        self._stack: List[_Container] = []
+        self._started = False
+        self.done = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._scalar_start: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        """All text fed so far."""
+        return self._text
+
+    def feed(self, chunk: str) -> List[Tuple[str, Path, Any]]:
+        """
+        Consume the next chunk of streamed text.
+
+        Args:
+            chunk: Text continuing the document
+
+        Returns:
+            (section name, path, parsed value) for each section completed by this chunk
+        """
+        self._text += chunk
+        return list(self._scan())
+
+    def _complete(self, path: Path, start: int, end: int) -> Iterator[Tuple[str, Path, Any]]:
+        for pattern, name in self.sections:
+            if _matches(pattern, path):
+                try:
+                    value = json.loads(self._text[start:end])
+                except ValueError:
+                    return
+                yield name, path, value
+                return
+
+    def _value_path(self) -> Path:
+        return self._stack[-1].child_path() if self._stack else ()
+
+    def _scan(self) -> Iterator[Tuple[str, Path, Any]]:
+        text = self._text
+        while self._pos < len(text) and not self.done:
+            i = self._pos
+            ch = text[i]
+            self._pos += 1
+
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._stack.append(_Container(True, (), i))
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    top = self._stack[-1]
+                    if top.is_object and top.expect_key:
+                        try:
+                            top.key = json.loads(text[self._string_start:i + 1])
+                        except ValueError:
+                            top.key = None
+                    else:
+                        yield from self._complete(top.child_path(), self._string_start, i + 1)
+                continue
+
+            if self._scalar_start is not None and ch in ",}] \t\r\n":
+                yield from self._complete(self._value_path(), self._scalar_start, i)
+                self._scalar_start = None
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                self._stack.append(_Container(ch == "{", self._value_path(), i))
+            elif ch in "}]":
+                container = self._stack.pop()
+                yield from self._complete(container.path, container.start, i + 1)
+                if not self._stack:
+                    self.done = True
+            elif ch == ":":
+                self._stack[-1].expect_key = False
+            elif ch == ",":
+                top = self._stack[-1]
+                if top.is_object:
+                    top.expect_key = True
+                else:
+                    top.index += 1
+            elif ch not in " \t\r\n" and self._scalar_start is None:
+                self._scalar_start = i
+
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Format one Server-Sent Event.
+
+    Args:
+        event: Event name
+        data: JSON-serializable payload
+
+    Returns:
+        SSE frame text, including the blank-line terminator
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
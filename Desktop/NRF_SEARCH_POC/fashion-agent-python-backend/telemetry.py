@@ -0,0 +1,389 @@
+"""
+Per-call upstream telemetry for Alex Fashion Stylist
+Records every Claude, Gemini, Imagen and Veo call (caller, model, tokens, latency,
+status, fallback depth, estimated cost) into an in-memory ring buffer that a
+background thread flushes to SQLite in batches
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
+
+from metrics import summarize
+from provider_config import any_provider_stubbed
+
+
+# Set ALEX_TELEMETRY=0 to stop recording calls
+TELEMETRY_ENABLED = os.getenv("ALEX_TELEMETRY", "1") != "0"
+# Stub calls get their own file so load tests don't inflate real call costs
+TELEMETRY_PATH = os.getenv(
+    "ALEX_TELEMETRY_PATH", "llm_telemetry_stub.db" if any_provider_stubbed() else "llm_telemetry.db"
+)
+# Records held in memory; if the flusher falls behind, the oldest are dropped
+TELEMETRY_BUFFER_SIZE = int(os.getenv("ALEX_TELEMETRY_BUFFER_SIZE", "10000"))
+# Flush once this many records are buffered, or every FLUSH_INTERVAL seconds
+TELEMETRY_FLUSH_SIZE = int(os.getenv("ALEX_TELEMETRY_FLUSH_SIZE", "200"))
+TELEMETRY_FLUSH_INTERVAL = float(os.getenv("ALEX_TELEMETRY_FLUSH_INTERVAL", "5"))
+TELEMETRY_RETENTION_DAYS = float(os.getenv("ALEX_TELEMETRY_RETENTION_DAYS", "30"))
+
+# Estimated list prices in USD, matched by longest model-name prefix:
+# input/output/cache_read/cache_write per million tokens, per_image, per_second
+# of generated video. ALEX_MODEL_PRICING (JSON) overrides or adds entries.
+DEFAULT_MODEL_PRICING: Dict[str, Dict[str, float]] = {
+    "claude-sonnet-4": {"input": 3.0, "output": 15.0, "cache_read": 0.30, "cache_write": 3.75},
+    "claude-opus-4": {"input": 15.0, "output": 75.0, "cache_read": 1.50, "cache_write": 18.75},
+    "claude-3-5-haiku": {"input": 0.80, "output": 4.0, "cache_read": 0.08, "cache_write": 1.0},
+    # Image output is billed as output tokens (about 1290 per image)
+    "gemini-2.5-flash-image": {"input": 0.30, "output": 30.0},
+    "gemini-2.0-flash": {"input": 0.10, "output": 0.40},
+    "imagen-3.0": {"per_image": 0.03},
+    "veo-3.1-fast": {"per_second": 0.15},
+    "veo-3.0-fast": {"per_second": 0.15},
+    "veo-3": {"per_second": 0.40},
+}
+
+
+def _load_pricing() -> Dict[str, Dict[str, float]]:
+    pricing = {model: dict(prices) for model, prices in DEFAULT_MODEL_PRICING.items()}
+    overrides = os.getenv("ALEX_MODEL_PRICING")
+    if overrides:
+        for model, prices in json.loads(overrides).items():
+            pricing.setdefault(model, {}).update(prices)
+    return pricing
+
+
+MODEL_PRICING = _load_pricing()
+
+# Who is making upstream calls: the HTTP route for API requests, or the
+# script name for ingestion runs. Context variables follow the request into
+# tasks and run_blocking() worker threads.
+current_caller: ContextVar[str] = ContextVar("alex_caller", default="unknown")
+
+_COLUMNS = (
+    "ts", "caller", "provider", "model", "status", "error", "attempts",
+    "fallback_depth", "duration_ms", "input_tokens", "output_tokens",
+    "cache_read_tokens", "cache_write_tokens", "units", "cost_usd",
+)
+
+
+@contextmanager
+def caller_context(caller: str) -> Iterator[None]:
+    """
+    Attribute upstream calls made inside the block to a caller.
+
+    Args:
+        caller: e.g. "POST /alex/style" or "update_trends"
+    """
+    token = current_caller.set(caller)
+    try:
+        yield
+    finally:
+        current_caller.reset(token)
+
+
+def extract_usage(response: Any) -> Dict[str, int]:
+    """
+    Read token and image counts from an Anthropic or google-genai response.
+
+    Args:
+        response: Upstream response object (anything else yields zeros)
+
+    Returns:
+        Dictionary with input_tokens, output_tokens, cache_read_tokens,
+        cache_write_tokens and images
+    """
+    usage = {"input_tokens": 0, "output_tokens": 0, "cache_read_tokens": 0, "cache_write_tokens": 0, "images": 0}
+
+    anthropic_usage = getattr(response, "usage", None)
+    if anthropic_usage is not None:
+        usage["input_tokens"] = getattr(anthropic_usage, "input_tokens", 0) or 0
+        usage["output_tokens"] = getattr(anthropic_usage, "output_tokens", 0) or 0
+        usage["cache_read_tokens"] = getattr(anthropic_usage, "cache_read_input_tokens", 0) or 0
+        usage["cache_write_tokens"] = getattr(anthropic_usage, "cache_creation_input_tokens", 0) or 0
+
+    gemini_usage = getattr(response, "usage_metadata", None)
+    if gemini_usage is not None:
+        usage["input_tokens"] = getattr(gemini_usage, "prompt_token_count", 0) or 0
+        usage["output_tokens"] = getattr(gemini_usage, "candidates_token_count", 0) or 0
+        usage["cache_read_tokens"] = getattr(gemini_usage, "cached_content_token_count", 0) or 0
+
+    generated_images = getattr(response, "generated_images", None)
+    if generated_images:
+        usage["images"] = len(generated_images)
+
+    return usage
+
+
+def estimate_cost(model: str, usage: Dict[str, int], units: float = 0.0) -> float:
+    """
+    Estimate the USD cost of one call from MODEL_PRICING.
+
+    Args:
+        model: Model name
+        usage: Token and image counts from extract_usage
+        units: Seconds of generated video, for per-second models
+
+    Returns:
+        Estimated cost (0.0 for models without a price)
+    """
+    prefix = max((p for p in MODEL_PRICING if model.startswith(p)), key=len, default=None)
+    if prefix is None:
+        return 0.0
+    prices = MODEL_PRICING[prefix]
+    cost = (
+        usage["input_tokens"] * prices.get("input", 0.0)
+        + usage["output_tokens"] * prices.get("output", 0.0)
+        + usage["cache_read_tokens"] * prices.get("cache_read", 0.0)
+        + usage["cache_write_tokens"] * prices.get("cache_write", 0.0)
+    ) / 1_000_000
+    cost += usage["images"] * prices.get("per_image", 0.0)
+    cost += units * prices.get("per_second", 0.0)
+    return round(cost, 6)
+
+
+class TelemetryRecorder:
+    """
+    Buffered recorder of upstream calls.
+
+    record() only appends to a bounded deque, so the calling request never
+    waits on disk. A daemon thread writes the buffer to the llm_calls table
+    in one transaction whenever FLUSH_SIZE records are waiting or
+    FLUSH_INTERVAL seconds have passed.
+    """
+
+    def __init__(
+        self,
+        path: str = TELEMETRY_PATH,
+        buffer_size: int = TELEMETRY_BUFFER_SIZE,
+        flush_size: int = TELEMETRY_FLUSH_SIZE,
+        flush_interval: float = TELEMETRY_FLUSH_INTERVAL,
+        retention_days: float = TELEMETRY_RETENTION_DAYS
+    ):
+        self.path = path
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+
+        self._lock = threading.Lock()
+        self._buffer: Deque[Tuple[Any, ...]] = deque(maxlen=buffer_size)
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        # Serializes flushes and queries on the single SQLite connection
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self._counters = {"recorded": 0, "dropped": 0, "flushed": 0, "flushes": 0, "flush_errors": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_calls (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts REAL NOT NULL,
+                    caller TEXT NOT NULL,
+                    provider TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    attempts INTEGER NOT NULL,
+                    fallback_depth INTEGER NOT NULL,
+                    duration_ms REAL NOT NULL,
+                    input_tokens INTEGER NOT NULL,
+                    output_tokens INTEGER NOT NULL,
+                    cache_read_tokens INTEGER NOT NULL,
+                    cache_write_tokens INTEGER NOT NULL,
+                    units REAL NOT NULL,
+                    cost_usd REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_calls_ts ON llm_calls (ts)")
+            with conn:
+                conn.execute(
+                    "DELETE FROM llm_calls WHERE ts < ?",
+                    (time.time() - self.retention_days * 86400,)
+                )
+            self._conn = conn
+        return self._conn
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name="alex-telemetry", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def record(
+        self,
+        key: str,
+        status: str,
+        duration_ms: float,
+        attempts: int = 1,
+        fallback_depth: int = 0,
+        units: float = 0.0,
+        response: Any = None,
+        error: Optional[BaseException] = None
+    ) -> None:
+        """
+        Buffer one upstream call.
+
+        Args:
+            key: "<provider>:<model>", the resilience/rate limit key
+            status: "ok", "error", "circuit_open" or "cancelled"
+            duration_ms: Wall time including retries and limiter waits
+            attempts: Attempts made
+            fallback_depth: Position of the model in its fallback chain (0 = first choice)
+            units: Seconds of generated video, for per-second pricing
+            response: Upstream response, read for token usage
+            error: Exception that ended the call, if any
+        """
+        if not TELEMETRY_ENABLED:
+            return
+        provider, _, model = key.partition(":")
+        usage = extract_usage(response)
+        row = (
+            time.time(), current_caller.get(), provider, model or provider, status,
+            type(error).__name__ if error is not None else None, attempts, fallback_depth,
+            round(duration_ms, 3), usage["input_tokens"], usage["output_tokens"],
+            usage["cache_read_tokens"], usage["cache_write_tokens"], units,
+            estimate_cost(model, usage, units) if status == "ok" else 0.0,
+        )
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self._counters["dropped"] += 1
+            self._buffer.append(row)
+            self._counters["recorded"] += 1
+            full = len(self._buffer) >= self.flush_size
+            self._ensure_flusher()
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """
+        Write buffered records to SQLite in one transaction.
+
+        Returns:
+            Number of records written
+        """
+        with self._lock:
+            rows = list(self._buffer)
+            self._buffer.clear()
+        if not rows:
+            return 0
+
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        try:
+            with self._db_lock:
+                conn = self._db()
+                with conn:
+                    conn.executemany(
+                        f"INSERT INTO llm_calls ({', '.join(_COLUMNS)}) VALUES ({placeholders})",
+                        rows
+                    )
+        except sqlite3.Error as e:
+            print(f"Warning: telemetry flush failed, dropped {len(rows)} records: {e}")
+            with self._lock:
+                self._counters["flush_errors"] += 1
+                self._counters["dropped"] += len(rows)
+            return 0
+
+        with self._lock:
+            self._counters["flushed"] += len(rows)
+            self._counters["flushes"] += 1
+        return len(rows)
+
+    def summary(self, window_hours: float = 24.0) -> Dict[str, Any]:
+        """
+        Aggregate recorded calls per model and per caller.
+
+        Buffered records are flushed first so the summary is current.
+
+        Args:
+            window_hours: How far back to look
+
+        Returns:
+            Dictionary with "models" and "callers" sections: call and error
+            counts, token totals, estimated cost and latency percentiles
+        """
+        self.flush()
+        since = time.time() - window_hours * 3600
+        with self._db_lock:
+            rows = self._db().execute(
+                "SELECT caller, provider, model, status, fallback_depth, duration_ms, input_tokens, "
+                "output_tokens, cache_read_tokens, cache_write_tokens, cost_usd "
+                "FROM llm_calls WHERE ts >= ?",
+                (since,)
+            ).fetchall()
+
+        def empty() -> Dict[str, Any]:
+            return {
+                "calls": 0, "errors": 0, "fallbacks": 0, "input_tokens": 0, "output_tokens": 0,
+                "cache_read_tokens": 0, "cache_write_tokens": 0, "cost_usd": 0.0, "durations": [],
+            }
+
+        groups: Dict[str, Dict[str, Dict[str, Any]]] = {"models": defaultdict(empty), "callers": defaultdict(empty)}
+        for (caller, provider, model, status, depth, duration, tokens_in, tokens_out,
+             cache_read, cache_write, cost) in rows:
+            for section, name in (("models", f"{provider}:{model}"), ("callers", caller)):
+                group = groups[section][name]
+                group["calls"] += 1
+                group["errors"] += status != "ok"
+                group["fallbacks"] += depth > 0
+                group["input_tokens"] += tokens_in
+                group["output_tokens"] += tokens_out
+                group["cache_read_tokens"] += cache_read
+                group["cache_write_tokens"] += cache_write
+                group["cost_usd"] += cost
+                group["durations"].append(duration)
+
+        result: Dict[str, Any] = {"window_hours": window_hours, "calls": len(rows)}
+        for section, named in groups.items():
+            result[section] = {}
+            for name, group in sorted(named.items()):
+                durations = group.pop("durations")
+                group["cost_usd"] = round(group["cost_usd"], 4)
+                group["latency"] = summarize(durations)
+                result[section][name] = group
+        result["total_cost_usd"] = round(sum(g["cost_usd"] for g in result["models"].values()), 4)
+        return result
+
+    def close(self) -> None:
+        """Stop the flusher thread, write what is buffered and close the database."""
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Get recorder counters.
+
+        Returns:
+            Dictionary with enabled, buffered and recorded/flushed/dropped counts
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            buffered = len(self._buffer)
+        return {"enabled": TELEMETRY_ENABLED, "buffered": buffered, **counters}
+
+
+llm_telemetry = TelemetryRecorder()
@@ -0,0 +1,63 @@
+"""
+Tests for outfit variation generation against the local provider stubs
+Run with: python -m pytest test_image_variations.py
+"""
+import json
+import os
+import tempfile
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+# Backend selection and stub settings are read at import time
+os.environ["ALEX_PROVIDERS"] = "stub"
+os.environ["ALEX_TELEMETRY"] = "0"
+os.environ["ALEX_MEDIA_CACHE_DIR"] = tempfile.mkdtemp(prefix="alex_media_test_")
+os.environ["ALEX_STUB_CONFIG"] = json.dumps({
+    "gemini": {"latency": {"distribution": "fixed", "ms": 0}},
+    "imagen": {"latency": {"distribution": "fixed", "ms": 0}},
+})
+
+import image_generator  # noqa: E402
+
+
+@pytest.fixture
+def batch_calls(monkeypatch):
+    calls = []
+    original = image_generator._generate_variations_batch
+
+    def spy(prompt, count, aspect_ratio, style):
+        calls.append(count)
+        return original(prompt, count, aspect_ratio, style)
+
+    monkeypatch.setattr(image_generator, "_generate_variations_batch", spy)
+    return calls
+
+
+def test_batch_mode_asks_imagen_for_samples_of_the_base_prompt(monkeypatch, batch_calls):
+    monkeypatch.setattr(image_generator, "VARIATIONS_MODE", "batch")
+
+    result = image_generator.generate_multiple_variations("Navy linen suit", count=6)
+
+    assert batch_calls == [image_generator.IMAGEN_MAX_IMAGES_PER_CALL, 2]
+    assert result["status"] == "success"
+    assert result["strategy"] == "batch"
+    assert result["count"] == 6
+    assert {v["parameters"]["model"] for v in result["variations"]} == {image_generator.IMAGEN_MODEL}
+    assert len(result["timing"]["batch_ms"]) == 2
+    assert len({v["metadata"]["prompt_used"] for v in result["variations"]}) == 1
+
+
+def test_fanout_mode_gives_each_variation_its_own_modifier(monkeypatch, batch_calls):
+    monkeypatch.setattr(image_generator, "VARIATIONS_MODE", "fanout")
+
+    result = image_generator.generate_multiple_variations("Navy linen suit", count=3)
+
+    assert batch_calls == []
+    assert result["strategy"] == "fanout"
+    assert result["count"] == 3
+    prompts = [v["metadata"]["prompt_used"] for v in result["variations"]]
+    assert len(set(prompts)) == 3
+    for modifier, prompt in zip(image_generator.VARIATION_MODIFIERS, prompts):
+        assert modifier in prompt
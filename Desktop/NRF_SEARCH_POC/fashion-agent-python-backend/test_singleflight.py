@@ -0,0 +1,67 @@
+"""
+Tests for request coalescing (singleflight.py)
+Run with: python -m pytest test_singleflight.py
+"""
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["result"] * 5
+    assert calls == 1
+    assert flight.metrics()["upstream_calls_saved"] == 4
+
+
+def test_caller_joining_after_leader_cancels_gets_a_fresh_call():
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    async def main():
+        leader = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # The abandoned call is still being torn down when this caller arrives
+        return await flight.do("key", fetch)
+
+    assert asyncio.run(main()) == 2
+    assert flight.metrics()["in_flight"] == 0
+
+
+def test_shared_call_survives_one_caller_cancelling():
+    flight = SingleFlight("test")
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "result"
+
+    async def main():
+        first = asyncio.create_task(flight.do("key", fetch))
+        second = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "result"
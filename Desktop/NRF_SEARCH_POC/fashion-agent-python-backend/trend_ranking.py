@@ -0,0 +1,174 @@
+"""
+Trend relevance ranking for Alex Fashion Stylist
+Scores candidate trends against the user's profile and occasion so only the
+trends that actually apply to a request are put in the stylist prompt
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Candidates fetched from the database (most recent first), and how many of
+# the best-scoring ones go into the prompt
+TREND_CANDIDATE_LIMIT = int(os.getenv("ALEX_TREND_CANDIDATES", "120"))
+TREND_TOP_K = int(os.getenv("ALEX_TREND_TOP_K", "15"))
+
+# Score contributions; ALEX_TREND_WEIGHTS (JSON) overrides individual weights
+DEFAULT_TREND_WEIGHTS: Dict[str, float] = {
+    # Trend is worn for this occasion type
+    "context": 3.0,
+    # Trend formality equals the requested formality; adjacent levels get
+    # half, anything further away gets formality_mismatch
+    "formality": 2.0,
+    "formality_mismatch": -1.0,
+    # User's climate is listed / the trend lists climates but not this one
+    "climate": 2.0,
+    "climate_mismatch": -1.0,
+    # Trend is specific to the requested region (global trends get nothing)
+    "region": 1.0,
+    # Per matching style preference, up to two
+    "style_preference": 1.0,
+    # Scaled by the share of the trend's palette on the user's blocklist
+    "colour_blocked": -2.0,
+    # Trend confidence high / low
+    "confidence_high": 0.5,
+    "confidence_low": -0.5,
+    # Scaled from 1 (newest candidate) to 0 (oldest); breaks ties towards recent trends
+    "recency": 0.5,
+}
+
+
+def _load_weights() -> Dict[str, float]:
+    weights = dict(DEFAULT_TREND_WEIGHTS)
+    overrides = os.getenv("ALEX_TREND_WEIGHTS")
+    if overrides:
+        weights.update(json.loads(overrides))
+    return weights
+
+
+TREND_WEIGHTS = _load_weights()
+
+FORMALITY_LEVELS = ["casual", "smart_casual", "semi_formal", "formal"]
+
+# Trends aimed at the other gender are excluded for these gender expressions
+_EXCLUDED_GENDER_FOCUS = {"male": "women", "female": "men"}
+
+
+def _lower(values: Optional[List[Any]]) -> List[str]:
+    return [str(value).strip().lower() for value in values or [] if value]
+
+
+def is_excluded(trend: Dict[str, Any], user_profile: Dict[str, Any]) -> bool:
+    """
+    Whether a trend is unsuitable for the user regardless of score.
+
+    Args:
+        trend: Trend dictionary
+        user_profile: UserProfile as a dictionary
+
+    Returns:
+        True if the trend targets the other gender or is to be avoided for
+        the user's body type
+    """
+    excluded_focus = _EXCLUDED_GENDER_FOCUS.get(user_profile.get("gender_expression"))
+    if excluded_focus and trend.get("gender_focus") == excluded_focus:
+        return True
+    body_type = str(user_profile.get("body_type", "")).strip().lower()
+    return bool(body_type) and any(
+        avoid in body_type or body_type in avoid for avoid in _lower(trend.get("avoid_for_body_types"))
+    )
+
+
+def score_trend(
+    trend: Dict[str, Any],
+    user_profile: Dict[str, Any],
+    context: Dict[str, Any],
+    recency: float = 0.0,
+    weights: Dict[str, float] = TREND_WEIGHTS
+) -> float:
+    """
+    Score how well a trend fits a request (higher is better).
+
+    Args:
+        trend: Trend dictionary
+        user_profile: UserProfile as a dictionary
+        context: OccasionContext as a dictionary
+        recency: 1.0 for the newest candidate down to 0.0 for the oldest
+        weights: Score contributions (see DEFAULT_TREND_WEIGHTS)
+
+    Returns:
+        Relevance score
+    """
+    score = recency * weights["recency"]
+
+    if context.get("occasion_type") in _lower(trend.get("contexts")):
+        score += weights["context"]
+
+    requested = context.get("formality")
+    if requested in FORMALITY_LEVELS and trend.get("formality") in FORMALITY_LEVELS:
+        distance = abs(FORMALITY_LEVELS.index(requested) - FORMALITY_LEVELS.index(trend["formality"]))
+        if distance == 0:
+            score += weights["formality"]
+        elif distance == 1:
+            score += weights["formality"] / 2
+        else:
+            score += weights["formality_mismatch"]
+
+    climates = _lower(trend.get("climate_suitability"))
+    if climates:
+        if user_profile.get("location_climate") in climates:
+            score += weights["climate"]
+        else:
+            score += weights["climate_mismatch"]
+
+    region = str(trend.get("region", "global")).lower()
+    if region != "global" and region == str(context.get("region", "")).lower():
+        score += weights["region"]
+
+    tags = set(_lower(trend.get("style_tags")))
+    matches = sum(1 for preference in _lower(user_profile.get("style_preferences")) if preference in tags)
+    score += min(matches, 2) * weights["style_preference"]
+
+    palette = _lower(trend.get("colour_palette"))
+    blocklist = _lower(user_profile.get("colour_blocklist"))
+    if palette and blocklist:
+        blocked = sum(1 for colour in palette if any(b in colour or colour in b for b in blocklist))
+        score += weights["colour_blocked"] * blocked / len(palette)
+
+    confidence = trend.get("confidence")
+    if confidence == "high":
+        score += weights["confidence_high"]
+    elif confidence == "low":
+        score += weights["confidence_low"]
+
+    return score
+
+
+def rank_trends(
+    trends: List[Dict[str, Any]],
+    user_profile: Dict[str, Any],
+    context: Dict[str, Any],
+    top_k: int = TREND_TOP_K
+) -> List[Dict[str, Any]]:
+    """
+    Pick the trends most relevant to a request.
+
+    Args:
+        trends: Candidate trends, most recent first
+        user_profile: UserProfile as a dictionary
+        context: OccasionContext as a dictionary
+        top_k: Maximum number of trends to return
+
+    Returns:
+        Up to top_k trends, best match first (ties keep recency order)
+    """
+    count = len(trends)
+    scored: List[Tuple[float, int, Dict[str, Any]]] = []
+    for position, trend in enumerate(trends):
+        if is_excluded(trend, user_profile):
+            continue
+        recency = 1.0 - position / count
+        scored.append((score_trend(trend, user_profile, context, recency), position, trend))
+
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [trend for _, _, trend in scored[:top_k]]
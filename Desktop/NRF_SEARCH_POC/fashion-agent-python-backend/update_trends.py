@@ -3,9 +3,12 @@ Fashion trend ingestion script for Alex Fashion Stylist
 Fetches fashion articles and extracts trends using Claude LLM
 """
 import argparse
-import json
+import asyncio
+import os
 import sys
-from typing import List, Dict, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 
 try:
@@ -15,9 +18,22 @@ except ImportError:
     print("Missing dependencies. Install with: pip install requests beautifulsoup4")
     sys.exit(1)
 
-from db import init_db, insert_trends, get_trend_count
-from llm_client import call_claude_json, ClaudeClientError
-from prompts import build_trend_ingestion_prompt, get_trend_ingestion_system_prompt
+import db
+from db import (
+    init_db, upsert_trends, describe_failures, get_trend_count, save_ingest_batch,
+    get_unfinished_ingest_batch, set_ingest_batch_status, record_ingest_result,
+    INGEST_BATCH_COMPLETE
+)
+from llm_client import (
+    call_claude_json_async, close_claude_clients, build_message_params, forced_tool_name,
+    ClaudeClientError, DEFAULT_MODEL
+)
+from llm_cache import LLM_CACHE_ENABLED, make_cache_key, response_cache
+from claude_batches import BATCH_BACKENDS, BATCH_ENDED, get_batch_backend
+from telemetry import caller_context, llm_telemetry
+from rate_limits import estimate_tokens
+from structured_output import TREND_TOOL, StructuredOutputError, parse_stats, parse_structured
+from prompts import build_trend_ingestion_prompt, get_trend_ingestion_system_prompt, prompt_stats
 
 
 # ============================================================================
@@ -40,6 +56,14 @@ SOURCES = [
 ]
 
 
+# Maximum number of articles extracted by Claude at the same time
+INGEST_CONCURRENCY = int(os.getenv("ALEX_INGEST_CONCURRENCY", "4"))
+
+# --batch mode: seconds between batch status checks, and max tokens per extraction
+BATCH_POLL_INTERVAL = float(os.getenv("ALEX_BATCH_POLL_INTERVAL", "30"))
+EXTRACTION_MAX_TOKENS = 4000
+
+
 # ============================================================================
 # Demo Mode: Hardcoded Sample Articles
 # ============================================================================
@@ -173,10 +197,55 @@ def strip_html_to_text(html: str) -> str:
 # Trend Extraction Functions
 # ============================================================================
 
-def extract_trends_from_article(
+def _as_trend_list(trends: Any) -> List[Any]:
+    if not isinstance(trends, list):
+        print(f"  Warning: Expected JSON array, got {type(trends)}. Wrapping in list.")
+        trends = [trends] if isinstance(trends, dict) else []
+    return trends
+
+
+def parse_extracted_trends(
+    response: str,
+    source_title: str,
+    source_url: str,
+    prompt_tokens: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Parse Claude's trend extraction response and stamp the source details.
+
+    Malformed JSON (markdown fences, trailing commas, truncated output) is
+    repaired where possible instead of dropping the whole article.
+
+    Args:
+        response: Response text (should be a JSON array of trends)
+        source_title: Title of the article
+        source_url: URL of the article
+        prompt_tokens: Estimated prompt size, reported as wasted if parsing fails
+
+    Returns:
+        List of trend dictionaries
+
+    Raises:
+        StructuredOutputError: If the response can't be parsed even after repair
+    """
+    trends = parse_structured(response, "trends", _as_trend_list, prompt_tokens)
+
+    # Source details are not part of the cached prompt prefix, so stamp
+    # them here rather than trusting the model to copy them back
+    published_at = datetime.now().isoformat()
+    for trend in trends:
+        if isinstance(trend, dict):
+            trend["source_title"] = source_title
+            trend["source_url"] = source_url
+            trend["published_at"] = published_at
+    return trends
+
+
+async def extract_trends_from_article_async(
     article_text: str,
     source_title: str,
-    source_url: str
+    source_url: str,
+    use_cache: bool = True
 ) -> List[Dict[str, Any]]:
     """
     Use Claude to extract fashion trends from article text.
@@ -185,49 +254,133 @@ def extract_trends_from_article(
         article_text: The article content
         source_title: Title of the article
         source_url: URL of the article
+        use_cache: Reuse a cached Claude response for unchanged articles
 
     Returns:
         List of trend dictionaries
     """
+    response = ""
     try:
         # Build prompts
         system_prompt = get_trend_ingestion_system_prompt()
         user_prompt = build_trend_ingestion_prompt(article_text, source_title, source_url)
 
         # Call Claude
-        print(f"  Calling Claude to extract trends from '{source_title}'...")
-        response = call_claude_json(system_prompt, user_prompt, max_tokens=4000)
+        print(f"  Calling Claude to extract trends from '{source_title}' (prompt ~{estimate_tokens(user_prompt)} tokens)...")
+        response = await call_claude_json_async(
+            system_prompt, user_prompt, max_tokens=EXTRACTION_MAX_TOKENS, use_cache=use_cache, tool=TREND_TOOL
+        )
 
         # Parse JSON response
-        trends = json.loads(response)
-
-        if not isinstance(trends, list):
-            print(f"  Warning: Expected JSON array, got {type(trends)}. Wrapping in list.")
-            trends = [trends] if isinstance(trends, dict) else []
+        trends = parse_extracted_trends(
+            response, source_title, source_url, estimate_tokens(system_prompt + user_prompt)
+        )
 
-        print(f"  Extracted {len(trends)} trends")
+        print(f"  Extracted {len(trends)} trends from '{source_title}'")
         return trends
 
-    except json.JSONDecodeError as e:
-        print(f"  Error: Failed to parse JSON response: {e}")
+    except StructuredOutputError as e:
+        print(f"  Error: Failed to parse JSON response for '{source_title}': {e}")
         print(f"  Response preview: {response[:200]}...")
         return []
     except ClaudeClientError as e:
-        print(f"  Error: Claude API error: {e}")
+        print(f"  Error: Claude API error for '{source_title}': {e}")
         return []
     except Exception as e:
-        print(f"  Error: Unexpected error: {e}")
+        print(f"  Error: Unexpected error for '{source_title}': {e}")
         return []
 
 
+def extract_trends_from_article(
+    article_text: str,
+    source_title: str,
+    source_url: str,
+    use_cache: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Synchronous wrapper around extract_trends_from_article_async.
+
+    Args:
+        article_text: The article content
+        source_title: Title of the article
+        source_url: URL of the article
+        use_cache: Reuse a cached Claude response for unchanged articles
+
+    Returns:
+        List of trend dictionaries
+    """
+    async def run() -> List[Dict[str, Any]]:
+        try:
+            return await extract_trends_from_article_async(
+                article_text, source_title, source_url, use_cache=use_cache
+            )
+        finally:
+            await close_claude_clients()
+
+    return asyncio.run(run())
+
+
 # ============================================================================
 # Main Ingestion Logic
 # ============================================================================
 
-def ingest_trends_demo() -> int:
+def store_trends(trends: List[Dict[str, Any]]) -> int:
+    """
+    Upsert extracted trends in one transaction and report the outcome.
+
+    Args:
+        trends: Trend dictionaries extracted from articles
+
+    Returns:
+        Number of new trends inserted
+    """
+    if not trends:
+        print("No trends extracted.")
+        return 0
+
+    print(f"Writing {len(trends)} trends to database...")
+    result = upsert_trends(trends)
+
+    print(
+        f"  {result['inserted']} inserted, {result['updated']} updated, "
+        f"{result['skipped']} unchanged, {len(result['failed'])} failed"
+        f"{describe_failures(result['failed'])}"
+    )
+
+    return result["inserted"]
+
+
+async def _extract_concurrently(jobs: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Run article extraction coroutines with at most INGEST_CONCURRENCY in flight.
+
+    Args:
+        jobs: Zero-argument coroutine functions, each returning a list of trends
+
+    Returns:
+        All extracted trends, in job order
+    """
+    semaphore = asyncio.Semaphore(INGEST_CONCURRENCY)
+
+    async def run(job) -> List[Dict[str, Any]]:
+        async with semaphore:
+            return await job()
+
+    try:
+        results = await asyncio.gather(*(run(job) for job in jobs))
+    finally:
+        await close_claude_clients()
+
+    return [trend for trends in results for trend in trends]
+
+
+def ingest_trends_demo(use_cache: bool = True) -> int:
     """
     Ingest trends in demo mode using hardcoded articles.
 
+    Args:
+        use_cache: Reuse cached Claude responses for unchanged articles
+
     Returns:
         Total number of trends inserted
     """
@@ -235,34 +388,32 @@ def ingest_trends_demo() -> int:
     print("DEMO MODE: Using hardcoded sample articles")
     print("="*70 + "\n")
 
-    all_trends = []
-
-    for i, article in enumerate(DEMO_ARTICLES, 1):
-        print(f"Processing demo article {i}/{len(DEMO_ARTICLES)}: {article['title']}")
-
-        trends = extract_trends_from_article(
-            article['content'],
-            article['title'],
-            article['url']
-        )
+    def job(i: int, article: Dict[str, str]):
+        async def run() -> List[Dict[str, Any]]:
+            print(f"Processing demo article {i}/{len(DEMO_ARTICLES)}: {article['title']}")
+            return await extract_trends_from_article_async(
+                article['content'],
+                article['title'],
+                article['url'],
+                use_cache=use_cache
+            )
+        return run
 
-        all_trends.extend(trends)
-        print()
+    all_trends = asyncio.run(_extract_concurrently(
+        [job(i, article) for i, article in enumerate(DEMO_ARTICLES, 1)]
+    ))
+    print()
 
-    # Insert all trends into database
-    if all_trends:
-        print(f"Inserting {len(all_trends)} trends into database...")
-        count = insert_trends(all_trends)
-        return count
-    else:
-        print("No trends extracted.")
-        return 0
+    return store_trends(all_trends)
 
 
-def ingest_trends_live() -> int:
+def ingest_trends_live(use_cache: bool = True) -> int:
     """
     Ingest trends in live mode by fetching articles from URLs.
 
+    Args:
+        use_cache: Reuse cached Claude responses for unchanged articles
+
     Returns:
         Total number of trends inserted
     """
@@ -270,43 +421,214 @@ def ingest_trends_live() -> int:
     print("LIVE MODE: Fetching articles from URLs")
     print("="*70 + "\n")
 
-    all_trends = []
+    def job(i: int, source: Dict[str, str]):
+        async def run() -> List[Dict[str, Any]]:
+            print(f"Processing source {i}/{len(SOURCES)}: {source['title']}")
+            try:
+                # Fetch HTML (requests is blocking, so keep it off the loop)
+                print(f"  Fetching {source['url']}...")
+                html = await asyncio.to_thread(fetch_article_html, source['url'])
+
+                # Convert to text
+                article_text = strip_html_to_text(html)
+                print(f"  Extracted {len(article_text)} characters of text from '{source['title']}'")
+
+                # Extract trends
+                return await extract_trends_from_article_async(
+                    article_text,
+                    source['title'],
+                    source['url'],
+                    use_cache=use_cache
+                )
+            except Exception as e:
+                print(f"  Error processing source '{source['title']}': {e}")
+                return []
+        return run
+
+    all_trends = asyncio.run(_extract_concurrently(
+        [job(i, source) for i, source in enumerate(SOURCES, 1)]
+    ))
+    print()
+
+    return store_trends(all_trends)
+
+
+# ============================================================================
+# Batch Mode: Message Batches API
+# ============================================================================
 
-    for i, source in enumerate(SOURCES, 1):
-        print(f"Processing source {i}/{len(SOURCES)}: {source['title']}")
+def fetch_live_articles() -> List[Dict[str, str]]:
+    """
+    Fetch and strip every source in SOURCES, skipping any that fail.
 
+    Returns:
+        Articles with title, url and content
+    """
+    def fetch(source: Dict[str, str]) -> Dict[str, str]:
         try:
-            # Fetch HTML
             print(f"  Fetching {source['url']}...")
-            html = fetch_article_html(source['url'])
+            article_text = strip_html_to_text(fetch_article_html(source['url']))
+            return {**source, "content": article_text}
+        except Exception as e:
+            print(f"  Error processing source '{source['title']}': {e}")
+            return {}
 
-            # Convert to text
-            article_text = strip_html_to_text(html)
-            print(f"  Extracted {len(article_text)} characters of text")
+    with ThreadPoolExecutor(max_workers=INGEST_CONCURRENCY) as pool:
+        return [article for article in pool.map(fetch, SOURCES) if article]
 
-            # Extract trends
-            trends = extract_trends_from_article(
-                article_text,
-                source['title'],
-                source['url']
-            )
 
-            all_trends.extend(trends)
+def _parse_result(response: str, source_title: str, source_url: str) -> Optional[List[Dict[str, Any]]]:
+    """Parse one extraction response; returns None (after logging) if it can't be parsed."""
+    try:
+        trends = parse_extracted_trends(response, source_title, source_url)
+    except StructuredOutputError as e:
+        print(f"  Error: Failed to parse JSON response for '{source_title}': {e}")
+        print(f"  Response preview: {response[:200]}...")
+        return None
+    print(f"  Extracted {len(trends)} trends from '{source_title}'")
+    return trends
 
-        except Exception as e:
-            print(f"  Error processing source: {e}")
+
+def _submit_batch(articles: List[Dict[str, str]], backend_name: str, use_cache: bool) -> Dict[str, Any]:
+    """
+    Submit one extraction request per article, serving cached articles directly.
+
+    Returns:
+        Dictionary with batch_id, backend, requests (custom_id -> state row)
+        and stored (new trends inserted from cached responses); batch_id is None
+        if every article was answered from the cache
+    """
+    system_prompt = get_trend_ingestion_system_prompt()
+    batch_requests = []
+    state_rows = []
+    stored = 0
+
+    for i, article in enumerate(articles, 1):
+        user_prompt = build_trend_ingestion_prompt(article['content'], article['title'], article['url'])
+        cache_key = make_cache_key(
+            DEFAULT_MODEL, system_prompt, user_prompt, EXTRACTION_MAX_TOKENS, forced_tool_name(TREND_TOOL)
+        )
+        cached = response_cache.get(cache_key) if LLM_CACHE_ENABLED and use_cache else None
+        if cached is not None:
+            print(f"  Using cached extraction for '{article['title']}'")
+            trends = _parse_result(cached, article['title'], article['url'])
+            if trends is not None:
+                stored += store_trends(trends)
             continue
 
-        print()
+        custom_id = f"article-{i}"
+        batch_requests.append({
+            "custom_id": custom_id,
+            "params": build_message_params(
+                system_prompt, user_prompt, max_tokens=EXTRACTION_MAX_TOKENS, tool=TREND_TOOL
+            )
+        })
+        state_rows.append({
+            "custom_id": custom_id,
+            "source_title": article['title'],
+            "source_url": article['url'],
+            "cache_key": cache_key,
+            "outcome": None,
+        })
+
+    if not batch_requests:
+        return {"batch_id": None, "backend": backend_name, "requests": {}, "stored": stored}
+
+    backend = get_batch_backend(backend_name)
+    batch_id = backend.create(batch_requests)
+    save_ingest_batch(batch_id, backend.name, state_rows)
+    print(f"Submitted batch {batch_id} with {len(batch_requests)} requests ({backend.name})")
+    return {
+        "batch_id": batch_id,
+        "backend": backend.name,
+        "requests": {row["custom_id"]: row for row in state_rows},
+        "stored": stored,
+    }
+
+
+def ingest_trends_batch(
+    demo: bool,
+    backend_name: str = "anthropic",
+    poll_interval: float = BATCH_POLL_INTERVAL,
+    use_cache: bool = True
+) -> int:
+    """
+    Ingest trends through the Message Batches API.
+
+    All extraction prompts are submitted as one batch job. The batch and
+    the outcome of each request are recorded in the trends database, so an
+    interrupted run resumes polling the same batch (and skips results it
+    already stored) instead of submitting a new one.
 
-    # Insert all trends into database
-    if all_trends:
-        print(f"Inserting {len(all_trends)} trends into database...")
-        count = insert_trends(all_trends)
-        return count
+    Args:
+        demo: Use the hardcoded demo articles instead of fetching SOURCES
+        backend_name: "anthropic", or "local" for the offline stand-in
+        poll_interval: Seconds between batch status checks
+        use_cache: Serve articles with a cached Claude response without batching them
+
+    Returns:
+        Number of new trends inserted
+    """
+    print("\n" + "="*70)
+    print("BATCH MODE: Extracting trends with the Message Batches API")
+    print("="*70 + "\n")
+
+    batch = get_unfinished_ingest_batch()
+    if batch is not None:
+        print(f"Resuming batch {batch['batch_id']} ({batch['backend']}, status: {batch['status']})")
+        stored = 0
     else:
-        print("No trends extracted.")
-        return 0
+        articles = DEMO_ARTICLES if demo else fetch_live_articles()
+        batch = _submit_batch(articles, backend_name, use_cache)
+        stored = batch["stored"]
+        if batch["batch_id"] is None:
+            print("Every article was served from the response cache; nothing to submit.")
+            return stored
+
+    batch_id = batch["batch_id"]
+    backend = get_batch_backend(batch["backend"])
+    requests_by_id = batch["requests"]
+
+    try:
+        # Wait for the batch to end; results only become available then
+        while True:
+            status = backend.retrieve(batch_id)
+            counts = status["request_counts"]
+            print(
+                f"  {status['processing_status']}: {counts['succeeded']} succeeded, "
+                f"{counts['errored']} errored, {counts['processing']} processing"
+            )
+            if status["processing_status"] == BATCH_ENDED:
+                break
+            time.sleep(poll_interval)
+        set_ingest_batch_status(batch_id, BATCH_ENDED)
+
+        # Results stream in one request at a time; store each as it arrives
+        for result in backend.results(batch_id):
+            request = requests_by_id.get(result["custom_id"])
+            if request is None or request["outcome"] is not None:
+                continue
+
+            trends_stored = 0
+            if result["type"] == "succeeded":
+                trends = _parse_result(result["text"], request["source_title"], request["source_url"])
+                if trends is not None:
+                    # Cache any usable response, even one that only updates
+                    # existing trends, so it isn't paid for again
+                    if LLM_CACHE_ENABLED and backend.cache_results:
+                        response_cache.put(request["cache_key"], result["text"])
+                    trends_stored = store_trends(trends)
+            else:
+                print(f"  Error: request for '{request['source_title']}' {result['type']}: {result['error']}")
+
+            record_ingest_result(batch_id, result["custom_id"], result["type"], trends_stored)
+            stored += trends_stored
+
+        set_ingest_batch_status(batch_id, INGEST_BATCH_COMPLETE)
+    finally:
+        asyncio.run(close_claude_clients())
+
+    return stored
 
 
 # ============================================================================
@@ -323,24 +645,74 @@ def main():
         action='store_true',
         help="Run in demo mode with hardcoded articles (no internet required)"
     )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help="Always call Claude instead of reusing cached responses"
+    )
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help="Submit all extractions as one Message Batch (resumes an unfinished batch)"
+    )
+    parser.add_argument(
+        '--batch-backend',
+        choices=sorted(BATCH_BACKENDS),
+        default="anthropic",
+        help="Batch service to use; 'local' is an offline stand-in (default: anthropic)"
+    )
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=BATCH_POLL_INTERVAL,
+        help=f"Seconds between batch status checks (default: {BATCH_POLL_INTERVAL:g})"
+    )
 
     args = parser.parse_args()
 
+    # Backends whose results aren't real Claude output write to their own trends database
+    trends_db_path = BATCH_BACKENDS[args.batch_backend].trends_db_path if args.batch else None
+    if trends_db_path:
+        db.DB_PATH = trends_db_path
+
     # Initialize database
     print("Initializing database...")
     init_db()
     print(f"Current trend count: {get_trend_count()}\n")
 
-    # Run ingestion
-    if args.demo:
-        trends_added = ingest_trends_demo()
-    else:
-        trends_added = ingest_trends_live()
+    # Run ingestion (telemetry records its Claude calls under this script's name)
+    try:
+        with caller_context("update_trends"):
+            if args.batch:
+                trends_added = ingest_trends_batch(
+                    demo=args.demo,
+                    backend_name=args.batch_backend,
+                    poll_interval=args.poll_interval,
+                    use_cache=not args.no_cache
+                )
+            elif args.demo:
+                trends_added = ingest_trends_demo(use_cache=not args.no_cache)
+            else:
+                trends_added = ingest_trends_live(use_cache=not args.no_cache)
+    finally:
+        llm_telemetry.close()
 
     # Summary
     print("\n" + "="*70)
     print(f"SUMMARY: Added {trends_added} new trends")
     print(f"Total trends in database: {get_trend_count()}")
+    for kind, counts in parse_stats.metrics()["kinds"].items():
+        print(
+            f"Parsed {counts['responses']} {kind} responses: {counts['repaired']} repaired, "
+            f"{counts['unparseable'] + counts['invalid']} failed "
+            f"(~{counts['wasted_input_tokens'] + counts['wasted_output_tokens']} tokens wasted)"
+        )
+    ingestion_prompts = prompt_stats.metrics().get("trend_ingestion")
+    if ingestion_prompts:
+        print(
+            f"Extraction prompts: ~{ingestion_prompts['avg_tokens']:.0f} tokens on average, "
+            f"{ingestion_prompts['trimmed']} of {ingestion_prompts['prompts']} trimmed to the budget"
+        )
     print("="*70)
 
 
@@ -6,9 +6,29 @@ import os
 import base64
 import time
 from typing import Optional
-from google import genai
 from google.genai import types
 
+from media_cache import MEDIA_CACHE_ENABLED, make_media_key, media_cache
+from model_health import model_health
+from providers import claude_is_stubbed, create_google_client
+from resilience import call_with_retry
+from telemetry import estimate_cost, extract_usage
+
+
+# Veo models to try (in order of preference)
+# PRICING: Veo 3 Standard = $0.40/sec, Veo 3 Fast = $0.15/sec (62.5% cheaper!)
+VEO_MODELS = [
+    'veo-3.1-fast-generate-preview',  # Veo 3.1 Fast ($0.15/sec) - Best value!
+    'veo-3.0-fast-generate-001',  # Veo 3.0 Fast ($0.15/sec)
+    'veo-3.1-generate-preview',  # Veo 3.1 Standard ($0.40/sec) - Fallback if fast unavailable
+    'veo-3.0-generate-001',  # Veo 3.0 Standard ($0.40/sec)
+]
+# The Claude prompt-enhancement fallback comes after every Veo model
+CLAUDE_FALLBACK_DEPTH = len(VEO_MODELS)
+
+# Seconds between operation status checks while a video is generating
+VEO_POLL_INTERVAL = float(os.getenv("ALEX_VEO_POLL_INTERVAL", "10"))
+
 
 class VideoGeneratorError(Exception):
     """Custom exception for video generation errors"""
@@ -34,26 +54,39 @@ def get_gemini_api_key() -> str:
             "Get your API key from: https://makersuite.google.com/app/apikey"
         )
 
-    print(f"🔑 Using API key for video: {api_key[:20]}...")  # Debug: Show first 20 chars
     return api_key
 
 
+def _probe_model(model: str) -> None:
+    """Check a skipped Veo model is back (a metadata lookup, not a generation)."""
+    create_google_client(get_gemini_api_key).models.get(model=model)
+
+
+model_health.register_prober("veo", _probe_model)
+
+
 def generate_video_with_veo3(
     image_base64: str,
     prompt: str,
     duration: int = 6,
-    aspect_ratio: str = "9:16"
+    aspect_ratio: str = "9:16",
+    use_cache: bool = True
 ) -> Optional[dict]:
     """
     Generate video using Google Veo 3.1 (Image-to-Video).
 
     Animates a static fashion image using Veo 3.1 to create a 360-degree showcase.
+    Generated videos are stored in the media cache (media_cache.py), keyed by
+    the image bytes, prompt, duration and aspect ratio, and an identical
+    request is answered from it without calling Veo.
 
     Args:
         image_base64: Base64 encoded image to animate
         prompt: Video animation instructions (camera movement, model behavior)
         duration: Video duration in seconds (default 6)
         aspect_ratio: Desired aspect ratio (e.g., "9:16", "16:9", "1:1")
+        use_cache: Serve a cached video if there is one (default: True); a
+            new video is cached either way
 
     Returns:
         Dictionary containing:
@@ -67,13 +100,26 @@ def generate_video_with_veo3(
     print(f"Animation prompt: {prompt[:100]}...")
 
     try:
-        # Get API key and initialize client
-        api_key = get_gemini_api_key()
-        client = genai.Client(api_key=api_key)
-
         # Decode base64 image to bytes
         image_bytes = base64.b64decode(image_base64)
 
+        cache_key = make_media_key(
+            "video", prompt, {"duration": duration, "aspect_ratio": aspect_ratio}, reference=image_bytes
+        )
+        if MEDIA_CACHE_ENABLED and use_cache:
+            cached = media_cache.get(cache_key)
+            if cached is not None:
+                video_bytes, _, result = cached
+                print("✅ Video served from media cache")
+                # Nothing was spent on this request
+                result['metadata'] = {**result.get('metadata', {}), "cached": True, "cost_usd": 0.0}
+                return {**result, "video_data": base64.b64encode(video_bytes).decode()}
+        elif MEDIA_CACHE_ENABLED:
+            media_cache.record_bypass()
+
+        # Initialize client (the API key is only needed for the live provider)
+        client = create_google_client(get_gemini_api_key)
+
         # Enhance prompt with video-specific animation instructions
         enhanced_prompt = f"""Cinematic fashion video animation. {prompt}
 
@@ -104,16 +150,9 @@ MOOD:
 - Natural fabric movement and flow
 """
 
-        # Veo models to try (in order of preference)
-        # PRICING: Veo 3 Standard = $0.40/sec, Veo 3 Fast = $0.15/sec (62.5% cheaper!)
-        veo_models_to_try = [
-            'veo-3.1-fast-generate-preview',  # Veo 3.1 Fast ($0.15/sec) - Best value!
-            'veo-3.0-fast-generate-001',  # Veo 3.0 Fast ($0.15/sec)
-            'veo-3.1-generate-preview',  # Veo 3.1 Standard ($0.40/sec) - Fallback if fast unavailable
-            'veo-3.0-generate-001',  # Veo 3.0 Standard ($0.40/sec)
-        ]
-
-        for model_id in veo_models_to_try:
+        # Skip models recently found unavailable and try recently failing ones last
+        for depth, model_id in model_health.candidates("veo", VEO_MODELS):
+            started = time.perf_counter()
             try:
                 print(f"  📹 Trying Veo model: {model_id}")
 
@@ -121,7 +160,11 @@ MOOD:
                 # CORRECTED: image parameter must be TOP-LEVEL, not inside config
                 # CORRECTED: aspect_ratio uses colon format "9:16", NOT hyphen "9-16"
                 # CORRECTED: mime_type must be explicitly specified for Veo API validation
-                operation = client.models.generate_videos(
+                operation = call_with_retry(
+                    f"veo:{model_id}",
+                    client.models.generate_videos,
+                    fallback_depth=depth,
+                    billable_units=duration,
                     model=model_id,
                     prompt=enhanced_prompt,
                     image=types.Image(
@@ -141,10 +184,13 @@ MOOD:
                 # Poll for completion (Video generation is asynchronous)
                 # CRITICAL FIX: Manual polling loop - operation.result is a PROPERTY, not a function
                 while not operation.done:
-                    time.sleep(10)  # Wait 10 seconds between checks
+                    time.sleep(VEO_POLL_INTERVAL)
                     print("     ... still processing")
-                    # Refresh the operation status
-                    operation = client.operations.get(operation)
+                    # Refresh the operation status. Polling has its own breaker so
+                    # an unhealthy model can't abandon an operation already paid for
+                    operation = call_with_retry(
+                        "veo:operations", client.operations.get, operation, fallback_depth=depth
+                    )
 
                 # Check if video was generated
                 # Note: operation.result is a PROPERTY, not a function call
@@ -153,7 +199,8 @@ MOOD:
                     video_base64 = base64.b64encode(video_bytes).decode()
 
                     print(f"✅ Video generated successfully with {model_id}!")
-                    return {
+                    model_health.record_success("veo", model_id, (time.perf_counter() - started) * 1000)
+                    result = {
                         "status": "success",
                         "video_data": video_base64,
                         "video_url": None,
@@ -165,15 +212,27 @@ MOOD:
                         "metadata": {
                             "generation_time": "30-60 seconds",
                             "prompt_used": enhanced_prompt,
-                            "note": f"Animated with {model_id}"
+                            "note": f"Animated with {model_id}",
+                            "cost_usd": estimate_cost(model_id, extract_usage(None), units=duration)
                         }
                     }
+                    if MEDIA_CACHE_ENABLED:
+                        media_cache.put(
+                            cache_key, "video", video_bytes, "video/mp4",
+                            {key: value for key, value in result.items() if key != 'video_data'}
+                        )
+                    return result
                 else:
                     print(f"  ⚠️  {model_id} finished but returned no video data")
+                    # Usually the safety filter on this prompt, not the model
+                    model_health.record_no_output(
+                        "veo", model_id, (time.perf_counter() - started) * 1000, skip=False
+                    )
 
             except Exception as model_error:
                 error_msg = str(model_error)
                 print(f"  ❌ {model_id} failed: {error_msg[:150]}")
+                model_health.record_error("veo", model_id, model_error)
 
                 # Check for specific errors
                 if "404" in error_msg or "not found" in error_msg.lower():
@@ -200,10 +259,10 @@ MOOD:
 
     # FALLBACK: Use Claude to enhance the video prompt
     try:
-        from anthropic import Anthropic
+        from llm_client import get_claude_client
 
         claude_api_key = os.getenv("CLAUDE_API_KEY")
-        if not claude_api_key:
+        if not claude_api_key and not claude_is_stubbed():
             # If Claude API key also not available, return basic fallback
             basic_prompt = f"""360-degree fashion video: {prompt}
 
@@ -228,8 +287,11 @@ Style: Fashion editorial, e-commerce presentation"""
             }
 
         # Use Claude to create an enhanced video prompt
-        client = Anthropic(api_key=claude_api_key)
-        response = client.messages.create(
+        client = get_claude_client()
+        response = call_with_retry(
+            "claude:claude-sonnet-4-20250514",
+            client.messages.create,
+            fallback_depth=CLAUDE_FALLBACK_DEPTH,
             model="claude-sonnet-4-20250514",
             max_tokens=1024,
             messages=[